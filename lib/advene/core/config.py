@@ -256,6 +256,12 @@ class Config(object):
             'record-actions': False,
             # Imagecache save on exit: 'never', 'ask' or 'always'
             'imagecache-save-on-exit': 'ask',
+            # Maximum size (in MB) of the snapshots kept in memory by
+            # the imagecache. Others are stored on disk. 0 for no limit.
+            'imagecache-memory-limit': 256,
+            # Number of threads rendering the pages of a website
+            # export (0 for one per processor, up to 4)
+            'website-export-workers': 0,
             'quicksearch-ignore-case': True,
             # quicksearch sources. If [], it is all package's annotations.
             # Else it is a list of TALES expression applied to the current package
@@ -268,6 +274,12 @@ class Config(object):
             'package-auto-save-interval': 5 * 60 * 1000,
             # slave player automatic synchronization delay. 0 to disable.
             'slave-player-sync-delay': 3000,
+            # Maximum seek (in ms) for which the active annotations
+            # are updated incrementally instead of being recomputed.
+            'seek-resync-threshold': 10000,
+            # Load packages into a lightweight DOM (faster, less memory)
+            # instead of minidom.
+            'package-lightweight-dom': False,
             # Interface language. '' means system default.
             'language': '',
             'save-default-workspace': 'always',
@@ -326,6 +338,17 @@ class Config(object):
             'snapshot': True,
             'caption': True,
             'snapshot-width': 160,
+            # If False, snapshots are taken on the nearest keyframes,
+            # which is much faster but less precise
+            'snapshot-accurate': True,
+            # Maximum gap (in ms) between snapshot timestamps captured
+            # by decoding forward instead of seeking
+            'snapshot-run-gap': 2000,
+            # Number of parallel snapshot pipelines (0 for one per
+            # processor, up to 4)
+            'snapshot-workers': 0,
+            # Maximum number of pending snapshot requests (0 for no limit)
+            'snapshot-queue-size': 10000,
             'dvd-device': '/dev/dvd',
             'fullscreen-timestamp': False,
             # Name of audio device for gstrecorder
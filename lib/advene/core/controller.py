@@ -41,6 +41,8 @@ import gobject
 import shlex
 import itertools
 import operator
+import heapq
+from collections import deque, OrderedDict
 
 import advene.core.config as config
 
@@ -63,6 +65,7 @@ from advene.model.annotation import Annotation, Relation
 from advene.model.fragment import MillisecondFragment
 from advene.model.view import View
 from advene.model.query import Query
+from advene.model.textindex import fold
 from advene.model.util.defaultdict import DefaultDict
 from advene.model.tal.context import AdveneTalesException
 from advene.util.website_export import WebsiteExporter
@@ -71,6 +74,7 @@ import advene.model.tal.context
 
 import advene.util.helper as helper
 import advene.util.importer
+from advene.util.orderedset import OrderedSet
 import xml.etree.ElementTree as ET
 from advene.util.audio import SoundPlayer
 
@@ -136,11 +140,13 @@ class AdveneController(object):
       - L{_modified} : boolean
 
     @ivar active_annotations: the currently active annotations.
-    @type active_annotations: list
+    @type active_annotations: OrderedSet
     @ivar future_begins: the annotations that should be activated next (sorted)
-    @type future_begins: list
+    @type future_begins: deque
     @ivar future_ends: the annotations that should be desactivated next (sorted)
-    @type future_ends: list
+    @type future_ends: deque
+    @ivar annotation_lists_stale: annotations were modified since the lists were built
+    @type annotation_lists_stale: boolean
 
     @ivar last_position: a cache to check whether an update is necessary
     @type last_position: int
@@ -191,15 +197,18 @@ class AdveneController(object):
         self.dvd_regexp = re.compile("^dvd.*@(\d+):(\d+)")
 
         # List of active annotations
-        self.active_annotations = []
+        self.active_annotations = OrderedSet()
         self.future_begins = None
         self.future_ends = None
+        self.annotation_lists_stale = False
         self.last_position = -1
 
         # List of (time, action) tuples, sorted along time
         # When the player or usertime reaches 'time', execute the action.
+        # Heaps of (time, sequence number, action)
         self.videotime_bookmarks = []
         self.usertime_bookmarks = []
+        self.bookmark_counter = itertools.count()
 
         self.pending_duration_update = False
 
@@ -467,7 +476,7 @@ class AdveneController(object):
 
         action will be given the controller and current position as parameters.
         """
-        self.videotime_bookmarks.append( (t, action) )
+        heapq.heappush(self.videotime_bookmarks, (t, self.bookmark_counter.next(), action))
         return True
 
     def register_usertime_action(self, t, action):
@@ -475,7 +484,7 @@ class AdveneController(object):
 
         action will be given the controller and current position as parameters.
         """
-        self.usertime_bookmarks.append( (t / 1000.0, action) )
+        heapq.heappush(self.usertime_bookmarks, (t / 1000.0, self.bookmark_counter.next(), action))
         return True
 
     def register_usertime_delayed_action(self, delay, action):
@@ -483,7 +492,7 @@ class AdveneController(object):
 
         action will be given the controller and current position as parameters.
         """
-        self.usertime_bookmarks.append( (time.time() + delay / 1000.0, action) )
+        heapq.heappush(self.usertime_bookmarks, (time.time() + delay / 1000.0, self.bookmark_counter.next(), action))
         return True
 
     def restrict_playing(self, at=None, annotations=None):
@@ -584,6 +593,10 @@ class AdveneController(object):
         +w1 +w2 -> search objects containing w1 and w2
         w1 -w2 -> search objects containing w1 and not w2
         "foo bar" -> search objects containing the string "foo bar"
+
+        If case_sensitive is False, the search is also accent
+        insensitive. Annotations and relations are searched through
+        the package full-text index.
         """
         p=self.package
 
@@ -591,12 +604,7 @@ class AdveneController(object):
             if case_sensitive:
                 return s
             else:
-                return s.lower()
-
-        if case_sensitive:
-            data_func=lambda e: e.content.data
-        else:
-            data_func=lambda e: normalize_case(e.content.data)
+                return fold(s)
 
         if sources is None:
             sources=[ "all_annotations" ]
@@ -616,10 +624,12 @@ class AdveneController(object):
         normal=[ w for w in words if not w.startswith('+') and not w.startswith('-') ]
 
         result=[]
+        index=p.textIndex
 
         for source in sources:
             if source == 'tags':
                 sourcedata=itertools.chain( p.annotations, p.relations )
+                search=index.search_tag
                 if case_sensitive:
                     data_func=lambda e: e.tags
                 else:
@@ -633,28 +643,47 @@ class AdveneController(object):
                         result.append(e)
                 continue
             else:
+                search=index.search
+                data_func=lambda e: normalize_case(e.content.data)
                 if source == 'all_annotations':
                     source = 'here/annotations'
                 c=self.build_context()
                 sourcedata=c.evaluateValue(source)
 
+            # Resolve the search terms on the indexed elements
+            selected=None
             for w in mandatory:
-                w=normalize_case(w)
-                sourcedata=[ e for e in sourcedata if w in data_func(e) ]
+                found=search(w, case_sensitive)
+                if selected is None:
+                    selected=found
+                else:
+                    selected &= found
+            if normal:
+                found=set()
+                for w in normal:
+                    found |= search(w, case_sensitive)
+                if selected is None:
+                    selected=found
+                else:
+                    selected &= found
+            excluded=set()
             for w in exceptions:
-                w=normalize_case(w)
-                sourcedata=[ e for e in sourcedata if w not in data_func(e) ]
-            if not normal:
-                # No "normal" search terms. Return the result.
-                result.extend(sourcedata)
-            else:
-                normal=[ normalize_case(w) for w in normal ]
-                for e in sourcedata:
-                    data=data_func(e)
-                    for w in normal:
-                        if w in data:
-                            result.append(e)
-                            break
+                excluded |= search(w, case_sensitive)
+
+            def match(e):
+                """Match an element which is not indexed.
+                """
+                data=data_func(e)
+                return (all(normalize_case(w) in data for w in mandatory)
+                        and not any(normalize_case(w) in data for w in exceptions)
+                        and (not normal or any(normalize_case(w) in data for w in normal)))
+
+            for e in sourcedata:
+                if e in index:
+                    if (selected is None or e in selected) and not e in excluded:
+                        result.append(e)
+                elif match(e):
+                    result.append(e)
         return result
 
     def evaluate_query(self, query=None, context=None, expr=None):
@@ -935,7 +964,14 @@ class AdveneController(object):
         # Set the package._modified state
         # This does not really belong here, but it is the more convenient and
         # maybe more effective way to implement it
-        if event_name in self.modifying_events:
+        if event_name == 'ElementsDelete':
+            for el in kw['elements']:
+                p=el.ownerPackage
+                p._modified = True
+                p._idgenerator.remove(el.id)
+            # The future annotations lists may reference deleted annotations
+            self.annotation_lists_stale = True
+        elif event_name in self.modifying_events:
             # Find the element's package
             # Kind of hackish... This information should be clearly available somewhere
             el_name=event_name.lower().replace('create','').replace('editend','').replace('delete', '')
@@ -948,6 +984,15 @@ class AdveneController(object):
             elif event_name.endswith('Create'):
                 # We created an element. Make sure its id is registered in the _idgenerator
                 p._idgenerator.add(el.id)
+            elif event_name == 'AnnotationEditEnd':
+                # Its bounds or type may have changed
+                p._annotation_modified(el)
+            if event_name.startswith('Annotation'):
+                # The future annotations lists cannot be updated
+                # incrementally anymore.
+                self.annotation_lists_stale = True
+            if event_name in ('ViewEditEnd', 'ViewDelete'):
+                advene.model.tal.context.invalidate_template_cache(el.uri)
 
         if 'immediate' in kw:
             self.event_handler.notify(event_name, *param, **kw)
@@ -971,6 +1016,27 @@ class AdveneController(object):
             v=0
         return v
 
+    def get_imagecache_statistics(self, package=None):
+        """Return the statistics of the package imagecache.
+
+        See ImageCache.get_statistics for details.
+        """
+        if package is None:
+            package=self.package
+        return package.imagecache.get_statistics()
+
+    def get_snapshotter_statistics(self):
+        """Return the statistics of the player snapshotter.
+
+        See SnapshotterPool.get_statistics for details.
+
+        @return: a dict, or None if the player has no snapshotter
+        """
+        s=getattr(self.player, 'snapshotter', None)
+        if s is None:
+            return None
+        return s.get_statistics()
+
     def snapshot_taken(self, snap):
         if snap is not None and snap.height != 0:
             self.package.imagecache[snap.date] = helper.snapshot2png(snap)
@@ -1283,6 +1349,7 @@ class AdveneController(object):
             uri=self.player.dvd_uri(title, chapter)
         self.set_media(uri)
         # Reset the imagecache
+        self.package.imagecache.close()
         self.package.imagecache=ImageCache()
         if uri is not None and uri != "":
             id_ = helper.mediafile2id (uri)
@@ -1313,13 +1380,11 @@ class AdveneController(object):
             p.relations.remove(el)
             self.notify('RelationDelete', relation=el, immediate=immediate_notify, undone=undone)
         elif isinstance(el, AnnotationType):
-            for a in el.annotations:
-                self.delete_element(a, immediate_notify=True, batch=batch, undone=undone)
+            self.delete_elements(el.annotations, immediate_notify=True, batch=batch, undone=undone)
             el.schema.annotationTypes.remove(el)
             self.notify('AnnotationTypeDelete', annotationtype=el, immediate=immediate_notify, undone=undone)
         elif isinstance(el, RelationType):
-            for r in el.relations:
-                self.delete_element(r, immediate_notify=True, batch=batch, undone=undone)
+            self.delete_elements(el.relations, immediate_notify=True, batch=batch, undone=undone)
             el.schema.relationTypes.remove(el)
             self.notify('RelationTypeDelete', relationtype=el, immediate=immediate_notify, undone=undone)
         elif isinstance(el, Schema):
@@ -1346,6 +1411,29 @@ class AdveneController(object):
             self.notify('ResourceDelete', resource=el, immediate=immediate_notify, undone=undone)
         return True
 
+    def delete_elements (self, elements, immediate_notify=False, batch=None, undone=False):
+        """Delete a set of elements from their package.
+
+        Annotations and relations (along with the relations of the
+        annotations) are deleted in one pass, and reported through a
+        single ElementsDelete event, whose elements parameter holds
+        the list of the deleted elements. Other elements are deleted
+        one at a time by delete_element.
+        """
+        packages=OrderedDict()
+        others=[]
+        for el in elements:
+            if isinstance(el, (Annotation, Relation)):
+                packages.setdefault(el.ownerPackage, []).append(el)
+            else:
+                others.append(el)
+        for p, l in packages.iteritems():
+            deleted=p.deleteElements(l)
+            self.notify('ElementsDelete', elements=deleted, immediate=immediate_notify, batch=batch, undone=undone)
+        for el in others:
+            self.delete_element(el, immediate_notify=immediate_notify, batch=batch, undone=undone)
+        return True
+
     def transmute_annotation(self, annotation, annotationType, delete=False, position=None, notify=True):
         """Transmute an annotation to a new type.
 
@@ -1507,7 +1595,8 @@ class AdveneController(object):
         elif ( mtd == mts and mtd == 'application/x-advene-structured' ):
             # Compare fields and merge identical fields
             sdata=s.content.parsed()
-            ddata=d.content.parsed()
+            # parsed() returns a cached structure: work on a copy
+            ddata=dict(d.content.parsed())
             for k, v in sdata.iteritems():
                 if k in ddata:
                     # Merge fields
@@ -1783,6 +1872,8 @@ class AdveneController(object):
         p = self.packages[alias]
         del (self.aliases[p])
         del (self.packages[alias])
+        if hasattr(p, 'imagecache'):
+            p.imagecache.close()
         if self.package == p:
             l=[ a for a in self.packages.keys() if a != 'advene' ]
             # There should be at least 1 key
@@ -2110,6 +2201,8 @@ class AdveneController(object):
 
             # Cleanup the ZipPackage directories
             ZipPackage.cleanup()
+            # and the imagecache temporary directories
+            ImageCache.cleanup()
 
             # Terminate the web server
             try:
@@ -2176,7 +2269,8 @@ class AdveneController(object):
         position_before=self.player.current_position_value
         #print "update status:", status, position
         if (status == 'set' or status == 'start' or status == 'stop'):
-            if position != position_before:
+            # Seeks ('set') are detected and handled in update()
+            if status != 'set' and position != position_before:
                 self.reset_annotation_lists()
             if notify:
                 # Bit of a hack... In a loop context, setting the
@@ -2280,7 +2374,7 @@ class AdveneController(object):
         position). The lists are sorted according to the begin and end
         position respectively.
 
-        The elements of the begin/end lists are (annotation, begin,
+        The elements of the begin/end deques are (annotation, begin,
         end). The elements of active_annotations are annotations.
 
         The update_display method only has to check the first element
@@ -2291,7 +2385,7 @@ class AdveneController(object):
 
         @param position: the current position
         @type position: int
-        @return: a tuple of three lists containing triplets or simple annotations
+        @return: two deques containing triplets and an OrderedSet of annotations
         @rtype: tuple
         """
         # Substract 20ms to the current position, so that in case the
@@ -2300,19 +2394,12 @@ class AdveneController(object):
         # AnnotatioBegin gets correctly notified.
         position -= 20
 
-        future_begins = []
-        future_ends = []
-        active = []
-
-        for a in self.package.annotations:
-            if a.fragment.begin >= position:
-                future_begins.append( (a, a.fragment.begin, a.fragment.end) )
-                future_ends.append( (a, a.fragment.begin, a.fragment.end) )
-            elif a.fragment.end >= position:
-                future_ends.append( (a, a.fragment.begin, a.fragment.end) )
-                active.append(a)
-        future_begins.sort(key=operator.itemgetter(1))
-        future_ends.sort(key=operator.itemgetter(2))
+        index = self.package.temporalIndex
+        future_begins = deque(index.iter_begins(position))
+        # Annotations ending after position are either future or
+        # active ones.
+        future_ends = deque(index.iter_ends(position))
+        active = OrderedSet(a for (a, b, e) in future_ends if b < position)
 
         #print "Position: %s" % helper.format_time(position)
         #print "Begins: %s\nEnds: %s" % ([ a[0].id for a in future_begins[:4] ],
@@ -2323,7 +2410,60 @@ class AdveneController(object):
         """Reset the future annotations lists."""
         self.future_begins = None
         self.future_ends = None
-        self.active_annotations = []
+        self.active_annotations = OrderedSet()
+
+    def resync_annotation_lists (self, old, new):
+        """Update the future annotations lists after a seek.
+
+        Only the annotations beginning or ending between the old and
+        new positions are considered, using the temporal index. The
+        AnnotationEnd event is notified for the annotations leaving
+        the active set, and AnnotationBegin for the ones entering it.
+
+        @param old: the position before the seek
+        @type old: int
+        @param new: the position after the seek
+        @type new: int
+        """
+        active = self.active_annotations
+        entering = []
+        leaving = []
+        if new < old:
+            index = self.package.temporalIndex
+            # Annotations beginning in ]new, old] are future ones again
+            begins = [ t
+                       for t in itertools.takewhile(lambda t: t[1] <= old, index.iter_begins(new))
+                       if t[1] > new ]
+            # Annotations ending in ]new, old] have not ended yet
+            ends = [ t
+                     for t in itertools.takewhile(lambda t: t[2] <= old, index.iter_ends(new))
+                     if t[2] > new ]
+            self.future_begins.extendleft(reversed(begins))
+            self.future_ends.extendleft(reversed(ends))
+            leaving = [ a for (a, b, e) in begins if a in active ]
+            entering = [ a for (a, b, e) in ends if b <= new ]
+        else:
+            begins = self.future_begins
+            while begins and begins[0][1] <= new:
+                a, b, e = begins.popleft()
+                if e > new:
+                    entering.append(a)
+            ends = self.future_ends
+            while ends and ends[0][2] <= new:
+                a, b, e = ends.popleft()
+                if a in active:
+                    leaving.append(a)
+
+        for a in leaving:
+            active.discard(a)
+            self.notify ("AnnotationEnd",
+                         annotation=a,
+                         immediate=True)
+        for a in entering:
+            active.add(a)
+            self.notify ("AnnotationBegin",
+                         annotation=a,
+                         immediate=True)
 
     def update (self):
         """Update the information.
@@ -2345,36 +2485,38 @@ class AdveneController(object):
 
         if pos < self.last_position or pos > self.last_position + 1000:
             # We did a seek compared to the last time (backward, or
-            # more than 1s forward), so we invalidate the
-            # future_begins and future_ends lists as well as the
-            # active_annotations
-            self.reset_annotation_lists()
+            # more than 1s forward).
+            if (self.future_begins is not None and self.future_ends is not None
+                and not self.annotation_lists_stale
+                and (p.status == p.PlayingStatus or p.status == p.PauseStatus)
+                and abs(pos - self.last_position) <= config.data.preferences['seek-resync-threshold']):
+                # Small seek: update the lists incrementally
+                self.resync_annotation_lists(self.last_position, pos)
+            else:
+                # Invalidate the future_begins and future_ends lists
+                # as well as the active_annotations
+                self.reset_annotation_lists()
 
         self.last_position = pos
 
-        if self.videotime_bookmarks:
-            t, a = self.videotime_bookmarks[0]
-            while t and t <= pos:
-                self.videotime_bookmarks.pop(0)
-                a(self, pos)
-                if self.videotime_bookmarks:
-                    t, a = self.videotime_bookmarks[0]
-                else:
-                    t = 0
+        bookmarks = self.videotime_bookmarks
+        while bookmarks and bookmarks[0][0] <= pos:
+            t, n, a = heapq.heappop(bookmarks)
+            a(self, pos)
+            # The action may have reset the bookmarks
+            bookmarks = self.videotime_bookmarks
 
         if self.usertime_bookmarks:
-            t, a = self.usertime_bookmarks[0]
             v=time.time()
-            while t and t <= v:
-                self.usertime_bookmarks.pop(0)
+            bookmarks = self.usertime_bookmarks
+            while bookmarks and bookmarks[0][0] <= v:
+                t, n, a = heapq.heappop(bookmarks)
                 a(self, v)
-                if self.usertime_bookmarks:
-                    t, a = self.usertime_bookmarks[0]
-                else:
-                    t = 0
+                bookmarks = self.usertime_bookmarks
 
         if self.future_begins is None or self.future_ends is None:
             self.future_begins, self.future_ends, self.active_annotations = self.generate_sorted_lists(pos)
+            self.annotation_lists_stale = False
             #print "New lists", [a.id for a in self.active_annotations], [t[0].id for t in self.future_begins ]
 
         if self.future_begins and (p.status == p.PlayingStatus or p.status == p.PauseStatus):
@@ -2382,7 +2524,7 @@ class AdveneController(object):
             #print "Future begin", a.id, b, pos
             while b <= pos:
                 # Ignore if we were after the annotation end
-                self.future_begins.pop(0)
+                self.future_begins.popleft()
                 if e > pos:
                     #print "AnnotationBegin", a.id, e, pos
                     self.notify ("AnnotationBegin",
@@ -2398,11 +2540,8 @@ class AdveneController(object):
             a, b, e = self.future_ends[0]
             while e <= pos:
                 #print "Comparing %d < %d for %s" % (e, pos, a.content.data)
-                try:
-                    self.active_annotations.remove(a)
-                except ValueError:
-                    pass
-                self.future_ends.pop(0)
+                self.active_annotations.discard(a)
+                self.future_ends.popleft()
                 self.notify ("AnnotationEnd",
                              annotation=a,
                              immediate=True)
@@ -2526,7 +2665,8 @@ class AdveneController(object):
         return True
 
     def website_export(self, destination='/tmp/n', views=None, max_depth=3, progress_callback=None, video_url=None):
-        exporter=WebsiteExporter(self, destination, views, max_depth, progress_callback, video_url)
+        exporter=WebsiteExporter(self, destination, views, max_depth, progress_callback, video_url,
+                                 workers=config.data.preferences['website-export-workers'])
         # FIXME
         exporter.website_export()
         return True
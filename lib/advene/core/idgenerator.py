@@ -48,8 +48,11 @@ class Generator:
 
     def __init__(self, package=None):
         self.last_used={}
-        self.existing=[]
-        for k in self.prefix.keys():
+        # Set of known ids
+        self.existing=set()
+        # Index of the last id generated by new_from_title, by root
+        self.title_index={}
+        for k in self.prefix.values():
             self.last_used[k]=0
         if package is not None:
             self.init(package)
@@ -62,15 +65,14 @@ class Generator:
     def add(self, id_):
         """Add a new known id.
         """
-        self.existing.append(id_)
+        self.existing.add(id_)
 
     def remove(self, id_):
         """Remove an id from the existing set.
         """
-        try:
-            self.existing.remove(id_)
-        except ValueError:
-            pass
+        self.existing.discard(id_)
+        # Freed ids may be reused by new_from_title
+        self.title_index.clear()
 
     def init(self, package):
         """Initialize the indexes for the given package."""
@@ -86,7 +88,7 @@ class Generator:
                   package.annotationTypes, package.relationTypes,
                   package.views, package.queries):
             for i in l.ids():
-                self.existing.append(i)
+                self.existing.add(i)
                 m=re_id.match(i)
                 if m:
                     n=long(m.group(2))
@@ -95,27 +97,53 @@ class Generator:
                         last_id[k] = n
         # last_id contains the last index used for each prefix
         self.last_used = dict(last_id)
+        self.title_index.clear()
 
     def get_id(self, elementtype):
         """Return a not-yet used id.
         """
         prefix=self.prefix[elementtype]
         index=self.last_used[prefix] + 1
-        self.last_used[prefix]=index
         id_ = prefix + str(index)
+        while id_ in self.existing:
+            index += 1
+            id_ = prefix + str(index)
+        self.last_used[prefix]=index
         # Do not append yet.
-        #self.existing.append(id_)
+        #self.existing.add(id_)
         return id_
 
+    def reserve(self, elementtype, count):
+        """Reserve a number of not-yet used ids.
+
+        The returned ids are registered as existing, so that they will
+        not be generated again.
+
+        @param elementtype: the element class
+        @type elementtype: class
+        @param count: the number of ids to reserve
+        @type count: int
+        @return: the list of reserved ids
+        @rtype: list
+        """
+        res=[]
+        for i in xrange(count):
+            id_=self.get_id(elementtype)
+            self.existing.add(id_)
+            res.append(id_)
+        return res
+
     def new_from_title(self, title):
         """Generate a new (title, identifier) from a given title.
         """
         root=helper.title2id(title)
-        index=1
+        # Indexes below title_index[root] are known to be used (cf remove)
+        index=self.title_index.get(root, 1)
         i="%s%d" % (root, index)
         while i in self.existing:
             index += 1
             i="%s%d" % (root, index)
+        self.title_index[root]=index
         if index != 1:
             title="%s%d" % (title, index)
         return title, i
@@ -21,10 +21,14 @@ Imagecache module for advene
 """
 
 import advene.core.config as config
-import operator
+import bisect
+import collections
 
 import os
 import re
+import shutil
+import tempfile
+import threading
 
 class CachedString:
     """String cached in a file.
@@ -75,6 +79,24 @@ class ImageCache(dict):
     @type name: string
     @ivar autosync: if True, directly store snapshots on disk
     @type autosync: boolean
+    @ivar memory_limit: the maximum size in bytes of snapshots kept in memory,
+      0 for no limit, None to use the imagecache-memory-limit preference
+    @type memory_limit: integer
+    @ivar statistics: hits, misses and evictions counters of the memory tier
+    @type statistics: dict
+    @ivar _valid: the positions of valid (captured) snapshots
+    @type _valid: set
+    @ivar _valid_keys: the positions of valid snapshots, sorted
+    @type _valid_keys: list
+
+    Snapshots evicted from memory are stored in a private temporary
+    directory, which is removed by L{reset}, L{clear} and L{close}
+    (and by L{cleanup} at the end of the application). They are
+    copied to the imagecache directory only by L{save}.
+
+    The cache may be updated from the player threads while it is read
+    from the GUI thread: the memory tier and the index of valid
+    snapshots are protected by a lock.
     """
     # The content of the not_yet_available_file file. We could use
     # CachedString but as it is frequently used, let us keep it in memory.
@@ -84,13 +106,30 @@ class ImageCache(dict):
     not_yet_available_image.contenttype='image/png'
     not_yet_available_image.timestamp=-1
 
-    def __init__ (self, name=None, epsilon=35):
+    # Temporary directories used during the session
+    spill_directories = []
+
+    def cleanup():
+        """Remove the temporary directories used during the session.
+
+        This method is intended to be used at the end of the
+        application.
+        """
+        for d in ImageCache.spill_directories:
+            shutil.rmtree(d, ignore_errors=True)
+        del ImageCache.spill_directories[:]
+
+    cleanup = staticmethod(cleanup)
+
+    def __init__ (self, name=None, epsilon=35, memory_limit=None):
         """Initialize the Imagecache
 
         @param name: id of a previously saved ImageCache.
         @type name: string
         @param epsilon: value of the precision
         @type epsilon: integer
+        @param memory_limit: maximum size (in bytes) of in-memory snapshots
+        @type memory_limit: integer
         """
         # It is a dictionary whose keys are the positions
         # (in ms) and values the snapshot in PNG format.
@@ -98,6 +137,28 @@ class ImageCache(dict):
         # not yet been updated.
         dict.__init__ (self)
 
+        # Guards the memory tier and the index of valid snapshots
+        self._lock = threading.RLock()
+
+        # Index of valid snapshots. It must be updated along with
+        # dict modifications, which should all go through _store.
+        self._valid = set()
+        self._valid_keys = []
+
+        # Memory tier: snapshots held in memory (as TypedString),
+        # from the least to the most recently used, with their
+        # size. When the memory limit is exceeded, the least recently
+        # used ones are replaced by CachedString instances, and
+        # reloaded on access.
+        self._lru = collections.OrderedDict()
+        self._resident = 0
+        # Files holding an up-to-date copy of in-memory snapshots
+        self._files = {}
+        # Temporary directory used to store evicted snapshots
+        self._spill_directory = None
+        self.memory_limit = memory_limit
+        self.statistics = { 'hits': 0, 'misses': 0, 'evictions': 0 }
+
         self._modified=False
 
         self.name=None
@@ -109,6 +170,141 @@ class ImageCache(dict):
         if name is not None:
             self.load (name)
 
+    def _store (self, key, value):
+        """Store the value, updating the index of valid snapshots.
+
+        @param key: the key
+        @type key: long
+        @param value: an image or self.not_yet_available_image
+        """
+        self._lock.acquire()
+        try:
+            self._store_unlocked(key, value)
+        finally:
+            self._lock.release()
+
+    def _store_unlocked(self, key, value):
+        dict.__setitem__(self, key, value)
+        size=self._lru.pop(key, None)
+        if size is not None:
+            self._resident -= size
+        if value is self.not_yet_available_image:
+            self._files.pop(key, None)
+            if key in self._valid:
+                self._valid.remove(key)
+                del self._valid_keys[bisect.bisect_left(self._valid_keys, key)]
+            return
+        if not key in self._valid:
+            self._valid.add(key)
+            bisect.insort(self._valid_keys, key)
+        if isinstance(value, TypedString):
+            self._lru[key]=len(value)
+            self._resident += len(value)
+            self._evict()
+
+    def __delitem__ (self, key):
+        self._lock.acquire()
+        try:
+            dict.__delitem__(self, key)
+            self._files.pop(key, None)
+            size=self._lru.pop(key, None)
+            if size is not None:
+                self._resident -= size
+            if key in self._valid:
+                self._valid.remove(key)
+                del self._valid_keys[bisect.bisect_left(self._valid_keys, key)]
+        finally:
+            self._lock.release()
+
+    def get_memory_limit(self):
+        """Return the memory limit in bytes (0 if there is no limit).
+        """
+        if self.memory_limit is None:
+            return config.data.preferences['imagecache-memory-limit'] * 1024 * 1024
+        return self.memory_limit
+
+    def get_spill_directory(self):
+        """Return the temporary directory where evicted snapshots are stored.
+        """
+        if self._spill_directory is None:
+            self._spill_directory=tempfile.mkdtemp('', 'advene_imagecache_')
+            self.spill_directories.append(self._spill_directory)
+        return self._spill_directory
+
+    def _remove_spill_directory(self):
+        """Remove the temporary directory, with the evicted snapshots.
+        """
+        d=self._spill_directory
+        if d is not None:
+            self._spill_directory=None
+            shutil.rmtree(d, ignore_errors=True)
+            if d in self.spill_directories:
+                self.spill_directories.remove(d)
+
+    def _evict(self):
+        """Evict the least recently used snapshots until the memory limit is respected.
+        """
+        limit=self.get_memory_limit()
+        if not limit:
+            return
+        self._lock.acquire()
+        try:
+            while self._resident > limit and self._lru:
+                key, size = self._lru.popitem(last=False)
+                self._resident -= size
+                filename=self._files.pop(key, None)
+                if filename is None:
+                    filename=os.path.join(self.get_spill_directory(), "%010d.png" % key)
+                    f=open(filename, 'wb')
+                    f.write(dict.__getitem__(self, key))
+                    f.close()
+                value=CachedString(filename)
+                value.contenttype='image/png'
+                dict.__setitem__(self, key, value)
+                self.statistics['evictions'] += 1
+        finally:
+            self._lock.release()
+
+    def _fetch(self, key):
+        """Return the value for key, reloading it in memory if necessary.
+        """
+        self._lock.acquire()
+        try:
+            value=dict.__getitem__(self, key)
+            if key in self._lru:
+                # Mark as most recently used
+                self._lru[key]=self._lru.pop(key)
+                self.statistics['hits'] += 1
+            elif isinstance(value, CachedString):
+                self.statistics['misses'] += 1
+                data=str(value)
+                if data:
+                    t=TypedString(data)
+                    t.timestamp=key
+                    t.contenttype=value.contenttype
+                    self._files[key]=value._filename
+                    self._store_unlocked(key, t)
+                    value=t
+            return value
+        finally:
+            self._lock.release()
+
+    def get_statistics(self):
+        """Return statistics about the memory tier.
+
+        @return: a dict with hits, misses, evictions, resident
+          (bytes in memory), resident_count, memory_limit, valid and
+          total (number of keys) items
+        @rtype: dict
+        """
+        res=dict(self.statistics)
+        res.update({ 'resident': self._resident,
+                     'resident_count': len(self._lru),
+                     'memory_limit': self.get_memory_limit(),
+                     'valid': len(self._valid),
+                     'total': len(self) })
+        return res
+
     def init_value (self, key):
         """Initialize a key if needed.
 
@@ -118,7 +314,7 @@ class ImageCache(dict):
         if key is None:
             return
         if not dict.has_key (self, key):
-            dict.__setitem__(self, key, self.not_yet_available_image)
+            self._store(key, self.not_yet_available_image)
 
     def has_key (self, key):
         if key is None:
@@ -143,7 +339,7 @@ class ImageCache(dict):
         if key is None:
             return self.not_yet_available_image
         key = self.approximate(key)
-        return dict.__getitem__(self, key)
+        return self._fetch(key)
 
     def get(self, key, epsilon=None):
         """Return a snapshot for the image corresponding to the position pos.
@@ -158,7 +354,7 @@ class ImageCache(dict):
         if key is None:
             return self.not_yet_available_image
         key = self.approximate(key, epsilon)
-        return dict.__getitem__(self, key)
+        return self._fetch(key)
 
     def __setitem__ (self, key, value):
         """Set the snapshot for the image corresponding to the position key.
@@ -170,8 +366,10 @@ class ImageCache(dict):
         """
         if key is None:
             return value
-        if value != self.not_yet_available_image:
+        if value is not self.not_yet_available_image:
             self._modified=True
+            # The stored copy, if any, is obsolete
+            self._files.pop(key, None)
             if self.autosync and self.name is not None:
                 d=os.path.join(config.data.path['imagecache'], self.name)
                 if not os.path.isdir(d):
@@ -186,7 +384,7 @@ class ImageCache(dict):
                 value=TypedString(value)
                 value.timestamp=key
                 value.contenttype='image/png'
-            return dict.__setitem__(self, key, value)
+            return self._store(key, value)
         else:
             return self.not_yet_available_image
 
@@ -199,25 +397,30 @@ class ImageCache(dict):
         if key is None:
             return None
         key=long(key)
-        if dict.has_key(self, key) and dict.__getitem__(self, key) != self.not_yet_available_image:
+        if key in self._valid:
             return key
 
         if epsilon is None:
             epsilon=self.epsilon
-        valids = [ (pos, abs(pos-key))
-                   for pos in self.keys()
-                   if abs(pos - key) <= epsilon
-                   and dict.__getitem__(self, pos) != self.not_yet_available_image ]
-        valids.sort(key=operator.itemgetter(1))
-
-        if valids:
-            key = valids[0][0]
-#            print "Approximate key: %d (%d)" % valids[0]
-#            if len(valids) > 1:
-#                print "Imagecache: more than 1 valid snapshot for %d: %s" % (key,
-#                                                                              valids)
-        else:
-            self.init_value (key)
+        self._lock.acquire()
+        try:
+            # The nearest valid snapshots are around the insertion point
+            # of key in the sorted list of valid positions.
+            keys=self._valid_keys
+            i=bisect.bisect_left(keys, key)
+            nearest=None
+            if i < len(keys) and keys[i] - key <= epsilon:
+                nearest=keys[i]
+            if i > 0 and key - keys[i - 1] <= epsilon and (nearest is None
+                                                           or key - keys[i - 1] <= nearest - key):
+                nearest=keys[i - 1]
+
+            if nearest is not None:
+                key = nearest
+            else:
+                self.init_value (key)
+        finally:
+            self._lock.release()
 
         return key
 
@@ -232,8 +435,8 @@ class ImageCache(dict):
         if epsilon is None:
             epsilon=self.epsilon
         key = self.approximate(key, epsilon)
-        if dict.__getitem__(self, key) != self.not_yet_available_image:
-            dict.__setitem__(self, key, self.not_yet_available_image)
+        if key in self._valid:
+            self._store(key, self.not_yet_available_image)
         return key
 
     def missing_snapshots (self):
@@ -241,18 +444,17 @@ class ImageCache(dict):
 
         @return: a list of keys
         """
+        valid=self._valid
         return [ pos
-                 for pos in self.keys()
-                 if dict.__getitem__(self, pos) == self.not_yet_available_image ]
+                 for pos in self.iterkeys()
+                 if not pos in valid ]
 
     def valid_snapshots (self):
         """Return the list of positions of valid snapshots.
 
         @return: a list of keys
         """
-        return [ pos
-                 for pos in self.keys()
-                 if dict.__getitem__(self, pos) != self.not_yet_available_image ]
+        return list(self._valid_keys)
 
     def is_initialized (self, key, epsilon=None):
         """Return True if the given key is initialized.
@@ -262,11 +464,7 @@ class ImageCache(dict):
         """
         if key is None:
             return False
-        key = self.approximate(key, epsilon)
-        if dict.__getitem__(self, key) == self.not_yet_available_image:
-            return False
-        else:
-            return True
+        return self.approximate(key, epsilon) in self._valid
 
     def save (self, name):
         """Save the content of the cache under a specified name (id).
@@ -296,15 +494,26 @@ class ImageCache(dict):
             else:
                 os.mkdir (d)
 
-        for k in self.iterkeys():
+        self._lock.acquire()
+        try:
+            keys=list(self._valid_keys)
+        finally:
+            self._lock.release()
+        for k in keys:
             i=dict.__getitem__(self, k)
-            if i == self.not_yet_available_image:
-                continue
+            filename=os.path.join (d, "%010d.png" % k)
             if isinstance(i, CachedString):
+                if os.path.dirname(i._filename) == d:
+                    continue
+                # Evicted in another directory
+                i=str(i)
+            elif self._files.get(k) == filename:
                 continue
-            f = open(os.path.join (d, "%010d.png" % k), 'wb')
+            f = open(filename, 'wb')
             f.write (i)
             f.close ()
+            if k in self._lru:
+                self._files[k]=filename
 
         self._modified=False
         return d
@@ -338,13 +547,48 @@ class ImageCache(dict):
                     s=CachedString(os.path.join (d, name))
                     s.contenttype='image/png'
                     dict.__setitem__(self, i, s)
+                    self._valid.add(i)
+            self._valid_keys=sorted(self._valid)
         self._modified=False
 
     def reset(self):
         """Reset imagecache.
         """
-        for pos in self.keys():
-            dict.__setitem__(self, pos, self.not_yet_available_image)
+        self._lock.acquire()
+        try:
+            for pos in self._valid_keys:
+                dict.__setitem__(self, pos, self.not_yet_available_image)
+            self._valid.clear()
+            self._valid_keys=[]
+            self._lru.clear()
+            self._resident=0
+            self._files.clear()
+            self._remove_spill_directory()
+        finally:
+            self._lock.release()
+
+    def clear(self):
+        """Remove all keys.
+        """
+        self._lock.acquire()
+        try:
+            dict.clear(self)
+            self._valid.clear()
+            self._valid_keys=[]
+            self._lru.clear()
+            self._resident=0
+            self._files.clear()
+            self._remove_spill_directory()
+        finally:
+            self._lock.release()
+
+    def close(self):
+        """Release the temporary directory of the imagecache.
+
+        Snapshots which were not saved (cf L{save}) and are not in
+        memory are lost.
+        """
+        self.clear()
 
     def ids (self):
         """Return the list of currents ids.
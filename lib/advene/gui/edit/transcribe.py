@@ -986,7 +986,6 @@ class TranscriptionEdit(AdhocView):
         b.delete(begin, end)
 
         al=at.annotations
-        al.sort(key=lambda a: a.fragment.begin)
 
         last_time=None
 
@@ -1119,9 +1118,7 @@ class TranscriptionEdit(AdhocView):
 
                 if delete_existing_toggle.get_active():
                     # Remove all annotations of at type
-                    batch_id=object()
-                    for a in at.annotations:
-                        self.controller.delete_element(a, batch=batch_id)
+                    self.controller.delete_elements(at.annotations, batch=object())
 
                 self.options['empty-annotations']=empty_contents_toggle.get_active()
                 finished=True
@@ -386,9 +386,13 @@ class AdveneGUI(object):
 
             m = gtk.Menu()
             if s:
+                stats = self.controller.get_snapshotter_statistics()
                 m.append(gtk.MenuItem(_("Snapshotter activity")))
                 m.append(gtk.SeparatorMenuItem())
-                m.append(gtk.MenuItem(_("%d queued requests") % s.timestamp_queue.qsize()))
+                m.append(gtk.MenuItem(_("%d queued requests") % stats['pending']))
+                m.append(gtk.MenuItem(_("%(captured)d snapshots taken by %(workers)d pipelines (%(throughput).1f/s)") % stats))
+                if stats['refused']:
+                    m.append(gtk.MenuItem(_("%d requests refused (full queue)") % stats['refused']))
                 i = gtk.MenuItem(_("Cancel all requests"))
                 i.connect('activate', lambda i: s.clear() or True)
                 m.append(i)
@@ -675,6 +679,36 @@ class AdveneGUI(object):
             e.refresh()
         return True
 
+    def elements_lifecycle(self, context, parameters):
+        """Method used to update the active views after a batch deletion.
+
+        Views implementing update_elements are updated once for the
+        whole set of elements. Other views get the individual
+        AnnotationDelete and RelationDelete updates.
+        """
+        elements=[ e for e in context.evaluateValue('elements')
+                   if e.ownerPackage == self.controller.package ]
+        if not elements:
+            return True
+        deleted=set(elements)
+        for e in [ e for e in self.edit_popups if e.element in deleted ]:
+            e.close()
+        self.last_edited=[ e for e in self.last_edited if e not in deleted ]
+        self.last_created=[ e for e in self.last_created if e not in deleted ]
+        for v in self.adhoc_views:
+            if hasattr(v, 'update_elements'):
+                v.update_elements(elements=elements, event='ElementsDelete')
+                continue
+            for el in elements:
+                try:
+                    if isinstance(el, Annotation):
+                        v.update_annotation(annotation=el, event='AnnotationDelete')
+                    else:
+                        v.update_relation(relation=el, event='RelationDelete')
+                except AttributeError:
+                    pass
+        return True
+
     def view_lifecycle(self, context, parameters):
         """Method used to update the active views.
 
@@ -1084,6 +1118,7 @@ class AdveneGUI(object):
             ( ('RelationCreate', 'RelationEditEnd',
                'RelationDelete'),
               self.relation_lifecycle ),
+            ("ElementsDelete", self.elements_lifecycle),
             ( ('ViewCreate', 'ViewEditEnd', 'ViewDelete'),
               self.view_lifecycle ),
             ( ('QueryCreate', 'QueryEditEnd', 'QueryDelete'),
@@ -3123,9 +3158,9 @@ class AdveneGUI(object):
             self.player_toolbar.buttons[l].set_sensitive(is_playing)
 
         # Check snapshotter activity
-        s = getattr(c.player, 'snapshotter', None)
-        if s:
-            if s.timestamp_queue.empty():
+        stats = c.get_snapshotter_statistics()
+        if stats is not None:
+            if not stats['pending']:
                 self.snapshotter_monitor_icon.set_state('idle')
             else:
                 self.snapshotter_monitor_icon.set_state('running')
@@ -4209,6 +4244,7 @@ class AdveneGUI(object):
                         'custom-updown-keys', 'player-autostart',
                         'language',
                         'display-scroller', 'display-caption', 'imagecache-save-on-exit',
+                        'imagecache-memory-limit',
                         'remember-window-size', 'expert-mode', 'update-check',
                         'package-auto-save', 'package-auto-save-interval',
                         'bookmark-snapshot-width', 'bookmark-snapshot-precision',
@@ -4284,6 +4320,7 @@ class AdveneGUI(object):
                 (_("always save screenshots"), 'always'),
                 (_("ask before saving screenshots"), 'ask'),
                 )))
+        ew.add_spin(_("Screenshot memory (in MB)"), 'imagecache-memory-limit', _("Maximum memory used by screenshots. Older ones are stored on disk. 0 for no limit."), 0, 64 * 1024)
         ew.add_option(_("Auto-save"), 'package-auto-save',
                       _("Data auto-save functionality"), odict((
                 (_("is desactivated"), 'never'),
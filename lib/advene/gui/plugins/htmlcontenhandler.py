@@ -131,6 +131,13 @@ class AnnotationPlaceholder:
             self.refresh()
         return True
 
+    def elements_deleted(self, context, target):
+        if self.annotation in context.globals['elements']:
+            self.annotation=None
+            self.cleanup()
+            self.refresh()
+        return True
+
     def refresh(self):
         if not self.rules and self.annotation:
             # Now that an annotation is defined, we can connect the notifications
@@ -138,6 +145,8 @@ class AnnotationPlaceholder:
                                                                            method=self.annotation_updated))
             self.rules.append(self.controller.event_handler.internal_rule (event='AnnotationDelete',
                                                                            method=self.annotation_deleted))
+            self.rules.append(self.controller.event_handler.internal_rule (event='ElementsDelete',
+                                                                           method=self.elements_deleted))
             self.rules.append(self.controller.event_handler.internal_rule (event='SnapshotUpdate',
                                                                            method=self.snapshot_updated))
 
@@ -250,10 +250,8 @@ class Menu:
         return True
 
     def delete_elements (self, widget, el, elements):
-        batch_id=object()
         if isinstance(el, AnnotationType) or isinstance(el, RelationType):
-            for e in elements:
-                self.controller.delete_element(e, batch=batch_id)
+            self.controller.delete_elements(elements, batch=object())
         return True
 
     def create_montage(self, widget, rt):
@@ -392,9 +390,7 @@ class Menu:
             re_number=re.compile('(\d+)')
             re_struct=re.compile('^num=(\d+)$', re.MULTILINE)
             offset=s.get_value_as_int() - 1
-            l=at.annotations
-            l.sort(key=lambda a: a.fragment.begin)
-            l=l[offset:]
+            l=at.annotations[offset:]
             size=float(len(l))
             dial=gtk.Dialog(_("Renumbering %d annotations") % size,
                            None,
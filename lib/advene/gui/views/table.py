@@ -83,7 +83,7 @@ class AnnotationTable(AdhocView):
     def update_annotation(self, annotation=None, event=None):
         if annotation in self.elements:
             if event.endswith('Delete'):
-                self.elements.remove(annotation)
+                self.elements = [ e for e in self.elements if e is not annotation ]
             self.set_elements(self.elements)
 
     def update_snapshot(self, context, parameters):
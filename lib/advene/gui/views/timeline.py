@@ -40,6 +40,7 @@ from advene.gui.util import decode_drop_parameters
 
 from advene.gui.views.annotationdisplay import AnnotationDisplay
 import advene.util.helper as helper
+import advene.util.dtw as dtw
 from advene.gui.util import dialog, name2color, get_small_stock_button, get_pixmap_button, get_pixmap_toolbutton
 from advene.gui.widget import AnnotationWidget, AnnotationTypeWidget, GenericColorButtonWidget
 
@@ -906,6 +907,21 @@ class TimeLine(AdhocView):
             print "Unknown event %s" % event
         return True
 
+    def update_elements (self, elements=None, event=None):
+        """Update the representation after the deletion of a set of elements.
+
+        The widgets of the deleted annotations are removed in one pass.
+        """
+        if event != 'ElementsDelete':
+            return True
+        deleted=set(elements)
+        for b in self.layout.get_children():
+            if getattr(b, 'annotation', None) in deleted:
+                b.destroy()
+        self.relations_to_draw=[ t for t in self.relations_to_draw if t[2] not in deleted ]
+        self.update_relation_lines()
+        return True
+
     def update_annotationtype (self, annotationtype=None, event=None):
         """Update an annotationtype's representation.
         """
@@ -1341,92 +1357,17 @@ class TimeLine(AdhocView):
             return self.transmuted_annotation
 
         def DTWalign_annotations(i, at, typ, mode, delete=True):
-            sa = at.annotations
-            sa.sort(key=lambda a: a.fragment.begin)
-            da = typ.annotations
-            da.sort(key=lambda a: a.fragment.begin)
-            bestpath = []
-            bestdist = []
-
-            mindist = (abs(sa[0].fragment.begin - da[0].fragment.begin)
-                       + abs(sa[0].fragment.end - da[0].fragment.end)
-                       + abs((sa[0].fragment.end - sa[0].fragment.begin)
-                             - (da[0].fragment.end - da[0].fragment.begin)))
-            bestdist.append(mindist)
-            bestpath.append([])
-            bestpath[0].append(0)
-
-            for j in range(1,len(sa)):
-                bestpath.append([])
-                bestpath[j].append(j)
-
-                dist = (abs(sa[j].fragment.begin - da[0].fragment.begin)
-                        + abs(sa[j].fragment.end - da[0].fragment.end)
-                        + abs((sa[j].fragment.end - sa[j].fragment.begin)
-                              - (da[0].fragment.end - da[0].fragment.begin)))
-                if dist < mindist:
-                    mindist = dist
-                    bestpath[j] = [j]
-                    bestdist.append(dist)
-                else:
-                    bestpath[j] = list(bestpath[j-1])
-                    bestdist.append(bestdist[j-1] + dist)
-
-            for i in range(1,len(da)):
-                currentdist = 0
-                prevsubdist = 0
-                currentpath = []
-                prevsubpath = []
-                for j in range(0,len(sa)):
-                    dist = (abs(sa[j].fragment.begin - da[i].fragment.begin)
-                            + abs(sa[j].fragment.end - da[i].fragment.end)
-                            + abs((sa[j].fragment.end - sa[j].fragment.begin)
-                                  - (da[i].fragment.end - da[i].fragment.begin)))
-
-                    if j == 0:
-                        currentpath = list(bestpath[0])
-                        currentdist = bestdist[0]
-
-                        bestpath[0].append(0)
-                        bestdist[0] = bestdist[0] + dist
-
-                    else:
-                        insdist = bestdist[j] + dist
-                        deldist = bestdist[j-1] + dist
-                        subdist = prevsubdist + dist*1.5
-
-                        currentdist =  bestdist[j]
-                        currentpath = list(bestpath[j])
-
-                        if insdist < deldist :
-                            if insdist < subdist:
-                                bestpath[j].append(j)
-                                bestdist[j] = insdist
-                            else :
-                                prevsubpath.append(j)
-                                bestpath[j] = prevsubpath
-                                bestdist[j] = subdist
-                        elif subdist < deldist :
-                            prevsubpath.append(j)
-                            bestpath[j] = prevsubpath
-                            bestdist[j] = subdist
-                        else:
-                           bestpath[j] = list(bestpath[j-1])
-                           bestdist[j] = deldist
-
-                    prevsubdist = currentdist
-                    prevsubpath = list(currentpath)
-
+            if not at.annotations or not typ.annotations:
+                return True
             # Update annotation timestamp/contents
             batch_id=object()
-            for (i,j) in enumerate(bestpath[len(sa)-1]):
-                annotation=da[i]
+            for (annotation, reference) in dtw.align_annotations(at.annotations, typ.annotations):
                 self.controller.notify('EditSessionStart', element=annotation, immediate=True)
                 if mode == 'time':
-                    annotation.fragment.begin = sa[j].fragment.begin
-                    annotation.fragment.end = sa[j].fragment.end
+                    annotation.fragment.begin = reference.fragment.begin
+                    annotation.fragment.end = reference.fragment.end
                 elif mode == 'content':
-                    annotation.content.data = sa[j].content.data
+                    annotation.content.data = reference.content.data
                 self.controller.notify('AnnotationEditEnd', annotation=annotation, batch=batch_id)
                 self.controller.notify('EditSessionEnd', element=annotation)
             return True
@@ -3342,9 +3283,7 @@ class TimeLine(AdhocView):
             if targetType == config.data.target_type['annotation']:
                 sources=[ self.controller.package.annotations.get(uri) for uri in unicode(selection.data, 'utf8').split('\n') ]
                 if sources:
-                    batch_id=object()
-                    for a in sources:
-                        self.controller.delete_element(a, batch=batch_id)
+                    self.controller.delete_elements(sources, batch=object())
                 return True
             return False
 
@@ -3668,9 +3607,7 @@ class TimeLine(AdhocView):
     def selection_delete(self, widget, selection=None):
         if selection is None:
             selection=self.get_selected_annotation_widgets()
-        batch_id=object()
-        for w in selection:
-            self.controller.delete_element(w.annotation, batch=batch_id)
+        self.controller.delete_elements([ w.annotation for w in selection ], batch=object())
         return True
 
     def selection_as_table(self, widget, selection):
@@ -3705,8 +3642,7 @@ class TimeLine(AdhocView):
                 self.controller.notify('AnnotationEditEnd', annotation=l[0], batch=batch_id)
                 self.controller.notify('EditSessionEnd', element=l[0])
                 # Remove all others
-                for a in l[1:]:
-                    self.controller.delete_element(a, batch=batch_id)
+                self.controller.delete_elements(l[1:], batch=batch_id)
         return True
 
     def selection_tag(self, widget, selection):
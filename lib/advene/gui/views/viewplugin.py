@@ -20,6 +20,7 @@
 from gettext import gettext as _
 
 from advene.gui.views import AdhocView
+from advene.model.annotation import Annotation
 
 class ViewPlugin(AdhocView):
     """
@@ -206,3 +207,21 @@ class ViewPlugin(AdhocView):
         """
         pass
 
+    def update_elements (self, elements=None, event=None):
+        """Update the representation of a set of elements.
+
+        It is called once after the deletion of a set of annotations
+        and relations. The default implementation calls
+        update_annotation and update_relation for each element, views
+        can override it to update their representation in one pass.
+
+        @param elements: the deleted annotations and relations
+        @type elements: list
+        @param event: the precise event (ElementsDelete)
+        @type event: advene.rules.elements.Event
+        """
+        for el in elements:
+            if isinstance(el, Annotation):
+                self.update_annotation(annotation=el, event='AnnotationDelete')
+            else:
+                self.update_relation(relation=el, event='RelationDelete')
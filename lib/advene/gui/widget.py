@@ -392,9 +392,7 @@ class AnnotationWidget(GenericColorButtonWidget):
             if not widgets:
                 self.controller.delete_element(annotation)
             else:
-                batch_id=object()
-                for w in widgets:
-                    self.controller.delete_element(w.annotation, batch=batch_id)
+                self.controller.delete_elements([ w.annotation for w in widgets ], batch=object())
             return True
         return False
 
@@ -447,22 +445,21 @@ class AnnotationWidget(GenericColorButtonWidget):
             context.stroke()
             if width < 1:
                 return
-            # The annotation contains a list of space-separated values
-            # that should be treated as percentage (between 0.0 and
-            # 100.0) of the height (FIXME: define a scale somewhere)
-            l=[ (1 - v / 100.0) for v in self.annotation.content.parsed() ]
+            # The annotation contains a list of values that should
+            # be treated as percentage (between 0.0 and 100.0) of the
+            # height (FIXME: define a scale somewhere)
+            # If there are more samples than available pixels, the
+            # envelope gives the min/max values for each pixel.
+            l=self.annotation.content.parsed().envelope(width)
             s=len(l)
             if not s:
                 return
-            if width < s:
-                # There are more samples than available pixels. Downsample the data
-                l=l[::(s/width)+1]
-                s=len(l)
             w=1.0 * width / s
             c = 0
             context.set_source_rgba(0, 0, 0, .5)
             context.move_to(0, height)
-            for v in l:
+            for (vmin, vmax) in l:
+                v = 1 - vmax / 100.0
                 context.line_to(int(c), int(height * v))
                 c += w
                 context.line_to(int(c), int(height * v))
@@ -282,6 +282,9 @@ class Tagged(Metaed):
         else:
             if self.getMetaData (ns, "tags"):
                 self.setMetaData (ns, "tags", None)
+        if ns == adveneNS:
+            # Update the full-text index
+            self.getOwnerPackage()._text_modified(self)
 
     def addTag(self, tag, ns=None):
         """Add a new tag.
@@ -164,6 +164,9 @@ class Annotation(modeled.Importable, content.WithContent,
             type_uri = type.getUri (absolute=False, context=op)
             self._getModel().setAttributeNS(None, "type", type_uri)
             self._cached_type=type
+            if self in op.getAnnotations():
+                # Update the package indexes
+                op._annotation_modified(self)
         else:
             raise AdveneException("%s is not imported" % type.getUri ())
 
@@ -190,6 +193,15 @@ class Annotation(modeled.Importable, content.WithContent,
                             "(you probably want to clone it before)")
         old = self.__getFragmentElement()
         fragment._bound(old)
+        # The cached fragment refers to the replaced element
+        self.__fragment = None
+        self._fragment_modified()
+
+    def _fragment_modified(self):
+        """Update the package indexes after a fragment modification."""
+        op = self.getOwnerPackage ()
+        if self in op.getAnnotations():
+            op._annotation_modified(self)
 
     def delFragment(self):
         """Delete the fragment associated to this annotation"""
@@ -452,6 +464,9 @@ class Relation(modeled.Importable, content.WithContent,
         elif type in op.getRelationTypes():
             type_uri = type.getUri (absolute=False, context=op)
             self._getModel().setAttributeNS(None, "type", type_uri)
+            if self in op.getRelations():
+                # Update the package indexes
+                op._update_member(self)
         else:
             raise AdveneException("type %s is not imported" % type.getUri())
 
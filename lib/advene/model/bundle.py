@@ -30,9 +30,11 @@ which are usual with simple python lists, are just meaningless for bundles.
 Permitted list operations are
  - len(b)
  - b.append
+ - b.extend
  - b.insert
  - b.pop
  - b.remove
+ - b.remove_items
  - b[x]
  - b[x:y]
  - del b[x]
@@ -277,6 +279,16 @@ class WritableBundle (AbstractBundle):
         length = len (self)
         self.insert (length, item)
 
+    def extend(self, items):
+        """
+        Append several items at the end of the bundle.
+
+        It is equivalent to appending each item, but subclasses can perform
+        it in one operation.
+        """
+        for item in list (items):
+            self.append (item)
+
     def insert(self, index, item):
         assert self._assert_add_item (item)
 
@@ -287,6 +299,19 @@ class WritableBundle (AbstractBundle):
         self._list.insert(index, item)
         self._dict[item.getUri (absolute=True)] = item
 
+    def _extend (self, items):
+        """
+        Append already checked items to the list and the dict.
+
+        It can be used by subclasses implementing extend.
+        """
+        self._list.extend (items)
+        dict_ = self._dict
+        for item in items:
+            uri = item.getUri (absolute=True)
+            assert uri not in dict_, "item %s appended twice" % item
+            dict_[uri] = item
+
     def remove (self, item):
         uri = item.getUri (absolute=True)
         check = self._dict.get (uri, None)
@@ -295,6 +320,26 @@ class WritableBundle (AbstractBundle):
             return
         raise ValueError, _('%s not in bundle') % item
 
+    def remove_items (self, items):
+        """
+        Remove several items from the bundle.
+
+        It is equivalent to removing each item, but takes a time linear in
+        the size of the bundle, instead of the number of items times this
+        size.
+        """
+        dict_ = self._dict
+        uris = {}
+        for item in items:
+            uri = item.getUri (absolute=True)
+            if dict_.get (uri, None) is not item:
+                raise ValueError, _('%s not in bundle') % item
+            uris[uri] = item
+        removed = set (id (item) for item in uris.itervalues ())
+        self._list[:] = [ i for i in self._list if id (i) not in removed ]
+        for uri in uris:
+            del dict_[uri]
+
     def pop(self, index=0):
         r = self[index]
         del self[index]
@@ -412,6 +457,33 @@ class AbstractXmlBundle(WritableBundle, modeled.Modeled,
         super (AbstractXmlBundle, self).__delitem__ (index)
         self._getModel ().removeChild (self._get_element (item))
 
+    def remove_items (self, items):
+        """
+        Remove several items from the bundle.
+
+        The DOM elements of the items are removed in one pass.
+        """
+        items = list (items)
+        elements = [ self._get_element (item) for item in items ]
+        super (AbstractXmlBundle, self).remove_items (items)
+        removed = set (id (elt) for elt in elements)
+        model = self._getModel ()
+        kept = [ elt for elt in model.childNodes if id (elt) not in removed ]
+        model.childNodes[:] = kept
+        for elt in elements:
+            elt.parentNode = None
+            if hasattr (elt, 'nextSibling'):
+                # minidom nodes also hold links to their siblings
+                elt.previousSibling = elt.nextSibling = None
+        if kept and hasattr (kept[0], 'nextSibling'):
+            previous = None
+            for elt in kept:
+                elt.previousSibling = previous
+                if previous is not None:
+                    previous.nextSibling = elt
+                previous = elt
+            previous.nextSibling = None
+
     def insert(self, index, item):
 
         assert self._assert_add_item (item)
@@ -434,12 +506,44 @@ class AbstractXmlBundle(WritableBundle, modeled.Modeled,
             true_index = elt_list.index (ref_elt)
             elt_list.insert (true_index, self._get_element (item))
         else:
-            ref_elt = self._get_element (self._list[-1])
-            ref_index = elt_list.index (ref_elt)
-            elt_list.insert (ref_index + 1, self._get_element (item))
+            elt_list.insert (self._end_index (elt_list), self._get_element (item))
 
         super (AbstractXmlBundle, self).insert (index, item)
 
+    def extend (self, items):
+        """
+        Append several items at the end of the bundle.
+
+        The DOM elements of the items are inserted in one operation.
+        """
+        items = list (items)
+        if not items:
+            return
+        for item in items:
+            assert self._assert_add_item (item)
+
+        elt_list = self._getModel ().childNodes
+        if self._list:
+            end = self._end_index (elt_list)
+        else:
+            end = 0
+        elt_list[end:end] = [ self._get_element (item) for item in items ]
+
+        self._extend (items)
+
+    def _end_index (self, elt_list):
+        """
+        Return the index of elt_list following the last element of the bundle.
+
+        The elements of the bundle are usually the last ones of the list, so
+        that it is searched from its end.
+        """
+        ref_elt = self._get_element (self._list[-1])
+        for i in xrange (len (elt_list) - 1, -1, -1):
+            if elt_list[i] is ref_elt:
+                return i + 1
+        raise ValueError, _('%s not in model') % self._list[-1]
+
 
     def _assert_add_item (self, item):
         assert ( item._getParent ().getRootPackage ()
@@ -516,6 +620,55 @@ class ImportBundle (StandardXmlBundle):
 
 
 
+class NotifyingBundleMixin (object):
+    """
+    Mixin for XML bundles which report their modifications to their owner
+    package, so that it can maintain its indexes.
+
+    The owner package (as returned by getOwnerPackage) must implement the
+    _bundle_item_added and _bundle_item_removed methods, taking the bundle and
+    the item as parameters. They are invoked once the modification is done.
+    """
+
+    def __delitem__ (self, index):
+        item = self[index]
+        super (NotifyingBundleMixin, self).__delitem__ (index)
+        self.getOwnerPackage ()._bundle_item_removed (self, item)
+
+    def insert (self, index, item):
+        super (NotifyingBundleMixin, self).insert (index, item)
+        self.getOwnerPackage ()._bundle_item_added (self, item)
+
+    def extend (self, items):
+        items = list (items)
+        super (NotifyingBundleMixin, self).extend (items)
+        package = self.getOwnerPackage ()
+        for item in items:
+            package._bundle_item_added (self, item)
+
+    def remove_items (self, items):
+        items = list (items)
+        super (NotifyingBundleMixin, self).remove_items (items)
+        package = self.getOwnerPackage ()
+        for item in items:
+            package._bundle_item_removed (self, item)
+
+
+class NotifyingXmlBundle (NotifyingBundleMixin, StandardXmlBundle):
+    """
+    A StandardXmlBundle reporting its modifications to its owner package.
+    """
+    pass
+
+
+class NotifyingImportBundle (NotifyingBundleMixin, ImportBundle):
+    """
+    An ImportBundle reporting its modifications to its owner package.
+    """
+    pass
+
+
+
 class RefBundle (AbstractXmlBundle):
     """
     This kind of bundle is constructed with a Modeled class and the
@@ -571,6 +724,12 @@ class RefBundle (AbstractXmlBundle):
         super (RefBundle, self).__delitem__ (index)
         del self.__elt_dict[item]
 
+    def remove_items (self, items):
+        items = list (items)
+        super (RefBundle, self).remove_items (items)
+        for item in items:
+            self.__elt_dict.pop (item, None)
+
     def _assert_add_item (self, item):
         # INTEGRITY CONSTRAINT: xxx
         assert item in self.__source, \
@@ -613,6 +772,19 @@ class InverseDictBundle (StandardXmlBundle):
         self.__inverse_dict[self.__inverse_key (item)] = item.getUri (
                                                                   absolute=True)
 
+    def extend (self, items):
+        items = list (items)
+        super (InverseDictBundle, self).extend (items)
+        for item in items:
+            self.__inverse_dict[self.__inverse_key (item)] = item.getUri (
+                                                                  absolute=True)
+
+    def remove_items (self, items):
+        items = list (items)
+        super (InverseDictBundle, self).remove_items (items)
+        for item in items:
+            self.__inverse_dict.pop (self.__inverse_key (item), None)
+
     def _make_item (self, parent=None, element=None):
         item = super (InverseDictBundle, self)._make_item (parent=parent, element=element)
         self.__inverse_dict[self.__inverse_key (item)] = item.getUri (
@@ -28,6 +28,7 @@ except ImportError:
         json = None
 
 import advene.model.modeled as modeled
+import advene.model.values
 import advene.model.viewable as viewable
 
 from advene.util.expat import PyExpat
@@ -40,6 +41,20 @@ import advene.model.util.uri
 from advene.model.util.auto_properties import auto_properties
 from advene.model.util.mimetype import MimeType
 
+# Hit/miss counters of the Content data and parsed data caches
+cache_statistics = {
+    'data': [0, 0],
+    'parsed': [0, 0],
+    }
+
+def get_cache_statistics():
+    """Return the Content cache statistics.
+
+    @return: a dict with 'data' and 'parsed' keys, whose values are
+             (hits, misses) tuples.
+    """
+    return dict( (k, tuple(v)) for (k, v) in cache_statistics.iteritems() )
+
 class StructuredContent(dict,object):
     """Dict-like object representing structured data.
 
@@ -104,6 +119,15 @@ class Content(modeled.Modeled,
 
     def __init__(self, parent, element):
         modeled.Modeled.__init__(self, element, parent)
+        # Cache of the (textual) data
+        self._cached_data = None
+        # Cache of the parsed data, as a (mimetype, value) tuple
+        self._cached_parsed = None
+
+    def _invalidate_cache(self):
+        """Invalidate the data and parsed data caches."""
+        self._cached_data = None
+        self._cached_parsed = None
 
     def getDomElement (self):
         """Return the DOM element representing this content."""
@@ -118,6 +142,10 @@ class Content(modeled.Modeled,
 
     def getData(self):
         """Return the data associated to the Content"""
+        if self._cached_data is not None:
+            cache_statistics['data'][0] += 1
+            return self._cached_data
+        cache_statistics['data'][1] += 1
         data = StringIO()
         advene.model.util.dom.printElementText(self._getModel(), data)
         if self._getModel().hasAttributeNS(None, 'encoding'):
@@ -125,11 +153,21 @@ class Content(modeled.Modeled,
         else:
             encoding = 'utf-8'
         d=data.getvalue().decode(encoding)
+        if not d and self._getModel().hasAttributeNS(xlinkNS, 'href'):
+            # Values stored in binary form (cf storeValues) are
+            # presented in their textual form.
+            values = self._getStoredValues()
+            if values is not None:
+                d = advene.model.values.to_text(values)
+        if encoding != 'base64':
+            # Do not keep a second copy of binary data
+            self._cached_data = d
         return d
 
     def setData(self, data):
         """Set the content's data"""
         # TODO: parse XML if any
+        self._invalidate_cache()
         for n in self._getModel().childNodes:
             if n.nodeType in (TEXT_NODE, ELEMENT_NODE):
                 self._getModel().removeChild(n)
@@ -142,6 +180,8 @@ class Content(modeled.Modeled,
             self._getModel().setAttributeNS(None, 'encoding', encoding)
             new = self._getDocument().createTextNode(data.encode(encoding))
             self._getModel().appendChild(new)
+        # Update the full-text index
+        self.getOwnerPackage()._text_modified(self._getParent())
 
     def delData(self):
         """Delete the content's data"""
@@ -177,6 +217,7 @@ class Content(modeled.Modeled,
 
     def setUri(self, uri):
         """Set the content's URI"""
+        self._invalidate_cache()
         if uri is not None:
             self.delData()
             self._getModel().setAttributeNS(xlinkNS, 'xlink:href', uri)
@@ -188,6 +229,28 @@ class Content(modeled.Modeled,
         """Delete the content's URI"""
         self.setUri(None)
 
+    def getResource(self):
+        """Return the package resource referenced by the content's URI.
+
+        Package resources (only available in AZP packages) are
+        referenced by a relative URI starting with resources/.
+
+        @return: the resource, or None
+        @rtype: advene.model.resources.ResourceData
+        """
+        uri = self.getUri(absolute=False)
+        if not uri or not uri.startswith('resources/'):
+            return None
+        r = self._getParent().getOwnerPackage().getResources()
+        if r is None:
+            return None
+        try:
+            for name in uri.split('/')[1:]:
+                r = r[name]
+        except KeyError:
+            return None
+        return r
+
     def getStream(self):
         """Return a stream to access the content's data
         FIXME: read/write ?
@@ -196,8 +259,87 @@ class Content(modeled.Modeled,
         if not uri:
             # TODO: maybe find a better way to get a stream from the DOM
             return StringIO(self.getData().encode('utf-8'))
+        r = self.getResource()
+        if r is not None:
+            return r.getStream()
         return advene.model.util.uri.open(uri)
 
+    def storeValues(self, values, name=None):
+        """Store numeric values, for application/x-advene-values contents.
+
+        If name is specified and the package has resources (AZP
+        packages), then the values are stored in binary form in the
+        resources/values/name resource, referenced by the content's
+        URI. Else they are stored as text in the content's data.
+
+        @param values: a sequence of numbers
+        @param name: the resource name
+        @type name: string
+        """
+        resources = None
+        if name is not None:
+            resources = self._getParent().getOwnerPackage().getResources()
+        if resources is None:
+            self.setData(advene.model.values.to_text(values))
+            return
+        if not 'values' in resources:
+            resources['values'] = resources.DIRECTORY_TYPE
+        resources['values'][name] = advene.model.values.to_binary(values)
+        self.setUri('resources/values/' + name)
+
+    def _getStoredValues(self):
+        """Return the values stored in binary form by storeValues, or None.
+        """
+        if self.getMimetype() != 'application/x-advene-values':
+            return None
+        r = self.getResource()
+        if r is None or not hasattr(r, 'getData'):
+            return None
+        data = r.getData()
+        if not advene.model.values.is_binary(data):
+            return None
+        return advene.model.values.from_binary(data)
+
+    def inlineValues(self):
+        """Move the values stored by storeValues back to the content's data.
+
+        The resources/values/ resource holding them is removed. It is
+        invoked when the element is deleted, so that the resource is
+        not orphaned while the element keeps its values (for undo).
+        """
+        uri = self.getUri(absolute=False)
+        if not uri or not uri.startswith('resources/values/'):
+            return
+        values = self._getStoredValues()
+        if values is None:
+            return
+        self.setData(advene.model.values.to_text(values))
+        del self._getParent().getOwnerPackage().getResources()['values'][uri.split('/')[-1]]
+
+    def _textualValues(self):
+        """Temporarily present the values stored by storeValues as text.
+
+        It is used when serializing to plain XML, which has no
+        resources: the reference to the resource is replaced by the
+        textual form of the values.
+
+        @return: a function restoring the reference, or None
+        """
+        uri = self.getUri(absolute=False)
+        if not uri or not uri.startswith('resources/values/'):
+            return None
+        values = self._getStoredValues()
+        if values is None:
+            return None
+        model = self._getModel()
+        text = self._getDocument().createTextNode(advene.model.values.to_text(values))
+        model.removeAttributeNS(xlinkNS, 'href')
+        model.appendChild(text)
+        def restore():
+            model.removeChild(text)
+            model.setAttributeNS(xlinkNS, 'xlink:href', uri)
+        return restore
+
     def getMimetype(self):
         """Return the content's mime-type"""
         if self._getModel().hasAttributeNS(None, 'mime-type'):
@@ -212,6 +354,7 @@ class Content(modeled.Modeled,
 
     def setMimetype(self, value):
         """Set the content's mime-type"""
+        self._cached_parsed = None
         if value is None and self._getModel().hasAttributeNS(None, 'mime-type'):
             self._getModel().removeAttributeNS(None, 'mime-type')
         else:
@@ -256,8 +399,30 @@ class Content(modeled.Modeled,
         It returns a Node object whose attributes are the different
         attributes and children of the node.
 
+        The parsed data is cached until the next modification of the
+        data or mimetype, so the returned structure is shared and
+        should not be modified in place.
+
         @return: a data structure
         """
+        mimetype = self.mimetype
+        cached = self._cached_parsed
+        if cached is not None and cached[0] == mimetype:
+            cache_statistics['parsed'][0] += 1
+            return cached[1]
+        cache_statistics['parsed'][1] += 1
+        value = self._parse()
+        if (not self._getModel().hasAttributeNS(xlinkNS, 'href')
+            or self.getResource() is not None):
+            # Data referenced by external URIs may be modified externally
+            self._cached_parsed = (mimetype, value)
+        return value
+
+    def _parse (self):
+        """Parse the content data according to its mime-type.
+
+        See L{parsed}.
+        """
         # FIXME: the right way to implement this would be to subclass the Content
         # into SimpleStructuredContent, XMLContent...
         # but this would require changes all over the place. Use this for the moment.
@@ -275,22 +440,20 @@ class Content(modeled.Modeled,
             else:
                 return {'data': self.data}
         elif self.mimetype == 'application/x-advene-values':
-            def convert(v):
-                try:
-                    r=float(v)
-                except ValueError:
-                    r=0
-                return r
-            return [ convert(v) for v in self.data.split() ]
+            # Values may be stored in binary form in a resource
+            if self._getModel().hasAttributeNS(xlinkNS, 'href'):
+                data = self.stream.read()
+            else:
+                data = self.data
+            if advene.model.values.is_binary(data):
+                return advene.model.values.from_binary(data)
+            return advene.model.values.parse_text(data)
         #FIXME: we parse x-advene-ruleset as xml for the moment
         elif self.mimetype in ('text/xml',
                                'application/x-advene-ruleset',
                                'application/x-advene-simplequery'):
-            import advene.util.handyxml
-            h=advene.util.handyxml.xml(self.stream)
-            # FIXME: use a cache of DOM trees in order to avoid to
-            # repeatdly parse the same data in the case of repetitive
-            # access to the same element.
+            import advene.util.handyxml as handyxml
+            h=handyxml.xml(self.stream)
             # FIXME: use ElementTree.iterparse
 
             return h
@@ -79,6 +79,11 @@ class AbstractNbeFragment (AbstractFragment, modeled.Modeled):
 
        Implements operators '==' and 'in' (for other ByteCountFragments and
        numbers).
+
+       Begin and end values are parsed from the DOM attributes on first
+       access and cached. Setters update both the cache and the DOM,
+       and report the modification to the annotation owning the
+       fragment.
     """
 
     __metaclass__ = auto_properties
@@ -93,6 +98,8 @@ class AbstractNbeFragment (AbstractFragment, modeled.Modeled):
         value and facultative end or duration values"""
 
         AbstractFragment.__init__(self)
+        self._begin = None
+        self._end = None
         if element is None:
             element = _PseudoElement()
             assert begin is not None, "begin is required"
@@ -107,9 +114,9 @@ class AbstractNbeFragment (AbstractFragment, modeled.Modeled):
             if end is not None:
                 self.setEnd(end)
             elif duration is not None:
-                self.setEnd(self.getBegin() + long(duration))
+                self.setEnd(self._begin + long(duration))
             else:
-                self.setEnd(self.getBegin())
+                self.setEnd(self._begin)
 
     def __repr__(self):
         """Return a string representation of the object."""
@@ -122,16 +129,35 @@ class AbstractNbeFragment (AbstractFragment, modeled.Modeled):
         return "Begin-End (%d,%d)" % (self.getBegin(), self.getEnd())
 
     def getBegin(self):
-        return long(self._getModel().getAttributeNS(None, 'begin'))
+        b = self._begin
+        if b is None:
+            b = self._begin = long(self._getModel().getAttributeNS(None, 'begin'))
+        return b
 
     def setBegin(self, value):
-        return self._getModel().setAttributeNS(None, 'begin', unicode(long(value)))
+        value = long(value)
+        self._getModel().setAttributeNS(None, 'begin', unicode(value))
+        self._begin = value
+        self._bounds_modified()
 
     def getEnd(self):
-        return long(self._getModel().getAttributeNS(None, 'end'))
+        e = self._end
+        if e is None:
+            e = self._end = long(self._getModel().getAttributeNS(None, 'end'))
+        return e
 
     def setEnd(self, value):
-        return self._getModel().setAttributeNS(None, 'end', unicode(long(value)))
+        value = long(value)
+        self._getModel().setAttributeNS(None, 'end', unicode(value))
+        self._end = value
+        self._bounds_modified()
+
+    def _bounds_modified(self):
+        """Report a bounds modification to the owning annotation, if any.
+        """
+        a = self._getParent()
+        if a is not None:
+            a._fragment_modified()
 
     def getDuration(self):
         return self.getEnd() - self.getBegin()
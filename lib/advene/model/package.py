@@ -22,7 +22,9 @@
 import os
 import sys
 import urllib
+import itertools
 import re
+from collections import OrderedDict
 
 import xml.sax
 import xml.dom
@@ -30,6 +32,8 @@ import xml.dom
 import util.uri
 
 from util.auto_properties import auto_properties
+import util.litedom as litedom
+from util.readonlylist import ReadOnlyList
 
 import advene.core.config as config
 import _impl
@@ -37,12 +41,14 @@ import advene.model.annotation as annotation
 import advene.model.modeled as modeled
 import advene.model.query as query
 import advene.model.schema as schema
+import advene.model.temporal as temporal
+import advene.model.textindex as textindex
 import advene.model.view as view
 import advene.model.viewable as viewable
 from advene.model.zippackage import ZipPackage
 from advene.util.expat import PyExpat
 
-from advene.model.bundle import StandardXmlBundle, ImportBundle, InverseDictBundle, SumBundle
+from advene.model.bundle import NotifyingXmlBundle, NotifyingImportBundle, InverseDictBundle, SumBundle
 from advene.model.constants import adveneNS, xmlNS, xmlnsNS, xlinkNS, dcNS
 from advene.model.exception import AdveneException
 
@@ -96,7 +102,7 @@ class Package(modeled.Modeled, viewable.Viewable.withClass('package'),
         if source is None:
             element = self._make_model()
         else:
-            reader = PyExpat.Reader()
+            reader = PyExpat.Reader(lightweight=config.data.preferences['package-lightweight-dom'])
             if source is _get_from_uri:
                 # Determine the package format (plain XML or AZP)
                 # FIXME: should be done by content rather than extension
@@ -135,6 +141,17 @@ class Package(modeled.Modeled, viewable.Viewable.withClass('package'),
         self.__relations = None
         self.__schemas = None
         self.__views = None
+        self.__temporal_index = None
+        self.__text_index = None
+        self.__annotation_types = None
+        self.__relation_types = None
+        self.__id_index = None
+        # Type membership index: type -> OrderedDict of its annotations/relations
+        self.__type_members = None
+        # Reverse index: annotation/relation -> indexed type
+        self.__member_types = None
+        # Cache of the sorted members lists, indexed by type
+        self.__sorted_members = {}
 
     def close(self):
         if self.__zip:
@@ -147,8 +164,11 @@ class Package(modeled.Modeled, viewable.Viewable.withClass('package'),
 
     def _make_model(self):
         """Build a new empty annotation model"""
-        di = xml.dom.getDOMImplementation()
-        doc = di.createDocument(adveneNS, "package", None)
+        if config.data.preferences['package-lightweight-dom']:
+            doc = litedom.createDocument(adveneNS, "package", None)
+        else:
+            di = xml.dom.getDOMImplementation()
+            doc = di.createDocument(adveneNS, "package", None)
 
         elt = doc.documentElement
         elt.setAttributeNS(xmlNS,   "xml:base", unicode(self.__uri))
@@ -227,9 +247,59 @@ class Package(modeled.Modeled, viewable.Viewable.withClass('package'),
         """Return a collection of this package's annotations"""
         if self.__annotations is None:
             e = self._getChild((adveneNS, "annotations"))
-            self.__annotations = StandardXmlBundle(self, e, annotation.Annotation)
+            self.__annotations = NotifyingXmlBundle(self, e, annotation.Annotation)
         return self.__annotations
 
+    def createAnnotations(self, specs):
+        """Create annotations and append them to the package.
+
+        The annotations are appended in one operation (cf the extend
+        method of bundles), which is much faster than creating and
+        appending them one at a time.
+
+        @param specs: the createAnnotation keyword parameters of each annotation
+        @type specs: iterable of dicts
+        @return: the list of the created annotations
+        """
+        annotations = [ self.createAnnotation(**kw) for kw in specs ]
+        self.getAnnotations().extend(annotations)
+        return annotations
+
+    def deleteElements(self, elements):
+        """Delete annotations and relations from the package.
+
+        The relations involving the deleted annotations are deleted as
+        well, and removed from the relations of their other members.
+        Each bundle is updated in one pass (cf the remove_items method
+        of bundles), so that the deletion takes a time linear in the
+        size of the package instead of quadratic.
+
+        @param elements: the annotations and relations to delete
+        @type elements: iterable
+        @return: the list of the deleted annotations, then relations
+        """
+        annotations = OrderedDict()
+        relations = OrderedDict()
+        for el in elements:
+            if isinstance(el, annotation.Annotation):
+                annotations[el] = None
+            elif isinstance(el, annotation.Relation):
+                relations[el] = None
+            else:
+                raise AdveneException("%s is neither an annotation nor a relation" % el)
+        for a in annotations:
+            for r in a.getRelations():
+                relations[r] = None
+        for r in relations:
+            for a in r.getMembers():
+                if r in a._relations:
+                    a._relations.remove(r)
+        if relations:
+            self.getRelations().remove_items(relations)
+        if annotations:
+            self.getAnnotations().remove_items(annotations)
+        return list(annotations) + list(relations)
+
     def getRelations(self):
         """Return a collection of this package's relations"""
         if self.__relations is None:
@@ -237,43 +307,230 @@ class Package(modeled.Modeled, viewable.Viewable.withClass('package'),
             # yes, "annotations"!
             #relations are under the same element as annotations
             # FIXME: is this always the case ?
-            self.__relations = StandardXmlBundle(self, e, annotation.Relation)
+            self.__relations = NotifyingXmlBundle(self, e, annotation.Relation)
         return self.__relations
 
     def getSchemas(self):
         """Return a collection of this package's schemas"""
         if self.__schemas is None:
             e = self._getChild((adveneNS, "schemas"))
-            self.__schemas = ImportBundle(self, e, schema.Schema)
+            self.__schemas = NotifyingImportBundle(self, e, schema.Schema)
         return self.__schemas
 
     def getViews(self):
         """Return a collection of this package's view"""
         if self.__views is None:
             e = self._getChild((adveneNS, "views"))
-            self.__views = ImportBundle(self, e, view.View)
+            self.__views = NotifyingImportBundle(self, e, view.View)
         return self.__views
 
     def getQueries(self):
         """Return a collection of this package's queries"""
         if self.__queries is None:
             e = self._getChild((adveneNS, "queries"))
-            self.__queries = ImportBundle(self, e, query.Query)
+            self.__queries = NotifyingImportBundle(self, e, query.Query)
         return self.__queries
 
     def getAnnotationTypes (self):
-        """Return a collection of this package's annotation types"""
-        r = SumBundle ()
-        for s in self.getSchemas ():
-            r += s.getAnnotationTypes ()
-        return r
+        """Return a collection of this package's annotation types.
+
+        The collection is cached, and rebuilt when schemas or
+        annotation types are added or removed.
+        """
+        if self.__annotation_types is None:
+            r = SumBundle ()
+            for s in self.getSchemas ():
+                r += s.getAnnotationTypes ()
+            self.__annotation_types = r
+        return self.__annotation_types
 
     def getRelationTypes(self):
-        """Return a collection of this package's relation types"""
-        r = SumBundle ()
-        for s in self.getSchemas ():
-            r += s.getRelationTypes ()
-        return r
+        """Return a collection of this package's relation types.
+
+        The collection is cached, and rebuilt when schemas or
+        relation types are added or removed.
+        """
+        if self.__relation_types is None:
+            r = SumBundle ()
+            for s in self.getSchemas ():
+                r += s.getRelationTypes ()
+            self.__relation_types = r
+        return self.__relation_types
+
+    def getTemporalIndex(self):
+        """Return the temporal index of this package's annotations.
+
+        The index is built on first access, then maintained along
+        annotation additions and deletions. Annotation modifications
+        must be reported through _annotation_modified.
+        """
+        if self.__temporal_index is None:
+            self.__temporal_index = temporal.TemporalIndex(self.getAnnotations())
+        return self.__temporal_index
+
+    def getTextIndex(self):
+        """Return the full-text index of this package's annotations and relations.
+
+        The index is built on first access, then maintained along
+        additions, deletions and content or tags modifications.
+        """
+        if self.__text_index is None:
+            self.__text_index = textindex.TextIndex(itertools.chain(self.getAnnotations(),
+                                                                     self.getRelations()))
+        return self.__text_index
+
+    def _text_modified(self, element):
+        """Update the full-text index after a content or tags modification.
+
+        It is invoked by Content.setData and Tagged._updateTagsMeta.
+        """
+        if self.__text_index is not None:
+            self.__text_index.update(element)
+
+    def _bundle_item_added(self, bundle, item):
+        """Update the package indexes after an element addition.
+
+        It is invoked by the package bundles (cf NotifyingBundleMixin).
+        """
+        if isinstance(item, annotation.Annotation):
+            self._annotation_added(item)
+        elif isinstance(item, annotation.Relation):
+            self._add_member(item)
+            if self.__text_index is not None:
+                self.__text_index.add(item)
+        elif isinstance(item, schema.Schema):
+            self._invalidate_types()
+            # The schema brings its own types
+            self.__id_index = None
+        elif isinstance(item, schema.AnnotationType):
+            self.__annotation_types = None
+        elif isinstance(item, schema.RelationType):
+            self.__relation_types = None
+        self._update_id_index(item)
+
+    def _bundle_item_removed(self, bundle, item):
+        """Update the package indexes after an element deletion.
+
+        It is invoked by the package bundles (cf NotifyingBundleMixin).
+        """
+        if isinstance(item, annotation.Annotation):
+            self._annotation_removed(item)
+            item.getContent().inlineValues()
+        elif isinstance(item, annotation.Relation):
+            self._remove_member(item)
+            if self.__text_index is not None:
+                self.__text_index.remove(item)
+            item.getContent().inlineValues()
+        elif isinstance(item, schema.Schema):
+            self._invalidate_types()
+            self.__id_index = None
+        elif isinstance(item, schema.AnnotationType):
+            self.__annotation_types = None
+        elif isinstance(item, schema.RelationType):
+            self.__relation_types = None
+        self._update_id_index(item)
+
+    def _invalidate_types(self):
+        """Invalidate the cached annotationTypes and relationTypes collections."""
+        self.__annotation_types = None
+        self.__relation_types = None
+
+    def _annotation_added(self, a):
+        """Update the package indexes after an annotation addition."""
+        if self.__temporal_index is not None:
+            self.__temporal_index.add(a)
+        if self.__text_index is not None:
+            self.__text_index.add(a)
+        self._add_member(a)
+
+    def _annotation_removed(self, a):
+        """Update the package indexes after an annotation deletion."""
+        if self.__temporal_index is not None:
+            self.__temporal_index.remove(a)
+        if self.__text_index is not None:
+            self.__text_index.remove(a)
+        self._remove_member(a)
+
+    def _annotation_modified(self, a):
+        """Update the package indexes after an annotation modification.
+
+        Both fragment and type modifications are taken into account.
+        """
+        if self.__temporal_index is not None:
+            self.__temporal_index.update(a)
+        self._update_member(a)
+
+    def _build_type_members(self):
+        """Build the type membership index."""
+        members = {}
+        member_types = {}
+        for l in (self.getAnnotations(), self.getRelations()):
+            for el in l:
+                t = el.getType()
+                member_types[el] = t
+                try:
+                    members[t][el] = None
+                except KeyError:
+                    members[t] = OrderedDict( ((el, None), ) )
+        self.__type_members = members
+        self.__member_types = member_types
+        self.__sorted_members.clear()
+
+    def _add_member(self, el):
+        """Add an annotation or relation to the type membership index."""
+        if self.__type_members is None:
+            return
+        t = el.getType()
+        self.__member_types[el] = t
+        self.__type_members.setdefault(t, OrderedDict())[el] = None
+        self.__sorted_members.pop(t, None)
+
+    def _remove_member(self, el):
+        """Remove an annotation or relation from the type membership index."""
+        if self.__type_members is None:
+            return
+        t = self.__member_types.pop(el, None)
+        if t is not None:
+            del self.__type_members[t][el]
+            self.__sorted_members.pop(t, None)
+
+    def _update_member(self, el):
+        """Update the type membership index after an element modification."""
+        if self.__type_members is None:
+            return
+        t = self.__member_types.get(el)
+        if t is not el.getType():
+            self._remove_member(el)
+            self._add_member(el)
+        else:
+            # The order of the members may have changed
+            self.__sorted_members.pop(t, None)
+
+    def _get_type_members(self, t):
+        """Return the annotations or relations of the given type.
+
+        Annotations are sorted by begin time, relations are returned in
+        their package order. The returned list is shared and cannot be
+        modified. It is not updated after package modifications: get a
+        new one after modifications.
+
+        @param t: an annotation type or a relation type
+        @return: the members of the type
+        @rtype: ReadOnlyList
+        """
+        try:
+            return self.__sorted_members[t]
+        except KeyError:
+            pass
+        if self.__type_members is None:
+            self._build_type_members()
+        members = self.__type_members.get(t, ())
+        if isinstance(t, schema.AnnotationType):
+            l = ReadOnlyList(sorted(members, key=lambda a: a.fragment.begin))
+        else:
+            l = ReadOnlyList(members)
+        self.__sorted_members[t] = l
+        return l
 
     def getResources(self):
         if self.__zip is None:
@@ -281,17 +538,45 @@ class Package(modeled.Modeled, viewable.Viewable.withClass('package'),
         else:
             return self.__zip.getResources(package=self)
 
+    def _get_id_bundles(self):
+        """Return the bundles searched by get_element_by_id, by priority order."""
+        return (self.getSchemas(), self.getViews(), self.getAnnotationTypes(),
+                self.getRelationTypes(), self.getAnnotations(), self.getQueries(),
+                self.getRelations())
+
+    def _update_id_index(self, item):
+        """Update the id index entry of item after its addition or deletion."""
+        if self.__id_index is None:
+            return
+        key = item.getUri(absolute=True)
+        for b in self._get_id_bundles():
+            el = b.get(key, None)
+            if el is not None:
+                self.__id_index[key] = el
+                break
+        else:
+            self.__id_index.pop(key, None)
+
     def get_element_by_id(self, i):
+        """Return the element of the package with the given id.
+
+        Elements are looked up in an index built on first access, and
+        maintained along additions and deletions of elements.
+
+        @param i: the element id
+        @type i: string
+        @return: the element, or None
+        """
         if not i:
             return None
-        uri=self.uri
-        for m in (self.getSchemas, self.getViews, self.getAnnotationTypes,
-                  self.getRelationTypes, self.getAnnotations, self.getQueries,
-                  self.getRelations):
-            el=m().get( '#'.join( (uri, i) ), None )
-            if el is not None:
-                return el
-        return None
+        if self.__id_index is None:
+            index = {}
+            # Update in reverse priority order, so that higher
+            # priority elements override lower priority ones
+            for b in reversed(self._get_id_bundles()):
+                index.update(b._dict)
+            self.__id_index = index
+        return self.__id_index.get( '#'.join( (self.uri, i) ), None )
 
     def generate_statistics(self):
         """Generate the statistics.xml file.
@@ -342,6 +627,7 @@ class Package(modeled.Modeled, viewable.Viewable.withClass('package'),
             stream = open (self.__zip.getContentsFile(), "w")
             self.serialize(stream)
             stream.close ()
+            self.__zip.set_modified(u'content.xml')
 
             # Generate the statistics
             self.__zip.update_statistics(self)
@@ -349,10 +635,21 @@ class Package(modeled.Modeled, viewable.Viewable.withClass('package'),
             # Save the whole .azp
             self.__zip.save(name)
         else:
-            # Assuming plain XML format
-            stream = open (name, "w")
-            self.serialize(stream)
-            stream.close ()
+            # Assuming plain XML format. It has no resources, so
+            # values stored in binary form are saved as text.
+            restore = []
+            if self.__zip is not None:
+                for e in itertools.chain(self.getAnnotations(), self.getRelations()):
+                    r = e.getContent()._textualValues()
+                    if r is not None:
+                        restore.append(r)
+            try:
+                stream = open (name, "w")
+                self.serialize(stream)
+                stream.close ()
+            finally:
+                for r in restore:
+                    r()
 
     def _recursive_save (self):
         """Save recursively this packages with all its imported packages"""
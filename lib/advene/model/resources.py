@@ -26,6 +26,7 @@
 
 """
 import os
+import errno
 import mimetypes
 import urllib
 import base64
@@ -52,7 +53,9 @@ class ResourceData(viewable.Viewable.withClass('data', 'getMimetype')):
         self.author=None
         self.date=None
 
-        self.file_ = self.package.tempfile('resources', resourcepath.replace('/', os.path.sep, -1) )
+        # Member name in the package
+        self._name = '/'.join( ('resources', resourcepath) )
+        self._file = self.package.tempfile('resources', resourcepath.replace('/', os.path.sep, -1) )
         self._mimetype = None
         self.title = str(self)
 
@@ -62,17 +65,27 @@ class ResourceData(viewable.Viewable.withClass('data', 'getMimetype')):
     def getId(self):
         return self.resourcepath.split('/')[-1]
 
+    def _get_file(self):
+        """Return the path of the data file.
+
+        The data is extracted from the package archive if necessary.
+        """
+        return self.package.extract_member(self._name)
+    file_ = property(_get_file)
+
     def getData(self):
-        return open(self.file_, 'rb').read()
+        return self.package.read_member(self._name)
 
     def setData(self, data):
-        f=open(self.file_, 'wb')
+        self.package.discard_member(self._name)
+        f=open(self._file, 'wb')
         f.write(data)
         f.close()
+        self.package.set_modified(self._name)
 
     def getMimetype(self):
         if self._mimetype is None:
-            (mimetype, encoding) = mimetypes.guess_type(self.file_)
+            (mimetype, encoding) = mimetypes.guess_type(self._file)
             if mimetype is None:
                 mimetype = "text/plain"
             self._mimetype=mimetype
@@ -92,7 +105,7 @@ class ResourceData(viewable.Viewable.withClass('data', 'getMimetype')):
         return "%s#data_%s" % (self.package.uri, p)
 
     def getStream(self):
-        return open(self.file_, 'rb')
+        return self.package.open_member(self._name)
 
     def getDataBase64(self):
         data = self.getData()
@@ -117,17 +130,28 @@ class Resources:
         # Resource path name
         self.resourcepath = resourcepath
 
+        # Member name in the package
+        self._name = '/'.join( ('resources', resourcepath) ).rstrip('/')
         # Real directory
-        self.dir_ = self.package.tempfile( 'resources', resourcepath.replace('/', os.path.sep, -1) )
+        self._dir = self.package.tempfile( 'resources', resourcepath.replace('/', os.path.sep, -1) )
         self.filenames=None
         self.title = str(self)
 
+    def _get_dir(self):
+        """Return the path of the directory.
+
+        The data of its contents is extracted from the package
+        archive if necessary.
+        """
+        return self.package.extract_directory(self._name)
+    dir_ = property(_get_dir)
+
+    def _member(self, key):
+        return '/'.join( (self._name, key) )
+
     def init_filenames(self):
         if self.filenames is None:
-            try:
-                self.filenames=os.listdir(self.dir_)
-            except OSError:
-                self.filenames=[]
+            self.filenames=self.package.list_members(self._name)
 
     def __str__(self):
         if self.resourcepath == "":
@@ -147,12 +171,10 @@ class Resources:
         return self.filenames
 
     def __contains__(self, key):
-        fname=os.path.join( self.dir_, key )
-        return os.path.exists(fname)
+        return self.package.member_exists(self._member(key))
 
     def __getitem__(self, key):
-        fname=os.path.join( self.dir_, key )
-        if not os.path.exists(fname):
+        if not self.package.member_exists(self._member(key)):
             raise KeyError
 
         # resource path for the new resource
@@ -164,7 +186,7 @@ class Resources:
         if p in self._children_cache:
             return self._children_cache[p]
 
-        if os.path.isdir(fname):
+        if self.package.member_isdir(self._member(key)):
             r=Resources(self.package, p, parent=self)
         else:
             # It is a file. Return its ResourceData
@@ -178,21 +200,24 @@ class Resources:
         To create a new directory, use item == Resources.DIRECTORY_TYPE
         """
         self.filenames = None
-        if not os.path.exists(self.dir_):
-            os.mkdir(self.dir_)
-        fname=os.path.join( self.dir_, key )
+        if not os.path.exists(self._dir):
+            os.mkdir(self._dir)
+        fname=os.path.join( self._dir, key )
+        name=self._member(key)
 
         if item == self.DIRECTORY_TYPE:
-            if os.path.exists(fname):
-                if not os.path.isdir(fname):
+            if self.package.member_exists(name):
+                if not self.package.member_isdir(name):
                     raise Exception("%s resource exists but is not a folder!" % key)
             else:
                 os.mkdir(fname)
         else:
             # Some content
+            self.package.discard_member(name)
             f=open(fname, 'wb')
             f.write(item)
             f.close()
+            self.package.set_modified(name)
 
 
     def __delitem__(self, key):
@@ -207,11 +232,16 @@ class Resources:
         except KeyError:
             pass
         self.filenames = None
-        fname=os.path.join( self.dir_, key )
-        if os.path.isdir(fname):
+        fname=os.path.join( self._dir, key )
+        name=self._member(key)
+        if self.package.member_isdir(name):
+            if self.package.list_members(name):
+                raise OSError(errno.ENOTEMPTY, os.strerror(errno.ENOTEMPTY), fname)
             os.rmdir(fname)
-        else:
+        elif self.package.is_extracted(name):
             os.unlink(fname)
+        else:
+            self.package.discard_member(name)
 
     def getUri (self):
         """Return the URI of the element.
@@ -23,7 +23,7 @@ import advene.model.viewable as viewable
 
 import advene.model.util.mimetype
 
-from advene.model.bundle import ImportBundle
+from advene.model.bundle import NotifyingImportBundle
 from advene.model.constants import *
 
 from advene.model.util.auto_properties import auto_properties
@@ -191,10 +191,12 @@ class AnnotationType(AbstractType,
     getLocalName = staticmethod(getLocalName)
 
     def getAnnotations (self):
-        # FIXME: return an iterator instead of a full fledged list
-        return sorted((a for a in self.getRootPackage ().getAnnotations ()
-                       if a.getType() == self),
-                      key=lambda a: a.fragment.begin)
+        """Return the annotations of this type, sorted by begin time.
+
+        The returned list is maintained by the package, and cannot be
+        modified.
+        """
+        return self.getRootPackage ()._get_type_members (self)
 
 class RelationType(AbstractType,
                    viewable.Viewable.withClass('relation-type')):
@@ -246,9 +248,12 @@ class RelationType(AbstractType,
     getLocalName = staticmethod(getLocalName)
 
     def getRelations (self):
-        # FIXME: return an iterator instead of a full fledged list
-        return [ a for a in self.getRootPackage ().getRelations ()
-                   if a.getType() == self ]
+        """Return the relations of this type.
+
+        The returned list is maintained by the package, and cannot be
+        modified.
+        """
+        return self.getRootPackage ()._get_type_members (self)
 
     def getHackedMemberTypes (self):
         """
@@ -381,14 +386,14 @@ class Schema(modeled.Importable,
         """Return a collection of this schema's annotation types"""
         if self.__annotation_types is None:
             e = self._getChild((adveneNS, "annotation-types"))
-            self.__annotation_types = ImportBundle(self, e, AnnotationType)
+            self.__annotation_types = NotifyingImportBundle(self, e, AnnotationType)
         return self.__annotation_types
 
     def getRelationTypes(self):
         """Return a collection of this schema's relation types"""
         if self.__relation_types is None:
             e = self._getChild((adveneNS, "relation-types"))
-            self.__relation_types = ImportBundle(self, e, RelationType)
+            self.__relation_types = NotifyingImportBundle(self, e, RelationType)
         return self.__relation_types
 
 # simple way to do it,
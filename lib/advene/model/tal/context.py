@@ -19,6 +19,7 @@
 import sys
 
 from cStringIO import StringIO
+from hashlib import md5
 
 from simpletal import simpleTAL
 from simpletal import simpleTALES
@@ -27,8 +28,43 @@ from advene.model.exception import AdveneException
 
 import global_methods
 
+# Compiled templates, indexed by cache key (usually a view URI). Values
+# are (signature, template) tuples, where signature identifies the
+# template source and kind (HTML or XML).
+_template_cache = {}
+
+def invalidate_template_cache(key=None):
+    """Invalidate the compiled template cache for the given key.
+
+    If key is None, the whole cache is emptied.
+    """
+    if key is None:
+        _template_cache.clear()
+    else:
+        _template_cache.pop(key, None)
+
 class AdveneTalesException(AdveneException): pass
 
+def split_path(expr):
+    """Split a TALES path expression into its segments.
+
+    Leading and trailing quotes are removed, as simpleTALES does.
+
+    @param expr: the path expression
+    @type expr: string
+    @return: the path segments
+    @rtype: list
+    """
+    # Check for and correct for trailing/leading quotes
+    if (expr.startswith ('"') or expr.startswith ("'")):
+        if (expr.endswith ('"') or expr.endswith ("'")):
+            expr = expr [1:-1]
+        else:
+            expr = expr [1:]
+    elif (expr.endswith ('"') or expr.endswith ("'")):
+        expr = expr [0:-1]
+    return expr.split ('/')
+
 class AdveneTalesPathException(AdveneTalesException): pass
 
 class DebugLogger:
@@ -128,16 +164,11 @@ class _advene_context (simpleTALES.Context):
 
     def traversePath (self, expr, canCall=1):
                 # canCall only applies to the *final* path destination, not points down the path.
-                # Check for and correct for trailing/leading quotes
-                if (expr.startswith ('"') or expr.startswith ("'")):
-                        if (expr.endswith ('"') or expr.endswith ("'")):
-                                expr = expr [1:-1]
-                        else:
-                                expr = expr [1:]
-                elif (expr.endswith ('"') or expr.endswith ("'")):
-                        expr = expr [0:-1]
-                pathList = expr.split ('/')
+                return self.traversePathList (split_path (expr), canCall)
 
+    def traversePathList (self, pathList, canCall=1):
+                """Traverse a path already split into segments (cf split_path).
+                """
                 path = pathList[0]
                 if path.startswith ('?'):
                         path = path[1:]
@@ -271,30 +302,65 @@ class AdveneContext(_advene_context):
         else:
             raise AdveneTalesException("%s is not a valid method" % function)
 
-    def interpret (self, view_source, mimetype, stream=None):
+    def compileTemplate (self, view_source, xml=False):
+        """
+        Compile the TAL template available through the stream or string
+        view_source, as HTML or XML depending on the xml parameter, and
+        return the template.
+        """
+        if isinstance (view_source, str) or isinstance (view_source, unicode):
+            view_source = StringIO (unicode(view_source))
+
+        if xml:
+            compiler = simpleTAL.XMLTemplateCompiler ()
+            compiler.log = self.log
+            compiler.parseTemplate (view_source)
+        else:
+            compiler = simpleTAL.HTMLTemplateCompiler ()
+            compiler.log = self.log
+            compiler.parseTemplate (view_source, 'utf-8')
+        return compiler.getTemplate ()
+
+    def interpret (self, view_source, mimetype, stream=None, cache_key=None):
         """
         Interpret the TAL template available through the stream view_source,
         with the mime-type mimetype, and print the result to the stream
         "stream". The stream is returned. If stream is not given or None, a
         StringIO will be created and returned.
+
+        If cache_key (typically the view URI) is given, the compiled
+        template is cached and reused as long as the source does not
+        change.
         """
         if stream is None:
             stream = StringIO ()
 
-        if isinstance (view_source, str) or isinstance (view_source, unicode):
-            view_source = StringIO (unicode(view_source))
+        xml = not (mimetype is None or mimetype.startswith('text/'))
+
+        template = None
+        if cache_key is not None:
+            if not (isinstance (view_source, str) or isinstance (view_source, unicode)):
+                # Stream. Its content is encoded in utf-8.
+                view_source = StringIO (view_source.read ())
+                source = view_source.getvalue ()
+            elif isinstance (view_source, unicode):
+                source = view_source.encode ('utf-8')
+            else:
+                source = view_source
+            signature = (xml, md5 (source).digest ())
+            cached = _template_cache.get (cache_key)
+            if cached is not None and cached[0] == signature:
+                template = cached[1]
+
+        if template is None:
+            template = self.compileTemplate (view_source, xml)
+            if cache_key is not None:
+                _template_cache[cache_key] = (signature, template)
 
         kw = {}
-        if mimetype is None or mimetype.startswith('text/'):
-            compiler = simpleTAL.HTMLTemplateCompiler ()
-            compiler.log = self.log
-            compiler.parseTemplate (view_source, 'utf-8')
-        else:
-            compiler = simpleTAL.XMLTemplateCompiler ()
-            compiler.log = self.log
-            compiler.parseTemplate (view_source)
+        if xml:
             kw["suppressXMLDeclaration"] = 1
-        compiler.getTemplate ().expand (context=self, outputFile=stream, outputEncoding='utf-8', **kw)
+        template.expand (context=self, outputFile=stream, outputEncoding='utf-8', **kw)
 
         return stream
 
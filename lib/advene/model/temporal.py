@@ -0,0 +1,349 @@
+#
+# Advene: Annotate Digital Videos, Exchange on the NEt
+# Copyright (C) 2008-2012 Olivier Aubert <olivier.aubert@liris.cnrs.fr>
+#
+# Advene is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# Advene is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Advene; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
+#
+"""Temporal index of annotations.
+
+The L{IntervalIndex} class indexes arbitrary items along [begin, end]
+intervals. It answers the "items active at t", "items overlapping
+[a, b]" and "next begin after t" queries in O(log n + k).
+
+The L{TemporalIndex} class maintains such indexes for the annotations
+of a package, globally and for each annotation type. It is available
+through the Package.temporalIndex property.
+"""
+
+import bisect
+import heapq
+import itertools
+import math
+import operator
+
+from advene.model.fragment import AbstractNbeFragment
+
+class IntervalIndex(object):
+    """Index of items over closed [begin, end] intervals.
+
+    Most items are stored in a static structure, sorted along their
+    begin values and augmented with the maximum end value of each
+    implicit subtree. Modifications are buffered (new items in
+    _pending, obsolete ones in _removed) and the static structure is
+    rebuilt from scratch at query time, once the buffer becomes larger
+    than sqrt(n). Bulk modifications thus do not cost more than a
+    dict operation per item.
+    """
+
+    # Minimum size of the modification buffer before a rebuild
+    rebuild_threshold = 64
+
+    def __init__(self, items=None):
+        """Create an index.
+
+        @param items: an iterable of (item, begin, end) triplets
+        """
+        # Bounds of the indexed items, indexed by item
+        self._bounds = {}
+        if items is not None:
+            for item, begin, end in items:
+                self._bounds[item] = (begin, end)
+        self._rebuild()
+
+    def _rebuild(self):
+        """Rebuild the static structure from the indexed bounds.
+        """
+        l = sorted( ( (b, e, item) for (item, (b, e)) in self._bounds.iteritems() ),
+                    key=operator.itemgetter(0, 1) )
+        self._begins = [ t[0] for t in l ]
+        self._ends = [ t[1] for t in l ]
+        self._items = [ t[2] for t in l ]
+        l.sort(key=operator.itemgetter(1))
+        self._end_keys = [ t[1] for t in l ]
+        self._by_end = [ (t[2], t[0], t[1]) for t in l ]
+
+        # Max end value of each implicit subtree. The subtree of
+        # [lo, hi[ is rooted at (lo + hi) / 2.
+        ends = self._ends
+        maxends = [ None ] * len(ends)
+        def build(lo, hi):
+            if lo >= hi:
+                return None
+            mid = (lo + hi) // 2
+            m = max(ends[mid], build(lo, mid), build(mid + 1, hi))
+            maxends[mid] = m
+            return m
+        build(0, len(ends))
+        self._maxends = maxends
+
+        self._pending = {}
+        self._removed = set()
+
+    def _check(self):
+        """Rebuild the static structure if the modification buffer is too large.
+        """
+        size = len(self._pending) + len(self._removed)
+        if size > max(self.rebuild_threshold, int(math.sqrt(len(self._bounds)))):
+            self._rebuild()
+
+    def __len__(self):
+        return len(self._bounds)
+
+    def __contains__(self, item):
+        return item in self._bounds
+
+    def __iter__(self):
+        """Iterate over the items, sorted by begin.
+        """
+        for item, b, e in self.iter_begins():
+            yield item
+
+    def bounds(self, item):
+        """Return the (begin, end) bounds with which the item is indexed.
+        """
+        return self._bounds[item]
+
+    def add(self, item, begin, end):
+        """Add an item to the index.
+        """
+        if item in self._bounds:
+            self.remove(item)
+        self._bounds[item] = (begin, end)
+        self._pending[item] = (begin, end)
+
+    def remove(self, item):
+        """Remove an item from the index.
+        """
+        del self._bounds[item]
+        if item in self._pending:
+            del self._pending[item]
+        else:
+            self._removed.add(item)
+
+    def update(self, item, begin, end):
+        """Update the bounds of an item.
+        """
+        if self._bounds.get(item) != (begin, end):
+            self.add(item, begin, end)
+
+    def overlapping(self, begin, end):
+        """Return the items overlapping the [begin, end] interval, sorted by begin.
+        """
+        self._check()
+        begins = self._begins
+        ends = self._ends
+        maxends = self._maxends
+        found = []
+        stack = [ (0, len(begins)) ]
+        while stack:
+            lo, hi = stack.pop()
+            if lo >= hi:
+                continue
+            mid = (lo + hi) // 2
+            if maxends[mid] < begin:
+                continue
+            stack.append( (lo, mid) )
+            if begins[mid] <= end:
+                if ends[mid] >= begin:
+                    found.append(mid)
+                stack.append( (mid + 1, hi) )
+        found.sort()
+        items = self._items
+        removed = self._removed
+        res = [ (begins[i], ends[i], items[i])
+                for i in found
+                if not items[i] in removed ]
+        if self._pending:
+            res.extend( (b, e, item)
+                        for (item, (b, e)) in self._pending.iteritems()
+                        if b <= end and e >= begin )
+            res.sort(key=operator.itemgetter(0, 1))
+        return [ t[2] for t in res ]
+
+    def at(self, position):
+        """Return the items active at the given position, sorted by begin.
+        """
+        return self.overlapping(position, position)
+
+    def next_begin(self, position):
+        """Return the first begin value strictly after position, or None.
+        """
+        self._check()
+        begins = self._begins
+        items = self._items
+        removed = self._removed
+        res = None
+        for i in xrange(bisect.bisect_right(begins, position), len(begins)):
+            if not items[i] in removed:
+                res = begins[i]
+                break
+        for (b, e) in self._pending.itervalues():
+            if b > position and (res is None or b < res):
+                res = b
+        return res
+
+    def _merge(self, static, key, position):
+        """Merge the static sequence with the pending items.
+
+        @param static: an iterator over (item, begin, end) triplets, sorted along key
+        @param key: 1 to sort along begin values, 2 along end values
+        @param position: the minimum key value for pending items (None for all)
+        """
+        removed = self._removed
+        if removed:
+            static = ( t for t in static if not t[0] in removed )
+        if not self._pending:
+            return static
+        pending = [ (item, b, e) for (item, (b, e)) in self._pending.iteritems() ]
+        if position is not None:
+            pending = [ t for t in pending if t[key] >= position ]
+        pending.sort(key=operator.itemgetter(key))
+        # Decorate the triplets so that only keys and sequence numbers
+        # are compared.
+        counter = itertools.count()
+        return ( t[2] for t in heapq.merge(
+                ( (t[key], counter.next(), t) for t in static ),
+                ( (t[key], counter.next(), t) for t in pending ) ) )
+
+    def iter_begins(self, position=None):
+        """Iterate over (item, begin, end) triplets with begin >= position, sorted by begin.
+        """
+        self._check()
+        if position is None:
+            start = 0
+        else:
+            start = bisect.bisect_left(self._begins, position)
+        static = itertools.izip(itertools.islice(self._items, start, None),
+                                itertools.islice(self._begins, start, None),
+                                itertools.islice(self._ends, start, None))
+        return self._merge(static, 1, position)
+
+    def iter_ends(self, position=None):
+        """Iterate over (item, begin, end) triplets with end >= position, sorted by end.
+        """
+        self._check()
+        if position is None:
+            start = 0
+        else:
+            start = bisect.bisect_left(self._end_keys, position)
+        return self._merge(itertools.islice(self._by_end, start, None), 2, position)
+
+class TemporalIndex(object):
+    """Temporal index of the annotations of a package.
+
+    It maintains an IntervalIndex of all annotations, and one for each
+    annotation type. Annotations with a non-numerical fragment are
+    ignored.
+
+    The index must be kept up to date by calling the add, remove and
+    update methods when annotations are created, deleted or
+    modified. The Package takes care of it for additions and deletions
+    through its annotations bundle, and the controller for
+    modifications (AnnotationEditEnd event).
+    """
+    def __init__(self, annotations=()):
+        # Annotation types of the indexed annotations
+        self._types = {}
+        by_type = {}
+        l = []
+        for a in annotations:
+            f = a.fragment
+            if not isinstance(f, AbstractNbeFragment):
+                continue
+            t = (a, f.begin, f.end)
+            l.append(t)
+            self._types[a] = a.type
+            by_type.setdefault(a.type, []).append(t)
+        self._all = IntervalIndex(l)
+        self._by_type = dict( (at, IntervalIndex(items))
+                              for (at, items) in by_type.iteritems() )
+
+    def _index(self, type=None):
+        """Return the IntervalIndex for the given type (or all annotations).
+        """
+        if type is None:
+            return self._all
+        try:
+            return self._by_type[type]
+        except KeyError:
+            return self._by_type.setdefault(type, IntervalIndex())
+
+    def __len__(self):
+        return len(self._all)
+
+    def __contains__(self, annotation):
+        return annotation in self._all
+
+    def add(self, annotation):
+        """Index the given annotation.
+        """
+        f = annotation.fragment
+        if not isinstance(f, AbstractNbeFragment):
+            return
+        if annotation in self._types:
+            self.remove(annotation)
+        b, e = f.begin, f.end
+        t = annotation.type
+        self._types[annotation] = t
+        self._all.add(annotation, b, e)
+        self._index(t).add(annotation, b, e)
+
+    def remove(self, annotation):
+        """Remove the given annotation from the index.
+        """
+        t = self._types.pop(annotation, None)
+        if t is None:
+            return
+        self._all.remove(annotation)
+        self._by_type[t].remove(annotation)
+
+    def update(self, annotation):
+        """Update the index after a modification of the annotation.
+
+        Both fragment and type modifications are taken into account.
+        """
+        t = self._types.get(annotation)
+        if t is None or t is not annotation.type:
+            self.add(annotation)
+            return
+        f = annotation.fragment
+        b, e = f.begin, f.end
+        self._all.update(annotation, b, e)
+        self._by_type[t].update(annotation, b, e)
+
+    def at(self, position, type=None):
+        """Return the annotations active at the given position, sorted by begin.
+        """
+        return self._index(type).at(position)
+
+    def overlapping(self, begin, end, type=None):
+        """Return the annotations overlapping [begin, end], sorted by begin.
+        """
+        return self._index(type).overlapping(begin, end)
+
+    def next_begin(self, position, type=None):
+        """Return the first annotation begin strictly after position, or None.
+        """
+        return self._index(type).next_begin(position)
+
+    def iter_begins(self, position=None, type=None):
+        """Iterate over (annotation, begin, end) with begin >= position, sorted by begin.
+        """
+        return self._index(type).iter_begins(position)
+
+    def iter_ends(self, position=None, type=None):
+        """Iterate over (annotation, begin, end) with end >= position, sorted by end.
+        """
+        return self._index(type).iter_ends(position)
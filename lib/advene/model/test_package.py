@@ -0,0 +1,85 @@
+#
+# Advene: Annotate Digital Videos, Exchange on the NEt
+# Copyright (C) 2008-2012 Olivier Aubert <olivier.aubert@liris.cnrs.fr>
+#
+# Advene is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# Advene is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Advene; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
+#
+import os
+import shutil
+import tempfile
+import unittest
+
+from advene.model.package import Package
+from advene.model.fragment import MillisecondFragment
+
+class PackageTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp(prefix='advene-test')
+        self.package = Package(self.filename('p.azp'), source=None)
+        self.package.save()
+        schema = self.package.createSchema(ident='s')
+        self.package.schemas.append(schema)
+        self.type = schema.createAnnotationType(ident='at')
+        self.type.mimetype = 'application/x-advene-values'
+        schema.annotationTypes.append(self.type)
+
+    def tearDown(self):
+        self.package.close()
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def filename(self, name):
+        return os.path.join(self.directory, name)
+
+    def create_annotation(self, begin, end):
+        a = self.package.createAnnotation(type=self.type,
+                                          fragment=MillisecondFragment(begin=begin, end=end))
+        self.package.annotations.append(a)
+        return a
+
+    def testStoredValuesSavedAsXml(self):
+        a = self.create_annotation(0, 100)
+        a.content.storeValues([1.0, 2.5, 3.0], name=a.id)
+        self.assertEqual(a.content.getUri(absolute=False), 'resources/values/' + a.id)
+        self.package.save(self.filename('p.xml'))
+        # The package itself still references the resource
+        self.assertEqual(a.content.getUri(absolute=False), 'resources/values/' + a.id)
+
+        p = Package(self.filename('p.xml'))
+        self.assertEqual(p.annotations[0].content.data, a.content.data)
+        self.assertEqual(p.annotations[0].content.parsed(), [1.0, 2.5, 3.0])
+        p.close()
+
+    def testTemporalIndexFragmentModification(self):
+        a = self.create_annotation(0, 100)
+        index = self.package.temporalIndex
+        self.assertEqual(index.at(50), [ a ])
+        # Bounds modified without any controller notification, as
+        # the Differ actions do
+        a.fragment.setBegin(5000)
+        a.fragment.setEnd(5100)
+        self.assertEqual(index.at(50), [])
+        self.assertEqual(index.at(5050), [ a ])
+
+    def testTemporalIndexFragmentReplacement(self):
+        a = self.create_annotation(0, 100)
+        index = self.package.temporalIndex
+        a.fragment = MillisecondFragment(begin=5000, end=5100)
+        self.assertEqual(a.fragment.begin, 5000)
+        self.assertEqual(index.at(50), [])
+        self.assertEqual(index.at(5050), [ a ])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,191 @@
+#
+# Advene: Annotate Digital Videos, Exchange on the NEt
+# Copyright (C) 2008-2012 Olivier Aubert <olivier.aubert@liris.cnrs.fr>
+#
+# Advene is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# Advene is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Advene; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
+#
+"""Full-text index of annotations and relations.
+
+The L{TextIndex} class maintains an inverted index (token -> elements)
+of the contents and tags of a package's annotations and relations. It
+is available through the Package.textIndex property.
+
+Texts are folded (lowercased, accents removed) before being split into
+tokens. A searched string is resolved by intersecting the postings of
+its tokens, then checking the candidates. Searches thus return the
+same results as substring tests on the folded texts.
+"""
+
+import re
+import unicodedata
+
+token_re = re.compile(r'\w+', re.UNICODE)
+
+def fold(text):
+    """Fold a string for case and accent insensitive comparisons.
+
+    Characters are lowercased and decomposed, and combining marks are
+    removed. Since each character is folded independently, a
+    substring of a string is folded into a substring of the folded
+    string.
+
+    @param text: the string
+    @type text: unicode
+    @rtype: unicode
+    """
+    if isinstance(text, str):
+        text = text.decode('utf-8', 'replace')
+    return u"".join(c
+                    for c in unicodedata.normalize('NFKD', text.lower())
+                    if not unicodedata.combining(c))
+
+def tokenize(text):
+    """Return the tokens of a folded string.
+    """
+    return token_re.findall(text)
+
+class TextIndex(object):
+    """Inverted index of the contents and tags of elements.
+
+    The index must be kept up to date by calling the add, remove and
+    update methods when elements are created, deleted or
+    modified. The Package takes care of it (cf Package._text_modified).
+    """
+    def __init__(self, elements=()):
+        # Folded content text, indexed by element
+        self._texts = {}
+        # Folded tags, indexed by element
+        self._tags = {}
+        # Postings: token -> set of elements
+        self._postings = {}
+        # Tag postings: folded tag -> set of elements
+        self._tag_postings = {}
+        # Cache of the tokens containing a given string
+        self._containing = {}
+        for el in elements:
+            self.add(el)
+
+    def __len__(self):
+        return len(self._texts)
+
+    def __contains__(self, element):
+        return element in self._texts
+
+    def add(self, element):
+        """Index the given element.
+        """
+        if element in self._texts:
+            self.remove(element)
+        text = fold(element.content.data or u'')
+        self._texts[element] = text
+        postings = self._postings
+        for t in set(tokenize(text)):
+            try:
+                postings[t].add(element)
+            except KeyError:
+                postings[t] = set( (element, ) )
+                # New token: the substring cache is obsolete
+                self._containing.clear()
+        tags = set(fold(t) for t in element.tags)
+        self._tags[element] = tags
+        for t in tags:
+            self._tag_postings.setdefault(t, set()).add(element)
+
+    def remove(self, element):
+        """Remove the given element from the index.
+        """
+        text = self._texts.pop(element, None)
+        if text is None:
+            return
+        for t in set(tokenize(text)):
+            s = self._postings[t]
+            s.discard(element)
+            if not s:
+                del self._postings[t]
+        for t in self._tags.pop(element):
+            s = self._tag_postings[t]
+            s.discard(element)
+            if not s:
+                del self._tag_postings[t]
+
+    def update(self, element):
+        """Update the index after a modification of the element.
+
+        Elements which are not indexed are ignored.
+        """
+        if element in self._texts:
+            self.add(element)
+
+    def _tokens_containing(self, s):
+        """Return the indexed tokens containing the given string.
+        """
+        try:
+            return self._containing[s]
+        except KeyError:
+            l = [ t for t in self._postings if s in t ]
+            self._containing[s] = l
+            return l
+
+    def _candidates(self, text):
+        """Return the elements whose text may contain the folded text.
+        """
+        tokens = tokenize(text)
+        if not tokens:
+            return set(self._texts)
+        res = None
+        postings = self._postings
+        # Start with the longest (most selective) tokens
+        for s in sorted(set(tokens), key=len, reverse=True):
+            found = set()
+            for t in self._tokens_containing(s):
+                # The cache may hold tokens which were removed since
+                found.update(postings.get(t, ()))
+            if res is None:
+                res = found
+            else:
+                res &= found
+            if not res:
+                break
+        return res
+
+    def search(self, searched, case_sensitive=False):
+        """Return the elements whose content contains the searched string.
+
+        @param searched: the searched string
+        @type searched: unicode
+        @param case_sensitive: if False, the search is case and accent insensitive
+        @type case_sensitive: boolean
+        @return: a set of elements
+        """
+        text = fold(searched)
+        candidates = self._candidates(text)
+        if case_sensitive:
+            return set(e for e in candidates if searched in e.content.data)
+        texts = self._texts
+        return set(e for e in candidates if text in texts[e])
+
+    def search_tag(self, tag, case_sensitive=False):
+        """Return the elements tagged with the given tag.
+
+        @param tag: the tag
+        @type tag: unicode
+        @param case_sensitive: if False, the search is case and accent insensitive
+        @type case_sensitive: boolean
+        @return: a set of elements
+        """
+        candidates = self._tag_postings.get(fold(tag), ())
+        if case_sensitive:
+            return set(e for e in candidates if tag in e.tags)
+        return set(candidates)
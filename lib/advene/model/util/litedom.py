@@ -0,0 +1,527 @@
+#
+# Advene: Annotate Digital Videos, Exchange on the NEt
+# Copyright (C) 2008-2012 Olivier Aubert <olivier.aubert@liris.cnrs.fr>
+#
+# Advene is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# Advene is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Advene; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
+#
+"""Lightweight DOM implementation.
+
+It implements the subset of the DOM API used by the Advene model,
+with nodes using __slots__ and attributes stored as plain values, and
+builds documents directly from expat events. Documents thus load
+faster and use much less memory than minidom ones, while serializing
+identically.
+"""
+
+import xml.dom
+from xml.dom.minidom import _write_data
+from xml.parsers import expat
+import codecs
+import gc
+from cStringIO import StringIO
+
+Node = xml.dom.Node
+
+class LiteNode(object):
+    __slots__ = ()
+
+    ELEMENT_NODE = Node.ELEMENT_NODE
+    TEXT_NODE = Node.TEXT_NODE
+    PROCESSING_INSTRUCTION_NODE = Node.PROCESSING_INSTRUCTION_NODE
+    COMMENT_NODE = Node.COMMENT_NODE
+    DOCUMENT_NODE = Node.DOCUMENT_NODE
+
+    def hasChildNodes(self):
+        return bool(self.childNodes)
+
+    def _get_firstChild(self):
+        if self.childNodes:
+            return self.childNodes[0]
+        return None
+    firstChild = property(_get_firstChild)
+
+    def _get_lastChild(self):
+        if self.childNodes:
+            return self.childNodes[-1]
+        return None
+    lastChild = property(_get_lastChild)
+
+    def appendChild(self, node):
+        if node.parentNode is not None:
+            node.parentNode.removeChild(node)
+        self.childNodes.append(node)
+        node.parentNode = self
+        return node
+
+    def insertBefore(self, newChild, refChild):
+        if refChild is None:
+            return self.appendChild(newChild)
+        if newChild.parentNode is not None:
+            newChild.parentNode.removeChild(newChild)
+        try:
+            index = self.childNodes.index(refChild)
+        except ValueError:
+            raise xml.dom.NotFoundErr()
+        self.childNodes.insert(index, newChild)
+        newChild.parentNode = self
+        return newChild
+
+    def removeChild(self, oldChild):
+        try:
+            self.childNodes.remove(oldChild)
+        except ValueError:
+            raise xml.dom.NotFoundErr()
+        oldChild.parentNode = None
+        return oldChild
+
+    def replaceChild(self, newChild, oldChild):
+        if newChild is oldChild:
+            return oldChild
+        if newChild.parentNode is not None:
+            newChild.parentNode.removeChild(newChild)
+        try:
+            index = self.childNodes.index(oldChild)
+        except ValueError:
+            raise xml.dom.NotFoundErr()
+        self.childNodes[index] = newChild
+        newChild.parentNode = self
+        oldChild.parentNode = None
+        return oldChild
+
+    def toxml(self, encoding=None):
+        return self.toprettyxml("", "", encoding)
+
+    def toprettyxml(self, indent="\t", newl="\n", encoding=None):
+        writer = StringIO()
+        if encoding is not None:
+            writer = codecs.lookup(encoding)[3](writer)
+        if self.nodeType == Node.DOCUMENT_NODE:
+            self.writexml(writer, "", indent, newl, encoding)
+        else:
+            self.writexml(writer, "", indent, newl)
+        return writer.getvalue()
+
+    def unlink(self):
+        self.parentNode = None
+
+class Text(LiteNode):
+    __slots__ = ('data', 'parentNode', 'ownerDocument')
+    nodeType = Node.TEXT_NODE
+    nodeName = "#text"
+    childNodes = ()
+
+    def __init__(self, data, ownerDocument=None):
+        self.data = data
+        self.parentNode = None
+        self.ownerDocument = ownerDocument
+
+    def _get_nodeValue(self):
+        return self.data
+    def _set_nodeValue(self, value):
+        self.data = value
+    nodeValue = property(_get_nodeValue, _set_nodeValue)
+
+    def cloneNode(self, deep):
+        return Text(self.data, self.ownerDocument)
+
+    def writexml(self, writer, indent="", addindent="", newl=""):
+        _write_data(writer, "%s%s%s" % (indent, self.data, newl))
+
+class Comment(Text):
+    __slots__ = ()
+    nodeType = Node.COMMENT_NODE
+    nodeName = "#comment"
+
+    def cloneNode(self, deep):
+        return Comment(self.data, self.ownerDocument)
+
+    def writexml(self, writer, indent="", addindent="", newl=""):
+        writer.write("%s<!--%s-->%s" % (indent, self.data, newl))
+
+class ProcessingInstruction(LiteNode):
+    __slots__ = ('target', 'data', 'parentNode', 'ownerDocument')
+    nodeType = Node.PROCESSING_INSTRUCTION_NODE
+    childNodes = ()
+
+    def __init__(self, target, data, ownerDocument=None):
+        self.target = target
+        self.data = data
+        self.parentNode = None
+        self.ownerDocument = ownerDocument
+
+    nodeName = property(lambda self: self.target)
+
+    def cloneNode(self, deep):
+        return ProcessingInstruction(self.target, self.data, self.ownerDocument)
+
+    def writexml(self, writer, indent="", addindent="", newl=""):
+        writer.write("%s<?%s %s?>%s" % (indent, self.target, self.data, newl))
+
+class Attr(object):
+    """Detached view of an element attribute.
+    """
+    __slots__ = ('namespaceURI', 'localName', 'name', 'value')
+    nodeType = Node.ATTRIBUTE_NODE
+
+    def __init__(self, namespaceURI, localName, name, value):
+        self.namespaceURI = namespaceURI
+        self.localName = localName
+        self.name = name
+        self.value = value
+
+class Element(LiteNode):
+    """Element node.
+
+    Attributes are stored in a dict indexed by (namespaceURI,
+    localName), holding (qualified name, value) tuples.
+    """
+    __slots__ = ('namespaceURI', 'localName', 'prefix', 'tagName',
+                 '_attrs', 'childNodes', 'parentNode', 'ownerDocument')
+    nodeType = Node.ELEMENT_NODE
+
+    def __init__(self, namespaceURI, localName, prefix, tagName, ownerDocument=None):
+        self.namespaceURI = namespaceURI
+        self.localName = localName
+        self.prefix = prefix
+        self.tagName = tagName
+        self._attrs = {}
+        self.childNodes = []
+        self.parentNode = None
+        self.ownerDocument = ownerDocument
+
+    nodeName = property(lambda self: self.tagName)
+
+    def getAttributeNS(self, namespaceURI, localName):
+        try:
+            return self._attrs[namespaceURI, localName][1]
+        except KeyError:
+            return ""
+
+    def hasAttributeNS(self, namespaceURI, localName):
+        return (namespaceURI, localName) in self._attrs
+
+    def setAttributeNS(self, namespaceURI, qualifiedName, value):
+        prefix, localName = _split_qname(qualifiedName)
+        self._attrs[namespaceURI, localName] = (qualifiedName, value)
+
+    def removeAttributeNS(self, namespaceURI, localName):
+        try:
+            del self._attrs[namespaceURI, localName]
+        except KeyError:
+            raise xml.dom.NotFoundErr()
+
+    def getAttributeNodeNS(self, namespaceURI, localName):
+        try:
+            qname, value = self._attrs[namespaceURI, localName]
+        except KeyError:
+            return None
+        return Attr(namespaceURI, localName, qname, value)
+
+    def removeAttributeNode(self, node):
+        self.removeAttributeNS(node.namespaceURI, node.localName)
+        return node
+
+    def _find_attribute(self, name):
+        for key, (qname, value) in self._attrs.iteritems():
+            if qname == name:
+                return key
+        return None
+
+    def getAttribute(self, name):
+        key = self._find_attribute(name)
+        if key is None:
+            return ""
+        return self._attrs[key][1]
+
+    def hasAttribute(self, name):
+        return self._find_attribute(name) is not None
+
+    def setAttribute(self, name, value):
+        key = self._find_attribute(name)
+        if key is None:
+            key = (None, name)
+        self._attrs[key] = (name, value)
+
+    def removeAttribute(self, name):
+        key = self._find_attribute(name)
+        if key is None:
+            raise xml.dom.NotFoundErr()
+        del self._attrs[key]
+
+    def getElementsByTagNameNS(self, namespaceURI, localName):
+        res = []
+        stack = [ self ]
+        while stack:
+            e = stack.pop()
+            for n in reversed(e.childNodes):
+                if n.nodeType == Node.ELEMENT_NODE:
+                    stack.append(n)
+            if e is not self \
+                    and (localName == "*" or e.localName == localName) \
+                    and (namespaceURI == "*" or e.namespaceURI == namespaceURI):
+                res.append(e)
+        return res
+
+    def cloneNode(self, deep):
+        e = Element(self.namespaceURI, self.localName, self.prefix, self.tagName,
+                    self.ownerDocument)
+        e._attrs = dict(self._attrs)
+        if deep:
+            for n in self.childNodes:
+                e.appendChild(n.cloneNode(True))
+        return e
+
+    def writexml(self, writer, indent="", addindent="", newl=""):
+        # Same output as minidom
+        writer.write(indent+"<" + self.tagName)
+        attrs = dict(self._attrs.itervalues())
+        for a_name in sorted(attrs):
+            writer.write(" %s=\"" % a_name)
+            _write_data(writer, attrs[a_name])
+            writer.write("\"")
+        if self.childNodes:
+            writer.write(">")
+            if (len(self.childNodes) == 1 and
+                self.childNodes[0].nodeType == Node.TEXT_NODE):
+                self.childNodes[0].writexml(writer, '', '', '')
+            else:
+                writer.write(newl)
+                for node in self.childNodes:
+                    node.writexml(writer, indent+addindent, addindent, newl)
+                writer.write(indent)
+            writer.write("</%s>%s" % (self.tagName, newl))
+        else:
+            writer.write("/>%s"%(newl))
+
+class Document(LiteNode):
+    __slots__ = ('childNodes', 'documentElement')
+    nodeType = Node.DOCUMENT_NODE
+    nodeName = "#document"
+    parentNode = None
+    ownerDocument = None
+
+    def __init__(self):
+        self.childNodes = []
+        self.documentElement = None
+
+    def appendChild(self, node):
+        if node.nodeType == Node.ELEMENT_NODE:
+            if self.documentElement is not None:
+                raise xml.dom.HierarchyRequestErr("two document elements disallowed")
+            self.documentElement = node
+        self.childNodes.append(node)
+        node.parentNode = self
+        return node
+
+    def removeChild(self, oldChild):
+        LiteNode.removeChild(self, oldChild)
+        if oldChild is self.documentElement:
+            self.documentElement = None
+        return oldChild
+
+    def createElementNS(self, namespaceURI, qualifiedName):
+        prefix, localName = _split_qname(qualifiedName)
+        return Element(namespaceURI, localName, prefix, qualifiedName, self)
+
+    def createElement(self, tagName):
+        return Element(None, tagName, None, tagName, self)
+
+    def createTextNode(self, data):
+        return Text(data, self)
+
+    def createComment(self, data):
+        return Comment(data, self)
+
+    def createProcessingInstruction(self, target, data):
+        return ProcessingInstruction(target, data, self)
+
+    def writexml(self, writer, indent="", addindent="", newl="", encoding = None):
+        if encoding is None:
+            writer.write('<?xml version="1.0" ?>'+newl)
+        else:
+            writer.write('<?xml version="1.0" encoding="%s"?>%s' % (encoding, newl))
+        for node in self.childNodes:
+            node.writexml(writer, indent, addindent, newl)
+
+    def unlink(self):
+        self.childNodes = []
+        self.documentElement = None
+
+def _split_qname(qname):
+    if ':' in qname:
+        return qname.split(':', 1)
+    return None, qname
+
+def createDocument(namespaceURI, qualifiedName, doctype=None):
+    """Create a document with the given document element.
+
+    It has the same signature as DOMImplementation.createDocument.
+    """
+    doc = Document()
+    if qualifiedName is not None:
+        doc.appendChild(doc.createElementNS(namespaceURI, qualifiedName))
+    return doc
+
+class _Builder(object):
+    """Build a Document from expat events.
+    """
+    def __init__(self):
+        self.document = Document()
+        self.current = self.document
+        # Pending namespace declarations, as (qname, uri)
+        self.declarations = []
+        # Shared strings
+        self.strings = {}
+        # Split names, indexed by expat name
+        self.names = {}
+        # Attribute keys, indexed by expat attribute name
+        self.attribute_keys = {}
+
+    def name(self, s):
+        return self.strings.setdefault(s, s)
+
+    def split(self, name):
+        """Split an expat name into (namespaceURI, localName, prefix, qname).
+        """
+        try:
+            return self.names[name]
+        except KeyError:
+            pass
+        parts = name.split(' ')
+        if len(parts) == 3:
+            res = (self.name(parts[0]), self.name(parts[1]), self.name(parts[2]),
+                   self.name(u"%s:%s" % (parts[2], parts[1])))
+        elif len(parts) == 2:
+            res = (self.name(parts[0]), self.name(parts[1]), None, self.name(parts[1]))
+        else:
+            res = (None, self.name(name), None, self.name(name))
+        self.names[name] = res
+        return res
+
+    def start_namespace_decl(self, prefix, uri):
+        if prefix:
+            self.declarations.append( (self.name(u'xmlns:' + prefix), uri) )
+        else:
+            self.declarations.append( (u'xmlns', uri or u'') )
+
+    def attribute_key(self, name):
+        """Return the ((namespaceURI, localName), qname) of an expat attribute name.
+        """
+        try:
+            return self.attribute_keys[name]
+        except KeyError:
+            ns, local, prefix, qname = self.split(name)
+            res = self.attribute_keys[name] = ((ns, local), qname)
+            return res
+
+    def start_element(self, name, attributes):
+        try:
+            ns, local, prefix, qname = self.names[name]
+        except KeyError:
+            ns, local, prefix, qname = self.split(name)
+        e = Element(ns, local, prefix, qname, self.document)
+        attrs = e._attrs
+        if self.declarations:
+            for (aqname, uri) in self.declarations:
+                if aqname == u'xmlns':
+                    attrs[xml.dom.XMLNS_NAMESPACE, u'xmlns'] = (aqname, uri)
+                else:
+                    attrs[xml.dom.XMLNS_NAMESPACE, aqname[6:]] = (aqname, uri)
+            self.declarations = []
+        if attributes:
+            keys = self.attribute_keys
+            for i in xrange(0, len(attributes), 2):
+                try:
+                    key, aqname = keys[attributes[i]]
+                except KeyError:
+                    key, aqname = self.attribute_key(attributes[i])
+                attrs[key] = (aqname, attributes[i + 1])
+        current = self.current
+        e.parentNode = current
+        if current is self.document:
+            current.appendChild(e)
+        else:
+            current.childNodes.append(e)
+        self.current = e
+
+    def end_element(self, name):
+        self.current = self.current.parentNode
+
+    def character_data(self, data):
+        children = self.current.childNodes
+        if children and children[-1].nodeType == Node.TEXT_NODE:
+            children[-1].data = children[-1].data + data
+        else:
+            t = Text(data, self.document)
+            t.parentNode = self.current
+            children.append(t)
+
+    def comment(self, data):
+        n = Comment(data, self.document)
+        n.parentNode = self.current
+        self.current.childNodes.append(n)
+
+    def processing_instruction(self, target, data):
+        n = ProcessingInstruction(target, data, self.document)
+        n.parentNode = self.current
+        self.current.childNodes.append(n)
+
+    def parser(self):
+        p = expat.ParserCreate(namespace_separator=' ')
+        p.namespace_prefixes = True
+        p.ordered_attributes = True
+        p.buffer_text = True
+        p.StartNamespaceDeclHandler = self.start_namespace_decl
+        p.StartElementHandler = self.start_element
+        p.EndElementHandler = self.end_element
+        p.CharacterDataHandler = self.character_data
+        p.CommentHandler = self.comment
+        p.ProcessingInstructionHandler = self.processing_instruction
+        return p
+
+def _parse(feed):
+    """Feed a parser with the given function, and return the built Document.
+
+    The garbage collector is disabled meanwhile, since none of the
+    created objects can be collected, and the collections triggered
+    by the allocations would be more and more expensive as the tree
+    grows.
+    """
+    b = _Builder()
+    p = b.parser()
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        feed(p)
+    finally:
+        if enabled:
+            gc.enable()
+    return b.document
+
+def parse(source):
+    """Parse a stream (or filename) into a Document.
+    """
+    if isinstance(source, basestring):
+        f = open(source, 'rb')
+        try:
+            return _parse(lambda p: p.ParseFile(f))
+        finally:
+            f.close()
+    return _parse(lambda p: p.ParseFile(source))
+
+def parseString(s):
+    """Parse a string into a Document.
+    """
+    return _parse(lambda p: p.Parse(s, True))
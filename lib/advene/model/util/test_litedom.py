@@ -0,0 +1,61 @@
+#
+# Advene: Annotate Digital Videos, Exchange on the NEt
+# Copyright (C) 2008-2012 Olivier Aubert <olivier.aubert@liris.cnrs.fr>
+#
+# Advene is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# Advene is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Advene; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
+#
+import unittest
+
+import xml.dom.minidom
+
+import advene.model.util.litedom as litedom
+
+class LiteDomTestCase(unittest.TestCase):
+
+    # Element local names which are also used as unprefixed attribute
+    # names, in both orders.
+    xml = u"""<?xml version="1.0" encoding="utf-8"?>
+<a xmlns="urn:x" xmlns:dc="http://purl.org/dc/elements/1.1/" id="root">
+  <type/>
+  <b type="1"/>
+  <c title="t"/>
+  <title/>
+  <id/>
+  <dc:type type="2">Text</dc:type>
+</a>
+"""
+
+    def assertSameAsMinidom(self, data):
+        lite = litedom.parseString(data.encode('utf-8'))
+        mini = xml.dom.minidom.parseString(data.encode('utf-8'))
+        self.assertEqual(lite.toxml(), mini.toxml())
+
+    def testOverlappingNames(self):
+        self.assertSameAsMinidom(self.xml)
+
+    def testAttributeThenElement(self):
+        self.assertSameAsMinidom(u'<a id="x"><id/><title title="y"/></a>')
+
+    def testElementThenAttribute(self):
+        self.assertSameAsMinidom(u'<a><title/><b title="x"/></a>')
+
+    def testAttributeValues(self):
+        doc = litedom.parseString(self.xml.encode('utf-8'))
+        b = doc.documentElement.getElementsByTagNameNS(u'urn:x', u'b')[0]
+        self.assertEqual(b.getAttribute('type'), u'1')
+        self.assertEqual(b.getAttributeNS(None, 'type'), u'1')
+
+if __name__ == "__main__":
+    unittest.main()
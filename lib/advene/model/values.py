@@ -0,0 +1,153 @@
+#
+# Advene: Annotate Digital Videos, Exchange on the NEt
+# Copyright (C) 2008-2012 Olivier Aubert <olivier.aubert@liris.cnrs.fr>
+#
+# Advene is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# Advene is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Advene; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
+#
+"""Numeric values of application/x-advene-values contents.
+
+Values are stored either as space-separated text in the content data,
+or in binary form (a magic header followed by little-endian 32-bit
+floats) in a package resource.
+
+The L{Values} list gives access to a min/max pyramid of the values,
+so that rendering them at a given width only processes a number of
+samples proportional to this width.
+"""
+
+import array
+import sys
+
+# Header of binary values data
+MAGIC = 'AVF1'
+
+def parse_text(data):
+    """Parse space-separated values.
+
+    Invalid values are converted to 0.
+
+    @param data: the values
+    @type data: string
+    @rtype: Values
+    """
+    def convert(v):
+        try:
+            r=float(v)
+        except ValueError:
+            r=0
+        return r
+    return Values(convert(v) for v in data.split())
+
+def is_binary(data):
+    """Check if the data is in binary form.
+    """
+    return data.startswith(MAGIC)
+
+def from_binary(data):
+    """Decode binary values.
+
+    @param data: binary data, starting with MAGIC
+    @type data: string
+    @rtype: Values
+    """
+    a = array.array('f')
+    a.fromstring(data[len(MAGIC):])
+    if sys.byteorder != 'little':
+        a.byteswap()
+    return Values(a)
+
+def to_text(values):
+    """Encode values in textual form.
+
+    @param values: a sequence of numbers
+    @rtype: unicode
+    """
+    return u" ".join("%.02f" % v for v in values)
+
+def to_binary(values):
+    """Encode values in binary form.
+
+    @param values: a sequence of numbers
+    @return: binary data
+    @rtype: string
+    """
+    a = array.array('f', values)
+    if sys.byteorder != 'little':
+        a.byteswap()
+    return MAGIC + a.tostring()
+
+class Values(list):
+    """List of numeric values, with a min/max pyramid.
+
+    The pyramid is built upon first use of L{envelope}. The list is
+    not supposed to be modified afterwards.
+    """
+    _pyramid = None
+
+    def getPyramid(self):
+        """Return the min/max pyramid of the values.
+
+        Level 0 holds the values, and each level i holds the (mins,
+        maxs) arrays of consecutive pairs of the level i-1.
+
+        @return: a list of (mins, maxs) tuples
+        """
+        if self._pyramid is None:
+            a = array.array('f', self)
+            levels = [ (a, a) ]
+            mins, maxs = a, a
+            while len(mins) > 1:
+                # Append the last item to get an even length
+                if len(mins) % 2:
+                    mins = mins + mins[-1:]
+                    maxs = maxs + maxs[-1:]
+                mins = array.array('f', map(min, mins[::2], mins[1::2]))
+                maxs = array.array('f', map(max, maxs[::2], maxs[1::2]))
+                levels.append( (mins, maxs) )
+            self._pyramid = levels
+        return self._pyramid
+    pyramid = property(getPyramid)
+
+    def envelope(self, width):
+        """Return the envelope of the values for the given width.
+
+        If there are less values than width, then one (v, v) tuple is
+        returned for each value. Else, width (min, max) tuples are
+        returned, each one covering an equal part of the values. At
+        most 2 * width samples of the pyramid are processed.
+
+        @param width: the number of buckets (usually pixels)
+        @type width: int
+        @return: a list of (min, max) tuples
+        """
+        width = int(width)
+        if width < 1 or not self:
+            return []
+        if len(self) <= width:
+            return [ (v, v) for v in self ]
+        levels = self.getPyramid()
+        # Use the coarsest level which has at least width samples
+        i = 0
+        while i + 1 < len(levels) and len(levels[i + 1][0]) >= width:
+            i += 1
+        mins, maxs = levels[i]
+        n = len(mins)
+        res = []
+        start = 0
+        for j in xrange(1, width + 1):
+            end = j * n // width
+            res.append( (min(mins[start:end]), max(maxs[start:end])) )
+            start = end
+        return res
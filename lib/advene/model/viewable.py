@@ -153,7 +153,8 @@ class Viewable(object):
         context.pushLocals()
         context.setLocal('here', self)
         context.setLocal('view', view)
-        context.interpret(view_source, mimetype, result)
+        context.interpret(view_source, mimetype, result,
+                          cache_key=view.getUri(absolute=True))
         context.popLocals ()
         s=TypedUnicode(result.getvalue())
         s.contenttype=view.getContent().getMimetype()
@@ -48,8 +48,10 @@
   """
 
 import zipfile
+import copy
 import os
 import sys
+import struct
 import tempfile
 import re
 import shutil
@@ -71,6 +73,13 @@ if _fs_encoding in ('ascii', 'ANSI_X3.4-1968', None):
 
 # Some constants
 MIMETYPE='application/x-advene-zip-package'
+# Members below this directory are only extracted when needed
+LAZY_PREFIX='resources/'
+# Extensions of already compressed files, which are stored as is.
+STORED_EXTENSIONS=('.png', '.jpg', '.jpeg', '.gif',
+                   '.mp3', '.ogg', '.oga', '.flac', '.m4a',
+                   '.ogv', '.mp4', '.avi', '.webm', '.mkv',
+                   '.zip', '.azp', '.gz', '.bz2')
 # OpenDocument manifest file
 MANIFEST="urn:oasis:names:tc:opendocument:xmlns:manifest:1.0"
 ET._namespace_map[MANIFEST]='manifest'
@@ -100,6 +109,24 @@ class ZipPackage:
         # Temp. directory, a unicode string
         self._tempdir = None
         self.file_ = None
+        # Archive holding the last saved state of the members, and
+        # its signature (size, mtime)
+        self._archive = None
+        self._archive_signature = None
+        # Members of self._archive: name -> ZipInfo
+        self._members = {}
+        # Signature (size, mtime) of the extracted files, when they
+        # were last synchronized with self._archive: name -> signature
+        self._signatures = {}
+        # Names of the members explicitly marked as modified
+        self._modified = set()
+        # Opened archive, for the members which are not extracted yet
+        self._reader = None
+        # Members which are not extracted yet: name -> ZipInfo
+        self._lazy = {}
+        # Names of the members which are not extracted yet, indexed
+        # by their directory name
+        self._lazy_dirs = {}
 
         if uri:
             # os.stat seems to not grok unicode pathnames with
@@ -170,9 +197,21 @@ class ZipPackage:
     def extract(self, fname):
         """Extract the zip file to a temporary directory.
 
+        The data of the resources is not extracted: it is read from
+        the archive upon access, and extracted only when needed (cf
+        L{extract_member}).
+
         Return the temporary directory name.
         """
         z=zipfile.ZipFile(fname, 'r')
+        fname_archive = fname
+        self._archive = None
+        self._archive_signature = None
+        self._members = {}
+        self._signatures = {}
+        self._modified = set()
+        self._lazy = {}
+        self._lazy_dirs = {}
 
         def recursive_mkdir(d):
             parent=os.path.dirname(d)
@@ -184,8 +223,10 @@ class ZipPackage:
         try:
             typ = z.read('mimetype')
         except KeyError:
+            z.close()
             raise AdveneException(_("File %s is not an Advene zip package.") % self.file_)
         if typ != MIMETYPE:
+            z.close()
             raise AdveneException(_("File %s is not an Advene zip package.") % self.file_)
 
         # The file is an advene zip package. We can extract its contents
@@ -195,7 +236,8 @@ class ZipPackage:
         self.tempdir_list.append(self._tempdir)
 
         # FIXME: check the portability (convert / to os.path.sep ?)
-        for name in z.namelist():
+        for info in z.infolist():
+            name = info.filename
             if name.endswith('/'):
                 # It is a directory name. Strip the trailing /, so
                 # that os.path.dirname(name) really returns the
@@ -208,11 +250,17 @@ class ZipPackage:
                 fname=self.tempfile(name)
                 if not os.path.isdir(os.path.dirname(fname)):
                     recursive_mkdir(os.path.dirname(fname))
+                if name.startswith(LAZY_PREFIX):
+                    self._set_lazy(name, info)
+                    continue
                 outfile = open(fname, 'wb')
-                outfile.write(z.read(name))
+                outfile.write(z.read(info))
                 outfile.close()
+                self._synchronized(name, fname, info)
 
-        z.close()
+        self._reader = z
+        self._archive = os.path.abspath(fname_archive)
+        self._archive_signature = self._signature(self._archive)
 
         # Create the resources directory if necessary
         resource_dir = self.tempfile(u'resources' )
@@ -220,6 +268,125 @@ class ZipPackage:
             os.mkdir(resource_dir)
         return self._tempdir
 
+    def _set_lazy(self, name, info):
+        """Record that the member data is to be read from the archive.
+        """
+        name = self._member_name(name)
+        self._lazy[name] = info
+        (d, f) = name.rsplit('/', 1) if '/' in name else (u'', name)
+        self._lazy_dirs.setdefault(d, set()).add(f)
+
+    def _forget_lazy(self, name):
+        """Remove the name from the lazy members.
+
+        @return: the ZipInfo of the member, or None if it was not lazy
+        """
+        info = self._lazy.pop(name, None)
+        if info is not None:
+            (d, f) = name.rsplit('/', 1) if '/' in name else (u'', name)
+            self._lazy_dirs[d].discard(f)
+        return info
+
+    def is_extracted(self, name):
+        """Check if the data of a member is available in the temporary directory.
+
+        @param name: the member name (with / separators)
+        @type name: string
+        """
+        return self._member_name(name) not in self._lazy
+
+    def list_members(self, name):
+        """Return the names of the entries of a directory.
+
+        @param name: the directory name (with / separators)
+        @type name: string
+        @return: the list of the entry names (as os.listdir)
+        """
+        try:
+            res = os.listdir(self.tempfile(*name.split('/')))
+        except OSError:
+            res = []
+        lazy = self._lazy_dirs.get(self._member_name(name).rstrip('/'))
+        if lazy:
+            res.extend(f.encode(_fs_encoding) for f in lazy)
+        return res
+
+    def member_exists(self, name):
+        """Check if a member (file or directory) exists.
+        """
+        return (self._member_name(name) in self._lazy
+                or os.path.exists(self.tempfile(*name.split('/'))))
+
+    def member_isdir(self, name):
+        """Check if a member is a directory.
+        """
+        return os.path.isdir(self.tempfile(*name.split('/')))
+
+    def read_member(self, name):
+        """Return the data of a member.
+        """
+        info = self._lazy.get(self._member_name(name))
+        if info is not None:
+            return self._reader.read(info)
+        f = open(self.tempfile(*name.split('/')), 'rb')
+        try:
+            return f.read()
+        finally:
+            f.close()
+
+    def open_member(self, name):
+        """Return a file-like object giving access to the data of a member.
+
+        Members which are not extracted are streamed from the archive.
+        """
+        info = self._lazy.get(self._member_name(name))
+        if info is not None:
+            return self._reader.open(info)
+        return open(self.tempfile(*name.split('/')), 'rb')
+
+    def extract_member(self, name):
+        """Extract the data of a member into the temporary directory.
+
+        @param name: the member name (with / separators)
+        @type name: string
+        @return: the path of the extracted file
+        """
+        fname = self.tempfile(*name.split('/'))
+        name = self._member_name(name)
+        info = self._lazy.get(name)
+        if info is not None:
+            source = self._reader.open(info)
+            try:
+                outfile = open(fname, 'wb')
+                try:
+                    shutil.copyfileobj(source, outfile)
+                finally:
+                    outfile.close()
+            finally:
+                source.close()
+            self._forget_lazy(name)
+            self._synchronized(name, fname, info)
+        return fname
+
+    def extract_directory(self, name):
+        """Extract the data of all members of a directory.
+
+        @param name: the directory name (with / separators)
+        @type name: string
+        @return: the path of the directory
+        """
+        prefix = self._member_name(name).rstrip('/') + u'/'
+        for n in [ n for n in self._lazy if n.startswith(prefix) ]:
+            self.extract_member(n)
+        return self.tempfile(*name.split('/'))
+
+    def discard_member(self, name):
+        """Notify that the data of a member is going to be replaced or removed.
+
+        The member is not read from the archive anymore.
+        """
+        self._forget_lazy(self._member_name(name))
+
     def open(self, fname=None):
         """Open the given AZP file.
 
@@ -248,15 +415,120 @@ class ZipPackage:
         for (name, mimetype) in self.manifest_to_list(self.tempfile(u'META-INF', u'manifest.xml')):
             if name == u'/':
                 pass
-            n=name.replace('/', os.path.sep)
-            if not os.path.exists( self.tempfile(n) ):
+            if not self.member_exists(name):
                 print "Warning: missing file : %s" % name
 
         # FIXME: Make some validity checks (resources/ dir, etc)
         self.file_ = fname
 
+    def _member_name(self, name):
+        """Return the unicode member name.
+        """
+        if isinstance(name, str):
+            name = unicode(name, 'utf-8')
+        return name
+
+    def _signature(self, fname):
+        st = os.stat(fname)
+        return (st.st_size, st.st_mtime)
+
+    def _synchronized(self, name, fname, info):
+        """Record that the file fname holds the data of the archive member info.
+        """
+        name = self._member_name(name)
+        self._members[name] = info
+        self._signatures[name] = self._signature(fname)
+        self._modified.discard(name)
+
+    def set_modified(self, name):
+        """Mark a member as modified.
+
+        Modifications are also detected from the size and mtime of
+        the files, but explicitly marking them is more reliable on
+        filesystems with a coarse mtime resolution.
+
+        @param name: the member name, relative to the package root (with / separators)
+        @type name: string
+        """
+        if isinstance(name, str):
+            name = unicode(name, _fs_encoding)
+        self._modified.add(name)
+
+    def is_modified(self, name, fname):
+        """Check if a member must be rewritten.
+
+        @param name: the member name
+        @type name: unicode
+        @param fname: the extracted file
+        @type fname: string
+        @return: False if the member is unchanged since the last save (or extraction)
+        """
+        return (name in self._modified
+                or name not in self._members
+                or self._signatures.get(name) != self._signature(fname))
+
+    def _compress_type(self, name):
+        """Return the compression method for the given member name.
+        """
+        if name == 'mimetype' or os.path.splitext(name)[1].lower() in STORED_EXTENSIONS:
+            return zipfile.ZIP_STORED
+        return zipfile.ZIP_DEFLATED
+
+    def _copy_member(self, source, z, info):
+        """Copy the compressed data of a member from the source archive.
+
+        @param source: the source archive
+        @type source: zipfile.ZipFile
+        @param z: the destination archive
+        @type z: zipfile.ZipFile
+        @param info: the member, from source
+        @type info: zipfile.ZipInfo
+        @return: the ZipInfo of the copied member
+        """
+        source.fp.seek(info.header_offset)
+        header = source.fp.read(zipfile.sizeFileHeader)
+        if len(header) != zipfile.sizeFileHeader:
+            raise zipfile.BadZipfile("Truncated member %s" % info.filename)
+        fheader = struct.unpack(zipfile.structFileHeader, header)
+        if fheader[zipfile._FH_SIGNATURE] != zipfile.stringFileHeader:
+            raise zipfile.BadZipfile("Bad magic number for member %s" % info.filename)
+        source.fp.seek(fheader[zipfile._FH_FILENAME_LENGTH]
+                       + fheader[zipfile._FH_EXTRA_FIELD_LENGTH], 1)
+        zinfo = copy.copy(info)
+        # The sizes and CRC are known, so that the local header holds
+        # them and no data descriptor is needed.
+        zinfo.flag_bits &= ~0x08
+        zinfo.header_offset = z.fp.tell()
+        z._writecheck(zinfo)
+        z._didModify = True
+        z.fp.write(zinfo.FileHeader())
+        remaining = info.compress_size
+        while remaining > 0:
+            data = source.fp.read(min(remaining, 1 << 20))
+            if not data:
+                raise zipfile.BadZipfile("Truncated member %s" % info.filename)
+            z.fp.write(data)
+            remaining -= len(data)
+        z.filelist.append(zinfo)
+        z.NameToInfo[zinfo.filename] = zinfo
+        return zinfo
+
+    def _can_copy(self, info):
+        """Check if a member can be copied verbatim.
+        """
+        return (not info.flag_bits & 0x01
+                and info.file_size < zipfile.ZIP64_LIMIT
+                and info.compress_size < zipfile.ZIP64_LIMIT
+                and info.header_offset < zipfile.ZIP64_LIMIT)
+
     def save(self, fname=None):
         """Save the package.
+
+        When saving to a zip file, members which were not modified
+        since the last save (or extraction) are copied verbatim from
+        the previous archive, and already compressed files are
+        stored without compression. The archive is written to a
+        temporary file which then replaces the destination file.
         """
         if fname is None:
             fname=self.file_
@@ -269,49 +541,126 @@ class ZipPackage:
         if os.path.isdir(fname):
             z=None
         else:
-            z=zipfile.ZipFile(fname, 'w', zipfile.ZIP_DEFLATED)
+            fname = os.path.abspath(fname)
+            (fd, tmpname) = tempfile.mkstemp('.tmp', os.path.basename(fname) + '.',
+                                             os.path.dirname(fname))
+            os.close(fd)
+            z=zipfile.ZipFile(tmpname, 'w', zipfile.ZIP_DEFLATED, allowZip64=True)
+
+        source=None
+        copy_extracted=False
+        if z is None:
+            # The temporary directory must hold all the data
+            self.extract_directory(u'resources')
+        elif self._reader is not None:
+            source=self._reader
+            # If the previous archive was not modified since, its
+            # unchanged extracted members can be copied.
+            copy_extracted=(os.path.exists(self._archive)
+                            and self._signature(self._archive) == self._archive_signature)
 
         manifest=[]
+        # Files written into the archive: name -> filename
+        written={}
 
-        for (dirpath, dirnames, filenames) in os.walk(self._tempdir):
-            # Ignore RCS directory paths
-            for d in ('.svn', 'CVS', '_darcs', '.bzr'):
-                if d in dirnames:
-                    dirnames.remove(d)
-
-            # Remove tempdir prefix
-            zpath=dirpath.replace(self._tempdir, '')
+        try:
+            for (dirpath, dirnames, filenames) in os.walk(self._tempdir):
+                # Ignore RCS directory paths
+                for d in ('.svn', 'CVS', '_darcs', '.bzr'):
+                    if d in dirnames:
+                        dirnames.remove(d)
+
+                # Remove tempdir prefix
+                zpath=dirpath.replace(self._tempdir, '')
+
+                # Normalize os.path.sep to UNIX pathsep (/)
+                zpath=zpath.replace(os.path.sep, '/', -1)
+                if zpath and zpath[0] == '/':
+                    # We should have only a relative subdir here
+                    zpath=zpath[1:]
+
+                for f in filenames:
+                    if f == 'manifest.xml':
+                        # We will write it later on.
+                        continue
+                    if zpath:
+                        name='/'.join( (zpath, f) )
+                    else:
+                        name=f
+                    if isinstance(name, str):
+                        name=unicode(name, _fs_encoding)
+                    manifest.append(name)
+                    if z is not None:
+                        path = os.path.join(dirpath, f)
+                        written[name] = path
+                        if (copy_extracted
+                            and not self.is_modified(name, path)
+                            and self._can_copy(self._members[name])):
+                            self._copy_member(source, z, self._members[name])
+                        else:
+                            z.write( path,
+                                     name.encode('utf-8'),
+                                     self._compress_type(name) )
+
+            # Members which were not extracted are copied from the
+            # previous archive
+            for name in sorted(self._lazy):
+                manifest.append(name)
+                info = self._lazy[name]
+                if self._can_copy(info):
+                    self._copy_member(source, z, info)
+                else:
+                    z.write( self.extract_member(name),
+                             name.encode('utf-8'),
+                             self._compress_type(name) )
 
-            # Normalize os.path.sep to UNIX pathsep (/)
-            zpath=zpath.replace(os.path.sep, '/', -1)
-            if zpath and zpath[0] == '/':
-                # We should have only a relative subdir here
-                zpath=zpath[1:]
+            # Generation of the manifest file
+            mname=self.tempfile(u"META-INF", u"manifest.xml")
+            tree=ET.ElementTree(self.list_to_manifest(sorted(manifest)))
+            tree.write(mname, encoding='utf-8')
+            if z is not None:
+                # Generation of the manifest file
+                z.write( mname,
+                         "META-INF/manifest.xml" )
+                written[u"META-INF/manifest.xml"] = mname
+                z.close()
+        except:
+            if z is not None:
+                z.close()
+                os.unlink(tmpname)
+            raise
 
-            for f in filenames:
-                if f == 'manifest.xml':
-                    # We will write it later on.
-                    continue
-                if zpath:
-                    name='/'.join( (zpath, f) )
-                else:
-                    name=f
-                if isinstance(name, str):
-                    name=unicode(name, _fs_encoding)
-                manifest.append(name)
-                if z is not None:
-                    z.write( os.path.join(dirpath, f),
-                             name.encode('utf-8') )
-
-        # Generation of the manifest file
-        fname=self.tempfile(u"META-INF", u"manifest.xml")
-        tree=ET.ElementTree(self.list_to_manifest(manifest))
-        tree.write(fname, encoding='utf-8')
         if z is not None:
-            # Generation of the manifest file
-            z.write( fname,
-                     "META-INF/manifest.xml" )
-            z.close()
+            if os.path.exists(fname):
+                shutil.copymode(fname, tmpname)
+                if os.name == 'nt':
+                    # rename does not overwrite existing files on
+                    # Windows, and opened files cannot be removed.
+                    if self._reader is not None and self._archive == fname:
+                        self._reader.close()
+                        self._reader = None
+                    os.unlink(fname)
+            else:
+                umask = os.umask(0)
+                os.umask(umask)
+                os.chmod(tmpname, 0666 & ~umask)
+            os.rename(tmpname, fname)
+
+            # The new archive now holds the reference state of the members
+            self._archive = fname
+            self._archive_signature = self._signature(fname)
+            self._members = {}
+            self._signatures = {}
+            self._modified = set()
+            if self._reader is not None:
+                self._reader.close()
+            self._reader = zipfile.ZipFile(fname, 'r')
+            for info in self._reader.infolist():
+                name = self._member_name(info.filename)
+                if name in written:
+                    self._synchronized(name, written[name], info)
+                elif name in self._lazy:
+                    self._lazy[name] = info
 
     def update_statistics(self, p):
         """Update the META-INF/statistics.xml file
@@ -319,9 +668,16 @@ class ZipPackage:
         d=self.tempfile(u'META-INF')
         if not os.path.isdir(d):
             os.mkdir(d)
-        f=open(self.tempfile(u'META-INF', u'statistics.xml'), 'w')
-        f.write(p.generate_statistics().encode('utf-8'))
+        fname=self.tempfile(u'META-INF', u'statistics.xml')
+        data=p.generate_statistics().encode('utf-8')
+        if os.path.exists(fname) and open(fname, 'rb').read() == data:
+            # Unchanged. Do not modify the file, so that it is not
+            # rewritten in the archive.
+            return True
+        f=open(fname, 'w')
+        f.write(data)
         f.close()
+        self.set_modified(u'META-INF/statistics.xml')
         return True
 
     def list_to_manifest(self, manifest):
@@ -369,6 +725,9 @@ class ZipPackage:
     def close(self):
         """Close the package and remove temporary files.
         """
+        if self._reader is not None:
+            self._reader.close()
+            self._reader = None
         shutil.rmtree(self._tempdir.encode(_fs_encoding), ignore_errors=True)
         self.tempdir_list.remove(self._tempdir)
         return True
@@ -32,6 +32,7 @@ import advene.core.config as config
 from advene.util.helper import format_time
 import os
 import time
+import multiprocessing
 
 import gobject
 gobject.threads_init()
@@ -58,7 +59,7 @@ try:
     import pygst
     pygst.require('0.10')
     import gst
-    from advene.util.snapshotter import Snapshotter
+    from advene.util.snapshotter import Snapshotter, SnapshotterPool
     svgelement = None
     # First try rsvgoverlay
     if gst.element_factory_find('rsvgoverlay'):
@@ -166,7 +167,18 @@ class Player:
         self.last_timestamp_update = 0
 
         try:
-            self.snapshotter = Snapshotter(self.snapshot_taken, width=config.data.player['snapshot-width'])
+            workers = config.data.player['snapshot-workers']
+            if not workers:
+                try:
+                    workers = min(4, multiprocessing.cpu_count())
+                except NotImplementedError:
+                    workers = 1
+            self.snapshotter = SnapshotterPool(self.snapshot_taken,
+                                               width=config.data.player['snapshot-width'],
+                                               workers=workers,
+                                               maxsize=config.data.player['snapshot-queue-size'],
+                                               accurate=config.data.player['snapshot-accurate'],
+                                               run_gap=config.data.player['snapshot-run-gap'])
         except Exception, e:
             self.log(u"Could not initialize snapshotter:" +  unicode(e))
             self.snapshotter = None
@@ -462,12 +474,13 @@ class Player:
             # We enqueue 4 timestamps: the original timestamp, its
             # value minus 50 and 20ms (the async snapshotter goes to the
             # specified position then takes the video buffer which may then
-            # be later) and its value aligned to a frame boundary
-            for pos in sorted((t - 50,
-                               t - 20,
-                               t / config.data.preferences['default-fps'] * config.data.preferences['default-fps'],
-                               t)):
-                self.snapshotter.enqueue(pos)
+            # be later) and its value aligned to a frame boundary. Close
+            # timestamps are merged by the snapshotter, and the others
+            # are captured by decoding forward.
+            self.snapshotter.enqueue(t - 50,
+                                     t - 20,
+                                     t / config.data.preferences['default-fps'] * config.data.preferences['default-fps'],
+                                     t)
 
     def snapshot(self, position):
         if not self.check_uri():
@@ -28,10 +28,15 @@ import sys
 try:
     # Needed for pimpy component
     import numpy
+except ImportError:
+    numpy = None
+
+try:
+    # Needed for histogram extraction
     import opencv.cv as cv
     import opencv.highgui as hg
 except ImportError:
-    numpy = cv = hg = None
+    cv = hg = None
 
 import advene.core.config as config
 from advene.util.importer import GenericImporter
@@ -155,14 +160,13 @@ class ShotDetector:
         cuts = numpy.flatnonzero( histo_dist >= self.HIGH_CUT_THRESHOLD )
 
         #detect low cut
-        for f in numpy.flatnonzero(
+        candidates = numpy.flatnonzero(
             (histo_dist < self.HIGH_CUT_THRESHOLD) &
             (histo_dist >= self.SHOT_THRESHOLD)
-            ):
-            if self.__cut_detection(f, histo_dist):
-                cuts = numpy.append(cuts, f)
+            )
+        low_cuts = candidates[self.__cut_detection(candidates, histo_dist)]
 
-        cuts.sort()
+        cuts = numpy.sort(numpy.concatenate((cuts, low_cuts)))
         n = 1
         yield {
             'begin': 0,
@@ -197,7 +201,7 @@ class ShotDetector:
         for f in numpy.flatnonzero(hcumul > self.DISS_THRESHOLD):
             #new frame not in current dissolve, record dissolve
             if start > 0 and f > end:
-                motion = numpy.sum(motion_frames[range(start,end)])
+                motion = numpy.any(motion_frames[start:end])
                 if not motion and end - start > self.DISS_MIN_FRAMES:
                     yield (start,end)
                 start = end = -1
@@ -213,31 +217,37 @@ class ShotDetector:
 
         #add the last dissolve
         if start > 0 and end > 0 :
-            motion = numpy.sum(motion_frames[range(start,end)])
+            motion = numpy.any(motion_frames[start:end])
             if not motion and end - start > self.DISS_MIN_FRAMES:
                 yield (start,end)
 
     def __histo_pixelwise(self,hdiff):
-        r = []
-        for h in hdiff:
-            s = 0
-            for i in range(T, NB_BINS):
-                s += (h[i] * (i-T-1))
-            r.append(s)
-        return numpy.array(r)
-
-    def __histo_cumul(self, histos):
+        # Weighted sum of the bins above T, for all frames at once
+        weights = numpy.arange(T, NB_BINS) - T - 1
+        return numpy.dot(hdiff[:, T:NB_BINS], weights)
+
+    def __histo_cumul(self, histos, chunk=4096):
+        """Sum of the distances between the mean of frames i and i-1
+        and the K-1 previous frames, for each frame i > 0.
+
+        Frames are processed by chunks, to bound memory usage.
+        """
         nbpix = numpy.sum(histos[0])
-        r = []
-        for i in range(1, len(histos)):
-            h = (histos[i] + histos[i-1]) / 2
-            c = 0
-            for k in range(1, K):
-                if i - k < 0 :
+        parts = []
+        for first in range(1, len(histos), chunk):
+            last = min(first + chunk, len(histos))
+            h = (histos[first:last] + histos[first-1:last-1]) / 2
+            c = numpy.sum(numpy.abs(h - histos[first-1:last-1]), axis=1) / nbpix
+            for k in range(2, K):
+                # Only frames i >= k have a i - k frame
+                lo = max(first, k)
+                if lo >= last:
                     break
-                c += numpy.sum(numpy.abs(h - histos[i - k])) / nbpix
-            r.append(c / K)
-        return numpy.array(r)
+                c[lo-first:] += numpy.sum(numpy.abs(h[lo-first:] - histos[lo-k:last-k]), axis=1) / nbpix
+            parts.append(c / K)
+        if not parts:
+            return numpy.array([])
+        return numpy.concatenate(parts)
 
     def __filter_by_cut(self, cuts, histo_cumul):
         for c in cuts:
@@ -248,17 +258,39 @@ class ShotDetector:
                     break
         return histo_cumul
 
-    def __cut_detection(self, f, histo_dist):
-        d = histo_dist[f]
-        left_diff  = histo_dist[f - 1 - MEAN_WINDOW : f - 1] + self.BETA
-        right_diff = histo_dist[f + 1 : f + 1 + MEAN_WINDOW] + self.BETA
+    def __cut_detection(self, frames, histo_dist):
+        """Apply the adaptive threshold to the given frames.
 
-        mean_left  = numpy.mean(left_diff)
-        mean_rigth = numpy.mean(right_diff)
+        @return: a boolean array, True for cut frames
+        """
+        n = len(histo_dist)
+        shifted = histo_dist + self.BETA
+        # Mean of the MEAN_WINDOW values before f - 1 and after f
+        # (summed in order, like numpy.mean would do)
+        mean_left = numpy.zeros(n)
+        mean_rigth = numpy.zeros(n)
+        if n > 1 + 2 * MEAN_WINDOW:
+            # Else every frame is a boundary frame (see below)
+            for i in range(MEAN_WINDOW):
+                mean_left[1 + MEAN_WINDOW:] += shifted[i:n - 1 - MEAN_WINDOW + i]
+                mean_rigth[:n - MEAN_WINDOW] += shifted[1 + i:n - MEAN_WINDOW + 1 + i]
+        mean_left /= MEAN_WINDOW
+        mean_rigth /= MEAN_WINDOW
         mean_local = (mean_left + mean_rigth) / 2
 
         adapt_threshold =  self.ALPHA * mean_local  - self.BETA
-        return d >= adapt_threshold
+        res = histo_dist[frames] >= adapt_threshold[frames]
+
+        # Frames near the boundaries have truncated windows: handle
+        # them separately
+        for j in numpy.flatnonzero((frames < 1 + MEAN_WINDOW) | (frames >= n - MEAN_WINDOW)):
+            f = frames[j]
+            d = histo_dist[f]
+            left_diff  = histo_dist[f - 1 - MEAN_WINDOW : f - 1] + self.BETA
+            right_diff = histo_dist[f + 1 : f + 1 + MEAN_WINDOW] + self.BETA
+            mean_local = (numpy.mean(left_diff) + numpy.mean(right_diff)) / 2
+            res[j] = d >= self.ALPHA * mean_local - self.BETA
+        return res
 
 class HistogramExtractor:
     def process(self, videofile, progress):
@@ -90,11 +90,15 @@ class SoundEnveloppeImporter(GenericImporter):
         self.progress(0, _("Generating annotations"))
         for i, tup in enumerate(self.buffer_list):
             self.progress(i / n)
-            self.convert( [ {
-                        'begin': tup[0],
-                        'end': tup[1],
-                        'content': " ".join("%.02f" % (factor * (f -m)) for f in tup[2]),
-                        } ])
+            a = self.create_annotation(type_=self.defaulttype,
+                                       begin=tup[0],
+                                       end=tup[1],
+                                       author=self.author,
+                                       timestamp=self.timestamp)
+            # Values are stored in binary form in the package
+            # resources if possible, else as text.
+            a.content.storeValues([ factor * (f - m) for f in tup[2] ],
+                                  name=a.id + '.values')
 
     def on_bus_message(self, bus, message):
         def finalize():
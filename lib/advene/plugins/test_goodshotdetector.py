@@ -0,0 +1,236 @@
+#
+# Advene: Annotate Digital Videos, Exchange on the NEt
+# Copyright (C) 2008-2012 Olivier Aubert <olivier.aubert@liris.cnrs.fr>
+#
+# Advene is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# Advene is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Advene; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
+#
+from __future__ import division
+
+from gettext import gettext as _
+
+import unittest
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+from advene.plugins.goodshotdetector import ShotDetector, NB_CHANNELS, NB_BINS, K, T, MEAN_WINDOW
+
+def synthetic_histograms(frames, bins=255, pixels=100000, seed=0):
+    """Generate gray-level histograms of a video with cuts and dissolves.
+    """
+    rnd = numpy.random.RandomState(seed)
+    def scene():
+        h = rnd.dirichlet(numpy.ones(bins) * .3) * pixels
+        return h.astype('int32')
+    histos = numpy.zeros((frames, bins), dtype='int32')
+    f = 0
+    current = scene()
+    while f < frames:
+        length = rnd.randint(25, 250)
+        if rnd.rand() < .3:
+            # Dissolve towards the next scene
+            target = scene()
+            for i in xrange(min(length, frames - f)):
+                a = i / float(length)
+                histos[f + i] = ((1 - a) * current + a * target).astype('int32')
+            current = target
+        else:
+            for i in xrange(min(length, frames - f)):
+                # Some noise
+                histos[f + i] = numpy.roll(current, rnd.randint(-2, 3))
+            current = scene()
+        f += length
+    return histos
+
+class ReferenceShotDetector:
+    """Loop-based implementation of ShotDetector, before its vectorization.
+    """
+    def __init__(self, progress=None):
+        if progress is None:
+            progress = self.dummy_progress
+        self.progress = progress
+        self.ALPHA = 1.8
+        self.BETA = 0.10
+        self.MOTION_THRESHOLD = 0.15
+        self.SHOT_THRESHOLD     = 0.15
+        self.HIGH_CUT_THRESHOLD = 0.8
+        self.DISS_THRESHOLD = 0.4
+        self.DISS_START_THRESHOLD = 0.16
+        self.DISS_END_THRESHOLD = 0.26
+        self.DISS_MIN_FRAMES = 3
+
+
+    def dummy_progress(self, prg, label):
+        pass
+
+    def process(self, histos, mspf=40):
+        self.progress(.1, _("Computing hdiff"))
+        nbpixel = numpy.sum(histos[0])
+        #compute various histogram variations
+        hdiff = (numpy.abs(histos[:-1] - histos[1:])) / 2
+        hdiffsumchannel = numpy.sum(hdiff, axis=1)
+        histo_dist = hdiffsumchannel / nbpixel / NB_CHANNELS
+
+        self.progress(.2, _("Detecting cuts"))
+        #detect hard cut
+        cuts = numpy.flatnonzero( histo_dist >= self.HIGH_CUT_THRESHOLD )
+
+        #detect low cut
+        for f in numpy.flatnonzero(
+            (histo_dist < self.HIGH_CUT_THRESHOLD) &
+            (histo_dist >= self.SHOT_THRESHOLD)
+            ):
+            if self.__cut_detection(f, histo_dist):
+                cuts = numpy.append(cuts, f)
+
+        cuts.sort()
+        n = 1
+        yield {
+            'begin': 0,
+            'end': cuts[0] * mspf,
+            'content': str(n),
+            }
+        for b, e in zip(cuts[:-1], cuts[1:]):
+            n += 1
+            yield {
+                'begin': b * mspf,
+                'end': e * mspf,
+                'content': str(n)
+                }
+
+        self.progress(.3, _("Detecting dissolves"))
+        #detect dissolve
+        hcumul = self.__histo_cumul(histos)
+        hcumul = self.__filter_by_cut(cuts, hcumul)
+        hpixelwise = self.__histo_pixelwise(hdiff)
+        hpixelwise = hpixelwise / nbpixel / 100
+
+        for diss in self.__detect_dissolve(hcumul, hpixelwise):
+            yield {
+                'begin': diss[0] * mspf,
+                'end': diss[1] * mspf,
+                'content': 'grad',
+                }
+
+    def __detect_dissolve(self, hcumul, hpixelwise):
+        motion_frames = hpixelwise > self.MOTION_THRESHOLD
+        start = end = -1
+        for f in numpy.flatnonzero(hcumul > self.DISS_THRESHOLD):
+            #new frame not in current dissolve, record dissolve
+            if start > 0 and f > end:
+                motion = numpy.sum(motion_frames[range(start,end)])
+                if not motion and end - start > self.DISS_MIN_FRAMES:
+                    yield (start,end)
+                start = end = -1
+
+            if start < 0 :
+                start = end = f
+                #find lower bound
+                while start > 0 and hcumul[start] > self.DISS_START_THRESHOLD:
+                    start -= 1
+                #find upper bound
+                while end+1 < len(hcumul) and hcumul[end+1] > self.DISS_END_THRESHOLD :
+                    end += 1
+
+        #add the last dissolve
+        if start > 0 and end > 0 :
+            motion = numpy.sum(motion_frames[range(start,end)])
+            if not motion and end - start > self.DISS_MIN_FRAMES:
+                yield (start,end)
+
+    def __histo_pixelwise(self,hdiff):
+        r = []
+        for h in hdiff:
+            s = 0
+            for i in range(T, NB_BINS):
+                s += (h[i] * (i-T-1))
+            r.append(s)
+        return numpy.array(r)
+
+    def __histo_cumul(self, histos):
+        nbpix = numpy.sum(histos[0])
+        r = []
+        for i in range(1, len(histos)):
+            h = (histos[i] + histos[i-1]) / 2
+            c = 0
+            for k in range(1, K):
+                if i - k < 0 :
+                    break
+                c += numpy.sum(numpy.abs(h - histos[i - k])) / nbpix
+            r.append(c / K)
+        return numpy.array(r)
+
+    def __filter_by_cut(self, cuts, histo_cumul):
+        for c in cuts:
+            for i in range(K):
+                try :
+                    histo_cumul[c + i] = histo_cumul[c + i]/(K - i)
+                except IndexError:
+                    break
+        return histo_cumul
+
+    def __cut_detection(self, f, histo_dist):
+        d = histo_dist[f]
+        left_diff  = histo_dist[f - 1 - MEAN_WINDOW : f - 1] + self.BETA
+        right_diff = histo_dist[f + 1 : f + 1 + MEAN_WINDOW] + self.BETA
+
+        mean_left  = numpy.mean(left_diff)
+        mean_rigth = numpy.mean(right_diff)
+        mean_local = (mean_left + mean_rigth) / 2
+
+        adapt_threshold =  self.ALPHA * mean_local  - self.BETA
+        return d >= adapt_threshold
+
+@unittest.skipIf(numpy is None, "numpy is not available")
+class ShotDetectorTestCase(unittest.TestCase):
+
+    def outcome(self, detector, histos):
+        """Return the detected shots and dissolves, or the raised exception class.
+        """
+        try:
+            return list(detector.process(histos))
+        except Exception, e:
+            return e.__class__
+
+    def assertSameAsReference(self, histos):
+        expected = self.outcome(ReferenceShotDetector(), histos)
+        self.assertEqual(self.outcome(ShotDetector(), histos), expected)
+        return expected
+
+    def testSeeds(self):
+        for seed in range(4):
+            self.assertSameAsReference(synthetic_histograms(2000, seed=seed))
+
+    def testMoreThanOneChunk(self):
+        # __histo_cumul processes frames by chunks of 4096
+        for frames in (4096, 4097, 4098, 9000):
+            self.assertSameAsReference(synthetic_histograms(frames, seed=frames))
+
+    def testShortInputs(self):
+        histos = synthetic_histograms(1000, seed=1)
+        # The first shot ends at the first cut
+        cut = ReferenceShotDetector().process(histos, mspf=1).next()['end']
+        # Fewer than K frames, with a cut in the middle
+        for first in range(cut - K + 2, cut + 1):
+            for last in range(cut + 2, first + K):
+                self.assertSameAsReference(histos[max(first, 0):last])
+        # Short inputs, without cut
+        for frames in range(1, 2 * K):
+            self.assertSameAsReference(histos[:frames])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -174,9 +174,33 @@ class TraceBuilder(Thread):
                     break
                 else:
                     continue
-            if obj['event_name'] in self.filtered_events:
+            for obj in self.expand_event(obj):
+                if obj['event_name'] in self.filtered_events:
+                    continue
+                self.receive(obj)
+
+    def expand_event(self, obj):
+        """Return the list of events to trace for a received event.
+
+        Bulk deletions (ElementsDelete) are traced as one
+        AnnotationDelete or RelationDelete per element.
+        """
+        if obj['event_name'] != 'ElementsDelete':
+            return [ obj ]
+        res=[]
+        for el in obj['elements']:
+            o=dict(obj)
+            del o['elements']
+            if isinstance(el, Annotation):
+                o['event_name']='AnnotationDelete'
+                o['annotation']=el
+            elif isinstance(el, Relation):
+                o['event_name']='RelationDelete'
+                o['relation']=el
+            else:
                 continue
-            self.receive(obj)
+            res.append(o)
+        return res
 
     def on_exit(self):
         if self.network_exp:
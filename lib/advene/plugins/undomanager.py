@@ -64,6 +64,7 @@ class UndoHistory:
             ('AnnotationCreate', self.element_create),
             ('AnnotationEditEnd', self.element_edit_end),
             ('AnnotationDelete', self.element_delete),
+            ('ElementsDelete', self.elements_delete),
 
             ('ViewCreate', self.element_create),
             ('ViewEditEnd', self.element_edit_end),
@@ -212,6 +213,29 @@ class UndoHistory:
             del self._edits[element]
             #print "Saving content for ", el
 
+    def elements_delete(self, context, parameters):
+        """Record a set of deleted elements.
+
+        The deleted annotations are recorded in a single batch, so
+        that they are restored by a single undo.
+        """
+        if context.globals.get('undone'):
+            return
+        elements=context.evaluateValue('elements')
+        batch=context.globals.get('batch', None)
+        if batch and batch == self.batch_id:
+            history=self.batch_history
+        else:
+            # Implicitly close a previous batch_history
+            self.batch_id=batch
+            self.batch_history=[]
+            history=self.batch_history
+            self.history.append( ('batch', batch, history) )
+        for element in elements:
+            if isinstance(element, Annotation):
+                history.append( ('deleted', 'annotation', self.get_cached_representation(element)) )
+            self._edits.pop(element, None)
+
     def log(self, *p):
         self.controller.log("UndoManager: " + str(p))
 
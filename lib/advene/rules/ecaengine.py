@@ -32,6 +32,7 @@ import StringIO
 import urllib
 
 import advene.rules.elements
+from advene.model.annotation import Annotation, Relation
 
 class MyThread(threading.Thread):
     """Override the standard run() method.
@@ -74,6 +75,8 @@ class ECAEngine:
     @type scheduler: sched.scheduler
     @ivar schedulerthread: the scheduler's execution thread
     @type schedulerthread: threading.Thread
+    @ivar event_statistics: dispatch statistics, indexed by EventName
+    @type event_statistics: dict
     """
     def __init__ (self, controller):
         """Initialize the ECAEngine.
@@ -83,6 +86,9 @@ class ECAEngine:
         """
         self.clear_state()
         self.ruledict = {}
+        # AnnotationDelete and RelationDelete rules of the default and
+        # user rulesets, which are also triggered by ElementsDelete
+        self.element_delete_rules = {}
         # History of events
         self.event_history = []
         self.controller=controller
@@ -90,6 +96,8 @@ class ECAEngine:
         self.scheduler=sched.scheduler(time.time, time.sleep)
         self.schedulerthread=MyThread(target=self.scheduler.run)
         self.views_to_notify=[]
+        # Dispatch statistics: event_name -> [notifications, dispatches, dispatch time (in s)]
+        self.event_statistics={}
 
     def get_state(self):
         """Return a state of the current rulesets.
@@ -184,13 +192,20 @@ class ECAEngine:
 
         This method is called by the other helper methods
         (L{set_ruleset}, L{clear_ruleset}, ...).
+
+        Rule conditions are compiled at this time, so that their
+        evaluation upon event notification is a simple function call.
         """
         self.ruledict.clear()
+        self.element_delete_rules.clear()
         # We could use self.rulesets.keys() but we want to specify the
         # class order:
         for type_ in ('internal', 'default', 'user'):
             for rule in self.rulesets[type_]:
+                rule.compile()
                 self.ruledict.setdefault(rule.event, []).append(rule)
+                if type_ != 'internal' and rule.event in ('AnnotationDelete', 'RelationDelete'):
+                    self.element_delete_rules.setdefault(rule.event, []).append(rule)
 
     def schedule(self, action, context, delay=0, immediate=False):
         """Schedule an action for execution.
@@ -341,6 +356,29 @@ class ECAEngine:
             res.append("%s: %s" % (k, len(self.ruledict[k])))
         return res
 
+    def get_statistics(self):
+        """Return the dispatch statistics.
+
+        @return: a dict indexed by event name, whose values are
+                 (notifications, dispatches, dispatch time in s) tuples.
+                 Dispatches are notifications for which at least one
+                 rule was registered.
+        @rtype: dict
+        """
+        return dict( (k, tuple(v)) for (k, v) in self.event_statistics.iteritems() )
+
+    def reset_statistics(self):
+        """Reset the dispatch statistics.
+        """
+        self.event_statistics.clear()
+
+    def dump_statistics(self):
+        res=[]
+        for k, (n, d, t) in sorted(self.event_statistics.iteritems(), key=lambda i: i[1][2], reverse=True):
+            res.append("%s: %d notifications, %d dispatches, %.3fs (%.3fms per dispatch)"
+                       % (k, n, d, t, 1000.0 * t / d if d else 0))
+        return res
+
     def notify (self, event_name, *param, **kw):
         """Invoked by the application on the occurence of an event.
 
@@ -371,6 +409,53 @@ class ECAEngine:
                 # should only be TraceBuilder plugin or other trace building system
                 #v.receive(d)
                 v.equeue.put(d)
+        try:
+            stats=self.event_statistics[event_name]
+        except KeyError:
+            stats=self.event_statistics[event_name]=[0, 0, 0.0]
+        stats[0] += 1
+
+        if event_name == 'ElementsDelete' and self.element_delete_rules:
+            # User rules expect one AnnotationDelete or RelationDelete
+            # event per deleted element.
+            self.trigger_element_delete_rules(**kw)
+
+        # Most events (AnnotationBegin/End during playback for
+        # instance) have no or few listeners, so do not bother
+        # building a context if no rule is registered.
+        a=self.ruledict.get(event_name)
+        if not a:
+            return
+        t=time.time()
+        self.trigger(event_name, a, kw)
+        stats[1] += 1
+        stats[2] += time.time() - t
+
+    def trigger_element_delete_rules(self, elements=None, **kw):
+        """Trigger the user rules for each element of an ElementsDelete event.
+        """
+        for el in elements:
+            if isinstance(el, Annotation):
+                event_name='AnnotationDelete'
+                kw['annotation']=el
+                kw['relation']=None
+            elif isinstance(el, Relation):
+                event_name='RelationDelete'
+                kw['annotation']=None
+                kw['relation']=el
+            else:
+                continue
+            rules=self.element_delete_rules.get(event_name)
+            if rules:
+                self.trigger(event_name, rules, dict(kw))
+
+    def trigger(self, event_name, a, kw):
+        """Execute the actions of the matching rules.
+
+        @param event_name: the event name
+        @param a: the rules registered for the event
+        @param kw: the event parameters
+        """
         immediate=False
         if 'immediate' in kw:
             immediate=True
@@ -383,41 +468,38 @@ class ECAEngine:
             print "Delay specified: %f" % delay
 
         context=self.build_context(event_name, **kw)
-        try:
-            a=self.ruledict[event_name]
-        except KeyError:
-            return
 
         rules=sorted( (rule
                        for rule in a
-                       if rule.condition.match(context) ),
+                       if rule.match(context) ),
                       key=lambda e: e.priority,
                       reverse=True)
 
-        context.pushLocals()
-        for rule in rules:
-            context.setLocal('rule', rule.name)
-            # The 'view' is used in context.traversePathPreHook
-            # to determine the context of interpretation of symbols
+        if rules:
+            context.pushLocals()
+            for rule in rules:
+                context.setLocal('rule', rule.name)
+                # The 'view' is used in context.traversePathPreHook
+                # to determine the context of interpretation of symbols
 
-            # This is a kind of a mess. We should clarify all that
-            # (first, we should not have used the same name for different
-            # things).
+                # This is a kind of a mess. We should clarify all that
+                # (first, we should not have used the same name for different
+                # things).
 
-            # It could already be set  (for instance, ViewCreate view=...)
-            try:
-                v=context.locals['view']
-            except KeyError:
+                # It could already be set  (for instance, ViewCreate view=...)
                 try:
-                    v = context.globals['view']
+                    v=context.locals['view']
                 except KeyError:
-                    v=None
-            try:
-                v=self.controller.package.views[rule.origin]
-            except KeyError:
-                # rule.origin is not a view from the package. It may be
-                # default_rule.xml for instance
-                pass
-            context.setLocal('view', v)
-            self.schedule(rule.action, context, delay=delay, immediate=immediate)
-        context.popLocals()
+                    try:
+                        v = context.globals['view']
+                    except KeyError:
+                        v=None
+                try:
+                    v=self.controller.package.views[rule.origin]
+                except KeyError:
+                    # rule.origin is not a view from the package. It may be
+                    # default_rule.xml for instance
+                    pass
+                context.setLocal('view', v)
+                self.schedule(rule.action, context, delay=delay, immediate=immediate)
+            context.popLocals()
@@ -30,6 +30,8 @@ import itertools
 import advene.core.config as config
 from advene.model.annotation import Annotation
 from advene.model.fragment import MillisecondFragment
+from advene.model.tal.context import AdveneTalesException, split_path
+from simpletal import simpleTALES
 
 from advene.util.odict import odict
 from gettext import gettext as _
@@ -93,6 +95,56 @@ class EtreeMixin(object):
             origin=uri
         self.from_etree(rulesetnode, catalog=catalog, origin=origin)
 
+class Constant(object):
+    """A compiled TALES expression with a constant value.
+
+    It can be called like other compiled expressions, and gives
+    access to its value through the value attribute.
+    """
+    __slots__ = ('value', )
+
+    def __init__(self, value):
+        self.value=value
+
+    def __call__(self, context):
+        return self.value
+
+def compile_expression(expr):
+    """Compile a TALES expression.
+
+    The most common forms of expressions (simple paths and constant
+    strings) are preprocessed, so that their evaluation does not go
+    through the generic TALES expression parsing. Simple paths are
+    split into segments once.
+
+    @param expr: the TALES expression
+    @type expr: string
+    @return: a function taking a context as parameter and returning
+             the expression value. Constant expressions are
+             returned as Constant instances.
+    @rtype: function
+    """
+    if not isinstance(expr, basestring):
+        return lambda context: context.evaluateValue(expr)
+    e=expr.strip()
+    if e.startswith('string:') and not '$' in e:
+        return Constant(e[7:].lstrip())
+    if e.startswith('path:'):
+        e=e[5:].lstrip()
+    elif ':' in e.split('/', 1)[0]:
+        # Other expression types (exists:, not:, python:...)
+        return lambda context: context.evaluateValue(expr)
+    if '|' in e:
+        return lambda context: context.evaluateValue(expr)
+    path=split_path(e)
+    def evaluate(context):
+        try:
+            return context.traversePathList(path)
+        except simpleTALES.PathNotFoundException, exc:
+            raise AdveneTalesException('TALES expression %s returned None in context %s' %
+                                       (exc, context))
+    return evaluate
+
 class ConditionList(list):
     """A list of conditions.
 
@@ -115,16 +167,28 @@ class ConditionList(list):
     def match(self, context):
         """Test is the context matches the ConditionList.
         """
+        return self.compile()(context)
+
+    def compile(self):
+        """Compile the ConditionList into a predicate.
+
+        @return: the predicate
+        @rtype: function
+        """
+        predicates=[ c.compile() for c in self ]
         if self.composition == "and":
-            for condition in self:
-                if not condition.match(context):
-                    return False
-            return True
+            def predicate(context):
+                for p in predicates:
+                    if not p(context):
+                        return False
+                return True
         else:
-            for condition in self:
-                if condition.match(context):
-                    return True
-            return False
+            def predicate(context):
+                for p in predicates:
+                    if p(context):
+                        return True
+                return False
+        return predicate
 
 class Condition:
     """The Condition class.
@@ -162,6 +226,9 @@ class Condition:
         'basic': _("Basic conditions"),
         'allen': _("Allen relations"),
         }
+    # (key, predicate) cache of the compiled condition, cf compile()
+    _compiled=None
+
     def __init__(self, lhs=None, rhs=None, operator=None):
         self.lhs=lhs
         self.rhs=rhs
@@ -189,84 +256,135 @@ class Condition:
 
     def match(self, context):
         """Test if the condition matches the context."""
-        if self.operator in self.binary_operators:
-            # Binary operator
-            left=context.evaluateValue(self.lhs)
-            right=context.evaluateValue(self.rhs)
-            if self.operator == 'equals':
-                return self.convert_value(left) == self.convert_value(right)
-            elif self.operator == 'different':
-                return self.convert_value(left) != self.convert_value(right)
-            elif self.operator == 'contains':
-                return right in left
-            elif self.operator == 'greater':
-                # If it is possible to convert the values to
-                # floats, then do it. Else, compare string values
-                lv=self.convert_value(left, 'end')
-                rv=self.convert_value(right, 'begin')
-                return lv >= rv
-            elif self.operator == 'lower' or self.operator == 'before':
-                # If it is possible to convert the values to
-                # floats, then do it. Else, compare string values
-                lv=self.convert_value(left, 'end')
-                rv=self.convert_value(right, 'begin')
-                return lv <= rv
-            elif self.operator == 'matches':
-                return re.search(rv, lv)
-            elif self.operator == 'meets':
-                lv=self.convert_value(left, 'end')
-                rv=self.convert_value(right, 'begin')
-                return lv == rv
-            elif self.operator == 'overlaps':
-                if isinstance(left, Annotation):
-                    lv=left.fragment
-                elif isinstance(left, MillisecondFragment):
-                    lv=left
-                else:
-                    raise Exception(_("Unknown type for overlaps comparison"))
-                if isinstance(right, Annotation):
-                    rv=right.fragment
-                elif isinstance(right, MillisecondFragment):
-                    rv=right
-                else:
-                    raise Exception(_("Unknown type for overlaps comparison"))
-                return (lv.begin in rv or rv.begin in lv)
-            elif self.operator == 'during':
-                if isinstance(left, Annotation):
-                    lv=left.fragment
-                elif isinstance(left, MillisecondFragment):
-                    lv=left
-                else:
-                    raise Exception(_("Unknown type for during comparison"))
-                if isinstance(right, Annotation):
-                    rv=right.fragment
-                elif isinstance(right, MillisecondFragment):
-                    rv=right
-                else:
-                    raise Exception(_("Unknown type for during comparison"))
-                return lv in rv
-            elif self.operator == 'starts':
-                lv=self.convert_value(left, 'begin')
-                rv=self.convert_value(right, 'begin')
-                return lv == rv
-            elif self.operator == 'finishes':
-                lv=self.convert_value(left, 'end')
-                rv=self.convert_value(right, 'end')
-                return lv == rv
+        return self.compile()(context)
+
+    def compile(self):
+        """Compile the condition into a predicate.
+
+        The predicate is a function taking a context as parameter and
+        returning a boolean value. It is cached, and recompiled only
+        if the operator or the expressions were modified.
+
+        @return: the predicate
+        @rtype: function
+        """
+        if self.is_true():
+            return self.truematch
+        key=(self.operator, self.lhs, self.rhs)
+        if self._compiled is not None and self._compiled[0] == key:
+            return self._compiled[1]
+
+        operator=self.operator
+        lhs=compile_expression(self.lhs)
+        if operator in self.binary_operators:
+            rhs=compile_expression(self.rhs)
+            test=self.compile_operator(operator, rhs)
+            if isinstance(rhs, Constant):
+                # The converted value has been folded into test
+                def predicate(context):
+                    return test(lhs(context), None)
             else:
-                raise Exception("Unknown operator: %s" % self.operator)
-        elif self.operator in self.unary_operators:
-            # Unary operator
-            # Note: self.rhs is ignored, whatever its value is.
-            left=context.evaluateValue(self.lhs)
-            if self.operator == 'not':
-                return not left
-            elif self.operator == 'value':
-                return left
+                def predicate(context):
+                    return test(lhs(context), rhs(context))
+        elif operator == 'not':
+            # Unary operators. Note: self.rhs is ignored, whatever its value is.
+            def predicate(context):
+                return not lhs(context)
+        elif operator == 'value':
+            predicate=lhs
+        else:
+            def predicate(context):
+                raise Exception("Unknown operator: %s" % operator)
+        self._compiled=(key, predicate)
+        return predicate
+
+    def compile_operator(self, operator, rhs):
+        """Return a function implementing a binary operator.
+
+        The returned function takes the left and right values as
+        parameters. If rhs is a Constant, its converted value is
+        precomputed and the right value parameter is ignored.
+
+        @param operator: the operator name
+        @type operator: string
+        @param rhs: the compiled right-hand side expression
+        @type rhs: function
+        @return: the test function
+        @rtype: function
+        """
+        convert=self.convert_value
+        constant=isinstance(rhs, Constant)
+
+        def converter(mode):
+            """Return a conversion function for the right value.
+            """
+            if constant:
+                value=convert(rhs.value, mode)
+                return lambda right: value
+            else:
+                return lambda right: convert(right, mode)
+
+        def fragment(element, message):
+            if isinstance(element, Annotation):
+                return element.fragment
+            elif isinstance(element, MillisecondFragment):
+                return element
             else:
-                raise Exception("Unknown operator: %s" % self.operator)
+                raise Exception(message)
+
+        if operator == 'equals':
+            r=converter('begin')
+            return lambda left, right: convert(left) == r(right)
+        elif operator == 'different':
+            r=converter('begin')
+            return lambda left, right: convert(left) != r(right)
+        elif operator == 'contains':
+            if constant:
+                value=rhs.value
+                return lambda left, right: value in left
+            return lambda left, right: right in left
+        elif operator == 'greater':
+            # If it is possible to convert the values to
+            # floats, then do it. Else, compare string values
+            r=converter('begin')
+            return lambda left, right: convert(left, 'end') >= r(right)
+        elif operator == 'lower' or operator == 'before':
+            r=converter('begin')
+            return lambda left, right: convert(left, 'end') <= r(right)
+        elif operator == 'matches':
+            if constant:
+                try:
+                    regexp=re.compile(unicode(rhs.value))
+                    return lambda left, right: regexp.search(unicode(left)) is not None
+                except re.error:
+                    # Let the error be raised upon evaluation
+                    pass
+            return lambda left, right: re.search(unicode(rhs.value if constant else right), unicode(left)) is not None
+        elif operator == 'meets':
+            r=converter('begin')
+            return lambda left, right: convert(left, 'end') == r(right)
+        elif operator == 'overlaps':
+            def overlaps(left, right):
+                message=_("Unknown type for overlaps comparison")
+                lv=fragment(left, message)
+                rv=fragment(rhs.value if constant else right, message)
+                return (lv.begin in rv or rv.begin in lv)
+            return overlaps
+        elif operator == 'during':
+            def during(left, right):
+                message=_("Unknown type for during comparison")
+                return fragment(left, message) in fragment(rhs.value if constant else right, message)
+            return during
+        elif operator == 'starts':
+            r=converter('begin')
+            return lambda left, right: convert(left, 'begin') == r(right)
+        elif operator == 'finishes':
+            r=converter('end')
+            return lambda left, right: convert(left, 'end') == r(right)
         else:
-            raise Exception("Unknown operator: %s" % self.operator)
+            def unknown(left, right):
+                raise Exception("Unknown operator: %s" % operator)
+            return unknown
 
     def truematch(self, context):
         """Condition which always return True.
@@ -447,6 +565,25 @@ class Rule(EtreeMixin):
     def __str__(self):
         return "Rule '%s'" % self.name
 
+    def compile(self):
+        """Compile the rule condition.
+
+        The resulting predicate is stored in the match attribute, and
+        is used by the ECAEngine to evaluate the rule condition.
+
+        @return: the predicate
+        @rtype: function
+        """
+        self.match=self.condition.compile()
+        return self.match
+
+    def match(self, context):
+        """Test if the rule condition matches the context.
+
+        It is replaced by the compiled predicate, cf L{compile}.
+        """
+        return self.condition.match(context)
+
     def add_action(self, action):
         """Add a new action to the rule.
         """
@@ -988,6 +1125,7 @@ class ECACatalog:
         'RelationCreate':         _("Creation of a new relation"),
         'RelationEditEnd':        _("Ending editing of a relation"),
         'RelationDelete':         _("Suppression of a relation"),
+        'ElementsDelete':         _("Suppression of a set of annotations and relations"),
         'ViewCreate':             _("Creation of a new view"),
         'ViewEditEnd':            _("Ending editing of a view"),
         'ViewDelete':             _("Suppression of a view"),
@@ -1038,6 +1176,7 @@ class ECACatalog:
         'RelationCreate',
         'RelationEditEnd',
         'RelationDelete',
+        'ElementsDelete',
         'ViewCreate',
         'ViewEditEnd',
         'ViewDelete',
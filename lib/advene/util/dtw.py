@@ -0,0 +1,260 @@
+#
+# Advene: Annotate Digital Videos, Exchange on the NEt
+# Copyright (C) 2008-2012 Olivier Aubert <olivier.aubert@liris.cnrs.fr>
+#
+# Advene is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# Advene is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Advene; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
+#
+"""Dynamic Time Warping alignment of annotation sequences.
+
+Each destination item is associated to a source item, minimizing the
+sum of the distances between the (begin, end) fragments of the
+associated items. Only the cost rows are kept in memory, along with
+one byte per cell for the path recovery. An optional Sakoe-Chiba band
+restricts the explored cells to a window around the diagonal.
+
+The computation is vectorized with numpy when it is available.
+"""
+
+import math
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# Backpointer values
+NEW = 0     # Start of the path (first destination item)
+CARRY = 1   # Same path as the previous source item
+INS = 2     # Previous destination item associated to the same source item
+SUB = 3     # Previous destination item associated to the previous source item
+
+# Weight of the substitution
+SUB_WEIGHT = 1.5
+
+def distance(s, d):
+    """Distance between two fragments.
+
+    @param s: source fragment
+    @type s: (begin, end) tuple
+    @param d: destination fragment
+    @type d: (begin, end) tuple
+    @rtype: number
+    """
+    return (abs(s[0] - d[0])
+            + abs(s[1] - d[1])
+            + abs((s[1] - s[0]) - (d[1] - d[0])))
+
+def band(n, m, window=None):
+    """Return the explored source range for each destination item.
+
+    @param n: number of destination items
+    @param m: number of source items
+    @param window: half-width of the Sakoe-Chiba band (in source items), None for no constraint
+    @return: a list of (lo, hi) source index ranges
+    """
+    if window is None:
+        return [ (0, m) ] * n
+    res = []
+    for i in xrange(n):
+        if n > 1:
+            c = i * (m - 1) / float(n - 1)
+        else:
+            c = 0
+        res.append( (max(0, int(math.ceil(c - window))),
+                     min(m, int(math.floor(c + window)) + 1)) )
+    return res
+
+def align(source, destination, window=None):
+    """Align destination fragments on source fragments.
+
+    @param source: the reference fragments
+    @type source: list of (begin, end) tuples
+    @param destination: the fragments to align
+    @type destination: list of (begin, end) tuples
+    @param window: half-width of the Sakoe-Chiba band (in source items), None for no constraint
+    @type window: int
+    @return: the index of the associated source item, for each destination item
+    @rtype: list of int
+    """
+    if not source or not destination:
+        return []
+    bounds = band(len(destination), len(source), window)
+    if numpy is not None:
+        back = _fill_numpy(source, destination, bounds)
+    else:
+        back = _fill_python(source, destination, bounds)
+    return _backtrack(back, bounds, len(source))
+
+def align_annotations(source, destination, window=None):
+    """Align destination annotations on source annotations.
+
+    @param source: the reference annotations, sorted
+    @type source: list
+    @param destination: the annotations to align, sorted
+    @type destination: list
+    @param window: half-width of the Sakoe-Chiba band, None for no constraint
+    @type window: int
+    @return: a list of (destination annotation, source annotation) tuples
+    """
+    path = align([ (a.fragment.begin, a.fragment.end) for a in source ],
+                 [ (a.fragment.begin, a.fragment.end) for a in destination ],
+                 window)
+    return [ (destination[i], source[j]) for (i, j) in enumerate(path) ]
+
+def _backtrack(back, bounds, m):
+    """Recover the path from the backpointers.
+    """
+    i = len(back) - 1
+    j = m - 1
+    path = []
+    while True:
+        lo, hi = bounds[i]
+        if not lo <= j < hi:
+            raise ValueError("No alignment path in the band")
+        b = back[i][j - lo]
+        if b == CARRY:
+            j -= 1
+        elif b == INS:
+            path.append(j)
+            i -= 1
+        elif b == SUB:
+            path.append(j)
+            i -= 1
+            j -= 1
+        else:
+            path.append(j)
+            break
+    path.reverse()
+    return path
+
+def _fill_python(source, destination, bounds):
+    """Compute the backpointers, one row at a time.
+    """
+    inf = float('inf')
+    back = []
+    # Row 0: each source item starts a path, unless it is farther
+    # than the closest preceding one.
+    lo, hi = bounds[0]
+    d0 = destination[0]
+    row = bytearray(hi - lo)
+    cost = []
+    mindist = None
+    for j in xrange(lo, hi):
+        dist = distance(source[j], d0)
+        if mindist is None or dist < mindist:
+            mindist = dist
+            row[j - lo] = NEW
+            cost.append(dist)
+        else:
+            row[j - lo] = CARRY
+            cost.append(cost[-1] + dist)
+    back.append(row)
+
+    for i in xrange(1, len(destination)):
+        plo, phi = lo, hi
+        prev = cost
+        lo, hi = bounds[i]
+        d = destination[i]
+        row = bytearray(hi - lo)
+        cost = []
+        for j in xrange(lo, hi):
+            dist = distance(source[j], d)
+            if plo <= j < phi:
+                insdist = prev[j - plo] + dist
+            else:
+                insdist = inf
+            if plo <= j - 1 < phi:
+                subdist = prev[j - 1 - plo] + dist * SUB_WEIGHT
+            else:
+                subdist = inf
+            if j > lo:
+                deldist = cost[-1] + dist
+            else:
+                deldist = inf
+            if insdist < deldist:
+                if insdist < subdist:
+                    row[j - lo] = INS
+                    cost.append(insdist)
+                else:
+                    row[j - lo] = SUB
+                    cost.append(subdist)
+            elif subdist < deldist:
+                row[j - lo] = SUB
+                cost.append(subdist)
+            else:
+                row[j - lo] = CARRY
+                cost.append(deldist)
+        back.append(row)
+    return back
+
+def _fill_numpy(source, destination, bounds):
+    """Compute the backpointers, one vectorized row at a time.
+
+    The CARRY transition (cost[j] = cost[j - 1] + dist[j]) is a
+    min-plus scan, computed with cumulative sums and minima. Costs are
+    sums of integers and half-integers, so that they are exact and
+    the choices are identical to the sequential computation.
+    """
+    inf = numpy.inf
+    s = numpy.array(source, dtype=numpy.float64)
+    sb, se = s[:, 0], s[:, 1]
+    sd = se - sb
+
+    def distances(d, lo, hi):
+        return (numpy.abs(sb[lo:hi] - d[0])
+                + numpy.abs(se[lo:hi] - d[1])
+                + numpy.abs(sd[lo:hi] - (d[1] - d[0])))
+
+    def shifted(values, vlo, lo, hi):
+        # values (starting at index vlo) over [lo, hi), inf outside
+        res = numpy.empty(hi - lo)
+        res.fill(inf)
+        a = max(lo, vlo)
+        b = min(hi, vlo + len(values))
+        if a < b:
+            res[a - lo:b - lo] = values[a - vlo:b - vlo]
+        return res
+
+    back = []
+    # Row 0
+    lo, hi = bounds[0]
+    dist = distances(destination[0], lo, hi)
+    new = numpy.empty(hi - lo, dtype=bool)
+    new[0] = True
+    new[1:] = dist[1:] < numpy.minimum.accumulate(dist)[:-1]
+    total = numpy.cumsum(dist)
+    start = numpy.maximum.accumulate(numpy.where(new, numpy.arange(hi - lo), 0))
+    cost = total - total[start] + dist[start]
+    back.append(numpy.where(new, NEW, CARRY).astype(numpy.int8))
+
+    for i in xrange(1, len(destination)):
+        plo = lo
+        prev = cost
+        lo, hi = bounds[i]
+        dist = distances(destination[i], lo, hi)
+        insdist = shifted(prev, plo, lo, hi) + dist
+        subdist = shifted(prev, plo, lo - 1, hi - 1) + dist * SUB_WEIGHT
+        ins = insdist < subdist
+        own = numpy.where(ins, insdist, subdist)
+        # Min-plus scan for the CARRY transition
+        total = numpy.cumsum(dist)
+        e = own - total
+        m = numpy.minimum.accumulate(e)
+        cost = m + total
+        keep = numpy.empty(hi - lo, dtype=bool)
+        keep[0] = True
+        keep[1:] = e[1:] < m[:-1]
+        back.append(numpy.where(keep, numpy.where(ins, INS, SUB), CARRY).astype(numpy.int8))
+    return back
@@ -21,17 +21,32 @@
 from urllib2 import urlopen
 
 from xml.dom.minidom import parse, parseString
+import advene.model.util.litedom as litedom
 class PyExpat:
     """
     Emulates the legavy PyExpat interface.
     """
     class Reader:
+        def __init__(self, lightweight=False):
+            """
+            @param lightweight: build lightweight DOM documents (cf advene.model.util.litedom) instead of minidom ones
+            @type lightweight: boolean
+            """
+            self.lightweight = lightweight
+
         def fromUri(self, uri):
             f = urlopen(uri)
-            return parse(f)
+            try:
+                return self.fromStream(f)
+            finally:
+                f.close()
 
         def fromStream(self, source):
+            if self.lightweight:
+                return litedom.parse(source)
             return parse(source)
 
         def fromString(self, s):
+            if self.lightweight:
+                return litedom.parseString(s)
             return parseString(s)
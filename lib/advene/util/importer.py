@@ -142,6 +142,8 @@ class GenericImporter(object):
         self.callback=callback
         # Default offset in ms
         self.offset=0
+        # Annotation ids reserved by convert (in reverse order)
+        self._reserved_ids=[]
         # Dictionary holding the number of created elements
         self.statistics={
             'annotation': 0,
@@ -297,7 +299,10 @@ class GenericImporter(object):
         begin += self.offset
         end += self.offset
         if ident is None and self.controller is not None:
-            ident=self.controller.package._idgenerator.get_id(Annotation)
+            if self._reserved_ids:
+                ident=self._reserved_ids.pop()
+            else:
+                ident=self.controller.package._idgenerator.get_id(Annotation)
 
         if ident is None:
             a=self.package.createAnnotation(type=type_,
@@ -314,6 +319,36 @@ class GenericImporter(object):
         self.update_statistics('annotation')
         return a
 
+    def create_annotations (self, items):
+        """Create annotations in the package, in one batch.
+
+        @param items: the create_annotation keyword parameters of each annotation
+        @type items: list of dicts
+        @return: the list of the created annotations
+        """
+        specs=[]
+        for d in items:
+            ident=d.get('ident')
+            if ident is None and self.controller is not None:
+                if self._reserved_ids:
+                    ident=self._reserved_ids.pop()
+                else:
+                    ident=self.controller.package._idgenerator.get_id(Annotation)
+            spec={ 'type': d['type_'],
+                   'fragment': MillisecondFragment(begin=d['begin'] + self.offset,
+                                                   end=d['end'] + self.offset),
+                   'author': d.get('author'),
+                   'date': d.get('timestamp'),
+                   'content_data': d.get('data') }
+            if ident is not None:
+                spec['ident']=ident
+            specs.append(spec)
+        annotations=self.package.createAnnotations(specs)
+        for (a, d) in zip(annotations, items):
+            a.title=d.get('title')
+        self.statistics['annotation']=self.statistics.get('annotation', 0) + len(annotations)
+        return annotations
+
     def statistics_formatted(self):
         """Return a string representation of the statistics."""
         res=[]
@@ -370,9 +405,22 @@ class GenericImporter(object):
           - notify: if True, then each annotation creation will generate a AnnotationCreate signal
           - complete: boolean. Used to mark the completeness of the annotation.
           - send: yield should return the created annotation
+
+        If source is a list, the annotations are created in one batch
+        (cf create_annotations). Iterators are converted one element at
+        a time, since they may depend on the previously created
+        annotations.
         """
         if self.package is None:
             self.package, self.defaulttype=self.init_package(annotationtypeid='imported', schemaid='imported-schema')
+        batch=None
+        if isinstance(source, (list, tuple)):
+            batch=[]
+            if self.controller is not None:
+                # Reserve the needed annotation ids at once
+                self._reserved_ids=self.controller.package._idgenerator.reserve(Annotation,
+                                                                                sum(1 for d in source if not 'id' in d))
+                self._reserved_ids.reverse()
         for d in source:
             try:
                 begin=helper.parse_time(d['begin'])
@@ -424,26 +472,43 @@ class GenericImporter(object):
             except KeyError:
                 timestamp=self.timestamp
 
-            a=self.create_annotation (type_=type_,
-                                      begin=begin,
-                                      end=end,
-                                      data=content,
-                                      ident=ident,
-                                      author=author,
-                                      title=title,
-                                      timestamp=timestamp)
-            self.package._modified = True
-            if 'complete' in d:
-                a.complete=d['complete']
-            if 'notify' in d and d['notify'] and self.controller is not None:
-                print "Notifying", a
-                self.controller.notify('AnnotationCreate', annotation=a)
-            if 'send' in d:
-                # We are expected to return a value in the yield call
-                try:
-                    source.send(a)
-                except StopIteration:
-                    pass
+            parameters=dict(type_=type_,
+                            begin=begin,
+                            end=end,
+                            data=content,
+                            ident=ident,
+                            author=author,
+                            title=title,
+                            timestamp=timestamp)
+            if batch is not None:
+                batch.append( (parameters, d) )
+                continue
+            a=self.create_annotation (**parameters)
+            self.converted(a, d, source)
+        if batch:
+            annotations=self.create_annotations([ parameters for (parameters, d) in batch ])
+            for (a, (parameters, d)) in zip(annotations, batch):
+                self.converted(a, d, source)
+
+    def converted(self, a, d, source):
+        """Finish the conversion of a source element.
+
+        @param a: the created annotation
+        @param d: the source element (cf convert)
+        @param source: the source iterator
+        """
+        self.package._modified = True
+        if 'complete' in d:
+            a.complete=d['complete']
+        if 'notify' in d and d['notify'] and self.controller is not None:
+            print "Notifying", a
+            self.controller.notify('AnnotationCreate', annotation=a)
+        if 'send' in d:
+            # We are expected to return a value in the yield call
+            try:
+                source.send(a)
+            except StopIteration:
+                pass
 
 class ExternalAppImporter(GenericImporter):
     """External application importer.
@@ -1232,7 +1297,8 @@ class SubtitleImporter(GenericImporter):
         p, at = self.init_package(filename=filename, annotationtypeid='subtitle')
         at.title = _("Subtitles from %s") % os.path.basename(filename)
         # FIXME: implement subtitle type detection
-        self.convert(self.srt_iterator(f, os.path.getsize(filename)))
+        # The cues do not depend on each other: convert them in one batch
+        self.convert(list(self.srt_iterator(f, os.path.getsize(filename))))
         f.close()
         self.progress(1.0)
         return self.package
@@ -1750,17 +1816,25 @@ class IRIDataImporter(GenericImporter):
             yield {
                 'begin': c * size * sample,
                 'end': (c + 1) * size * sample,
-                # We write space-separated normalized values
-                'content': " ".join([ str(v / m * 100.0) for v in data[c*size:(c+1)*size] ])
+                'content': '',
+                # Normalized values, stored by converted()
+                'values': [ v / m * 100.0 for v in data[c*size:(c+1)*size] ],
                 }
         rest=data[(c+1)*size:]
         if rest:
             yield {
                 'begin': (c+1) * size * sample,
                 'duration': len(rest) * sample,
-                'content': " ".join([ str(v / m * 100.0) for v in rest ])
+                'content': '',
+                'values': [ v / m * 100.0 for v in rest ],
                 }
 
+    def converted(self, a, d, source):
+        # Values are stored in binary form in the package
+        # resources if possible, else as text.
+        a.content.storeValues(d['values'], name=a.id + '.values')
+        super(IRIDataImporter, self).converted(a, d, source)
+
     def process_file(self, filename):
         root=ET.parse(filename).getroot()
         sound=root.find('sound')
@@ -274,13 +274,29 @@ class Differ:
                 yield t
         return
 
-    def copy_schema(self, s, generate_id=False):
+    def new_id(self, s, elementtype, generate_id=False):
+        """Return the id of the copy of s in the destination package.
+
+        The source id is kept if possible. The returned id is
+        registered in the destination id generator, and in
+        translated_ids.
+
+        @param s: the source element
+        @param elementtype: the element class
+        @param generate_id: force the generation of a new id
+        @type generate_id: boolean
+        @return: the id
+        """
         if generate_id or self.destination.get_element_by_id(s.id):
-            id_=self.destination._idgenerator.get_id(Schema)
+            id_=self.destination._idgenerator.reserve(elementtype, 1)[0]
         else:
             id_ = s.id
-        self.destination._idgenerator.add(id_)
+            self.destination._idgenerator.add(id_)
         self.translated_ids[s.id]=id_
+        return id_
+
+    def copy_schema(self, s, generate_id=False):
+        id_=self.new_id(s, Schema, generate_id)
 
         el=self.destination.createSchema(ident=id_)
         el.author=s.author or self.source.author
@@ -290,12 +306,7 @@ class Differ:
         return el
 
     def copy_annotation_type(self, s, generate_id=False):
-        if generate_id or self.destination.get_element_by_id(s.id):
-            id_=self.destination._idgenerator.get_id(AnnotationType)
-        else:
-            id_ = s.id
-        self.destination._idgenerator.add(id_)
-        self.translated_ids[s.id]=id_
+        id_=self.new_id(s, AnnotationType, generate_id)
 
         # Find parent, and create it if necessary
         sch=helper.get_id(self.destination.schemas, s.schema.id)
@@ -314,12 +325,7 @@ class Differ:
         return el
 
     def copy_relation_type(self, s, generate_id=False):
-        if generate_id or self.destination.get_element_by_id(s.id):
-            id_=self.destination._idgenerator.get_id(RelationType)
-        else:
-            id_ = s.id
-        self.destination._idgenerator.add(id_)
-        self.translated_ids[s.id]=id_
+        id_=self.new_id(s, RelationType, generate_id)
 
         # Find parent, and create it if necessary
         sch=helper.get_id(self.destination.schemas, s.schema.id)
@@ -374,12 +380,7 @@ class Differ:
 
         Try to keep track of the occurences of its id, to fix them later on.
         """
-        if generate_id or self.destination.get_element_by_id(s.id):
-            id_ = self.destination._idgenerator.get_id(Annotation)
-        else:
-            id_ = s.id
-        self.destination._idgenerator.add(id_)
-        self.translated_ids[s.id]=id_
+        id_=self.new_id(s, Annotation, generate_id)
 
         # Find parent, and create it if necessary
         at=helper.get_id(self.destination.annotationTypes, s.type.id)
@@ -398,12 +399,7 @@ class Differ:
         return el
 
     def copy_relation(self, s, generate_id=False):
-        if generate_id or self.destination.get_element_by_id(s.id):
-            id_=self.destination._idgenerator.get_id(Relation)
-        else:
-            id_ = s.id
-        self.destination._idgenerator.add(id_)
-        self.translated_ids[s.id]=id_
+        id_=self.new_id(s, Relation, generate_id)
 
         rt=helper.get_id(self.destination.relationTypes, s.type.id)
         if not rt:
@@ -434,12 +430,7 @@ class Differ:
         return el
 
     def copy_query(self, s, generate_id=False):
-        if generate_id or self.destination.get_element_by_id(s.id):
-            id_=self.destination._idgenerator.get_id(Query)
-        else:
-            id_ = s.id
-        self.destination._idgenerator.add(id_)
-        self.translated_ids[s.id]=id_
+        id_=self.new_id(s, Query, generate_id)
 
         el=self.destination.createQuery(
             ident=id_,
@@ -452,12 +443,7 @@ class Differ:
         return el
 
     def copy_view(self, s, generate_id=False):
-        if generate_id or self.destination.get_element_by_id(s.id):
-            id_=self.destination._idgenerator.get_id(View)
-        else:
-            id_ = s.id
-        self.destination._idgenerator.add(id_)
-        self.translated_ids[s.id]=id_
+        id_=self.new_id(s, View, generate_id)
 
         el=self.destination.createView(
             ident=id_,
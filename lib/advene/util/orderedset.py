@@ -0,0 +1,68 @@
+#
+# Advene: Annotate Digital Videos, Exchange on the NEt
+# Copyright (C) 2008-2012 Olivier Aubert <olivier.aubert@liris.cnrs.fr>
+#
+# Advene is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# Advene is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Advene; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
+#
+
+from collections import OrderedDict
+
+class OrderedSet(object):
+    """Set which remembers the insertion order of its items.
+
+    Membership tests, additions and removals are O(1). The append and
+    remove methods make it usable in place of a list of unique items.
+    """
+    def __init__(self, items=()):
+        self._items = OrderedDict()
+        for i in items:
+            self._items[i] = True
+
+    def __len__(self):
+        return len(self._items)
+
+    def __iter__(self):
+        return iter(self._items)
+
+    def __contains__(self, item):
+        return item in self._items
+
+    def __repr__(self):
+        return "OrderedSet(%r)" % list(self._items)
+
+    def add(self, item):
+        """Add an item at the end, if it is not already present.
+        """
+        if not item in self._items:
+            self._items[item] = True
+    append = add
+
+    def discard(self, item):
+        """Remove an item if present.
+        """
+        self._items.pop(item, None)
+
+    def remove(self, item):
+        """Remove an item.
+
+        @raise ValueError: if the item is not present (as list.remove does)
+        """
+        try:
+            del self._items[item]
+        except KeyError:
+            raise ValueError("%r is not in the set" % (item,))
+
+    def clear(self):
+        self._items.clear()
@@ -0,0 +1,128 @@
+#
+# Advene: Annotate Digital Videos, Exchange on the NEt
+# Copyright (C) 2008-2012 Olivier Aubert <olivier.aubert@liris.cnrs.fr>
+#
+# Advene is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# Advene is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Advene; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
+#
+"""Scheduling of snapshot requests.
+
+The L{SnapshotScheduler} class holds the timestamps waiting to be
+captured by a snapshotter. Requests closer than a given precision (the
+epsilon of the ImageCache) to a pending request are ignored. Pending
+requests are served in increasing order from the last served
+timestamp, wrapping to the beginning of the movie, so that a
+snapshotter sweeps over the movie instead of seeking back and forth.
+
+Timestamps are returned by runs: the timestamps of a run are close
+enough to each other that it is faster to decode the movie forward
+from one to the next than to seek to each of them.
+"""
+
+import bisect
+import Queue
+import threading
+
+class SnapshotScheduler(object):
+    """Queue of snapshot timestamps.
+
+    It can be used from several threads. Its qsize, empty and clear
+    methods have the same semantics as the Queue ones.
+
+    @ivar epsilon: requests closer than epsilon (in ms) to a pending one are ignored
+    @type epsilon: int
+    @ivar run_gap: maximum gap (in ms) between consecutive timestamps of a run
+    @type run_gap: int
+    @ivar position: last timestamp of the last returned run
+    @type position: int
+    """
+    def __init__(self, epsilon=35, run_gap=2000):
+        self.epsilon = epsilon
+        self.run_gap = run_gap
+        self.position = 0
+        # Sorted pending timestamps
+        self._timestamps = []
+        self._not_empty = threading.Condition(threading.Lock())
+
+    def __len__(self):
+        return len(self._timestamps)
+
+    def qsize(self):
+        return len(self._timestamps)
+
+    def empty(self):
+        return not self._timestamps
+
+    def put(self, *timestamps):
+        """Add timestamps to capture.
+
+        @return: the number of timestamps which were not already pending
+        """
+        added = 0
+        self._not_empty.acquire()
+        try:
+            l = self._timestamps
+            eps = self.epsilon
+            for t in timestamps:
+                i = bisect.bisect_left(l, t)
+                if ((i < len(l) and l[i] - t <= eps)
+                    or (i > 0 and t - l[i - 1] <= eps)):
+                    continue
+                l.insert(i, t)
+                added += 1
+            if added:
+                self._not_empty.notify()
+        finally:
+            self._not_empty.release()
+        return added
+
+    def get(self, block=True):
+        """Return the next run of timestamps to capture.
+
+        The run starts at the first pending timestamp after the
+        current position, or at the first pending timestamp if there
+        is none after it.
+
+        @param block: wait for a timestamp if the queue is empty
+        @return: a sorted list of timestamps
+        @raise Queue.Empty: if block is False and the queue is empty
+        """
+        self._not_empty.acquire()
+        try:
+            l = self._timestamps
+            while not l:
+                if not block:
+                    raise Queue.Empty
+                self._not_empty.wait()
+            i = bisect.bisect_left(l, self.position)
+            if i == len(l):
+                i = 0
+            j = i + 1
+            while j < len(l) and l[j] - l[j - 1] <= self.run_gap:
+                j += 1
+            run = l[i:j]
+            del l[i:j]
+            self.position = run[-1]
+            return run
+        finally:
+            self._not_empty.release()
+
+    def clear(self):
+        """Remove all pending timestamps.
+        """
+        self._not_empty.acquire()
+        try:
+            del self._timestamps[:]
+        finally:
+            self._not_empty.release()
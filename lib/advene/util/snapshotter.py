@@ -28,19 +28,25 @@ Command-line usage:
 snapshotter.py file://uri/to/movie/file.avi 1200 2400 4600
 
 This will capture snapshots for the given timestamps (in ms) and save them into /tmp.
+
+Requested timestamps are scheduled by a SnapshotScheduler: close
+requests are merged, and timestamps are captured by runs, seeking to
+the first timestamp of a run and decoding the movie forward to the
+following ones.
 """
 import sys
 import os
+import time
+from collections import deque
 
 import gobject
 import gst
 import gtk
 gtk.gdk.threads_init ()
 
-from threading import Event, Thread
-import Queue
-from Queue import PriorityQueue
-import heapq
+from threading import Event, Thread, Lock
+
+from advene.util.snapshotscheduler import SnapshotScheduler
 
 try:
     from evaluator import Evaluator
@@ -89,26 +95,6 @@ class NotifySink(gst.BaseSink):
 gst.element_register(NotifySink, 'notifysink')
 gobject.type_register(NotifySink)
 
-class UniquePriorityQueue(Queue.PriorityQueue):
-    """PriorityQueue with unique elements.
-
-    Adapted from http://stackoverflow.com/questions/5997189/how-can-i-make-a-unique-value-priority-queue-in-python
-    Thanks to Eli Bendersky.
-    """
-    def _init(self, maxsize):
-        PriorityQueue._init(self, maxsize)
-        self.values = set()
-
-    def _put(self, item, heappush=heapq.heappush):
-        if item[1] not in self.values:
-            self.values.add(item[1])
-            PriorityQueue._put(self, item, heappush)
-
-    def _get(self, heappop=heapq.heappop):
-        item = PriorityQueue._get(self, heappop)
-        self.values.remove(item[1])
-        return item
-
 class Snapshotter(object):
     """Snapshotter class.
 
@@ -120,17 +106,29 @@ class Snapshotter(object):
     s.enqueue class with the timestamp. You notify method will be
     called with the result.
 
+    If accurate is False, the snapshotter seeks to the keyframe
+    nearest to each run of timestamps, which is much faster. The
+    buffers are then given the requested timestamps.
+
     Setup note: the Snapshotter class runs a daemon thread
     continuously waiting for timestamps to process. Thus you should:
     * call gtk.gdk.threads_init() at the beginning of you application
     * invoke the "start" method to start the thread.
     """
-    def __init__(self, notify=None, width=None):
+    def __init__(self, notify=None, width=None, accurate=True, epsilon=35, run_gap=2000):
         self.notify=notify
+        self.accurate=accurate
         # Snapshot queue handling
-        self.timestamp_queue=UniquePriorityQueue()
+        self.timestamp_queue=SnapshotScheduler(epsilon=epsilon, run_gap=run_gap)
+        # Remaining timestamps of the current run
+        self.run=[]
+        # Requested timestamp of the expected buffer
+        self.expected=None
+        # Timestamp (in ms) of the last captured buffer
+        self.position=None
 
         self.snapshot_ready=Event()
+        self.snapshot_ready.set()
         self.thread_running=False
         self.should_clear = False
 
@@ -196,22 +194,43 @@ class Snapshotter(object):
         """Set movie time to a specific time.
         """
         p = long(t * gst.MSECOND)
+        if self.accurate:
+            flags = gst.SEEK_FLAG_FLUSH | gst.SEEK_FLAG_ACCURATE
+        else:
+            flags = gst.SEEK_FLAG_FLUSH | gst.SEEK_FLAG_KEY_UNIT
         event = gst.event_new_seek(1.0, gst.FORMAT_TIME,
-                                   gst.SEEK_FLAG_FLUSH | gst.SEEK_FLAG_ACCURATE,
+                                   flags,
                                    gst.SEEK_TYPE_SET, p,
                                    gst.SEEK_TYPE_NONE, 0)
+        self.expected = t
         self.player.set_state(gst.STATE_PAUSED)
         res = self.player.send_event(event)
         if not res:
             print "snapshotter: error when sending event"
         return True
 
+    def step(self, t):
+        """Decode the movie forward up to a specific time.
+
+        If the movie is already past the given time, or if the step
+        event is not handled, seek to it instead.
+        """
+        if self.position is None or t <= self.position:
+            return self.snapshot(t)
+        event = gst.event_new_step(gst.FORMAT_TIME, long((t - self.position) * gst.MSECOND),
+                                   1.0, True, False)
+        self.expected = t
+        res = self.player.send_event(event)
+        if not res:
+            return self.snapshot(t)
+        return True
+
     def enqueue(self, *l):
         """Enqueue timestamps to capture.
         """
-        for t in l:
-            self.timestamp_queue.put_nowait( (t, t) )
-        self.snapshot_ready.set()
+        self.timestamp_queue.put(*l)
+        if not self.run:
+            self.snapshot_ready.set()
 
     def process_queue(self):
         """Process the timestamp queue.
@@ -220,32 +239,29 @@ class Snapshotter(object):
         """
         self.thread_running=True
         while True:
-            #print "Waiting for event"
             self.snapshot_ready.wait()
-            #print "Getting timestamp"
             if self.should_clear:
                 # Clear the queue
                 self.should_clear = False
-                while True:
-                    try:
-                        # FIXME: this could potentially deadlock, if
-                        # there is a producer thread that continuously
-                        # adds new elements.
-                        self.timestamp_queue.get_nowait()
-                    except Queue.Empty:
-                        break
-            (t, dummy) = self.timestamp_queue.get()
-            #print "Clearing event"
-            self.snapshot_ready.clear()
-            #print "Snapshot", t
-            self.snapshot(t)
+                self.timestamp_queue.clear()
+                self.run = []
+            if self.run:
+                # Decode forward to the next timestamp of the run
+                self.snapshot_ready.clear()
+                self.step(self.run.pop(0))
+            else:
+                self.run = self.timestamp_queue.get()
+                self.snapshot_ready.clear()
+                self.snapshot(self.run.pop(0))
         return True
 
     def clear(self):
         """Clear the queue.
         """
-        if not self.timestamp_queue.empty():
+        if self.run or not self.timestamp_queue.empty():
             self.should_clear = True
+            # Do not wait for a pending capture
+            self.snapshot_ready.set()
         return True
 
     def queue_notify(self, buffer):
@@ -254,6 +270,12 @@ class Snapshotter(object):
         It processes the captured buffer and unlocks the
         snapshot_event to process further timestamps.
         """
+        self.position = buffer.timestamp / gst.MSECOND
+        if not self.accurate and self.expected is not None:
+            # The buffer is the one of a keyframe: give it the
+            # requested timestamp.
+            buffer = buffer.copy()
+            buffer.timestamp = long(self.expected * gst.MSECOND)
         if self.notify is not None:
             self.notify(buffer)
         # We are ready to process the next snapshot
@@ -263,10 +285,135 @@ class Snapshotter(object):
     def start(self):
         """Start the snapshotter thread.
         """
+        # Set it now, so that a second call does not start another thread
+        self.thread_running=True
         t=Thread(target=self.process_queue)
         t.setDaemon(True)
         t.start()
 
+class SnapshotterPool(object):
+    """Pool of snapshotters working in parallel.
+
+    It has the same interface as the Snapshotter class. Each
+    snapshotter (with its own pipeline and thread) owns a contiguous
+    range of the movie duration, and captures the timestamps in this
+    range.
+
+    At most maxsize timestamps (0 for no limit) can be pending: the
+    enqueue method refuses a request which would exceed this limit,
+    and returns the number of accepted timestamps. The notify method
+    is called by a single thread at a time. It is still called from
+    the snapshotter threads, so the imagecache it updates must be
+    thread-safe (which ImageCache is).
+    """
+    def __init__(self, notify=None, width=None, workers=2, maxsize=0, **kw):
+        self.notify=notify
+        self.maxsize=maxsize
+        self.snapshotters=[ Snapshotter(self.queue_notify, width=width, **kw)
+                            for i in xrange(max(1, workers)) ]
+        # Movie duration in ms, used to assign timestamps to snapshotters
+        self.duration=None
+        self.lock=Lock()
+        # Times of the last captures, for the throughput estimation
+        self.capture_times=deque(maxlen=100)
+        self.statistics={ 'captured': 0,
+                          'refused': 0 }
+
+    @property
+    def thread_running(self):
+        return all(s.thread_running for s in self.snapshotters)
+
+    def set_uri(self, uri):
+        self.duration=None
+        for s in self.snapshotters:
+            s.set_uri(uri)
+
+    def get_duration(self):
+        """Return the movie duration in ms, or 0 if it is not known yet.
+        """
+        if self.duration is None:
+            try:
+                d=self.snapshotters[0].player.query_duration(gst.FORMAT_TIME)[0]
+            except gst.QueryError:
+                return 0
+            self.duration=d / gst.MSECOND
+        return self.duration
+
+    def qsize(self):
+        return sum(s.timestamp_queue.qsize() for s in self.snapshotters)
+
+    def enqueue(self, *l):
+        """Enqueue timestamps to capture.
+
+        The timestamps are accepted or refused as a whole, since they
+        are the frames around a single requested position.
+
+        @return: the number of accepted timestamps
+        """
+        if self.maxsize and self.qsize() + len(l) > self.maxsize:
+            self.statistics['refused'] += len(l)
+            return 0
+        n=len(self.snapshotters)
+        duration=self.get_duration()
+        if duration:
+            parts=[ [] for s in self.snapshotters ]
+            for t in l:
+                parts[min(n - 1, max(0, int(t * n / duration)))].append(t)
+        else:
+            # The ranges are not known yet
+            parts=[ l ]
+        for s, p in zip(self.snapshotters, parts):
+            if p:
+                s.enqueue(*p)
+        return len(l)
+
+    def queue_notify(self, buffer):
+        """Notification method, called by the snapshotters.
+        """
+        self.lock.acquire()
+        try:
+            self.statistics['captured'] += 1
+            self.capture_times.append(time.time())
+            if self.notify is not None:
+                self.notify(buffer)
+        finally:
+            self.lock.release()
+        return True
+
+    def clear(self):
+        """Clear the queues.
+        """
+        for s in self.snapshotters:
+            s.clear()
+        return True
+
+    def start(self):
+        """Start the snapshotter threads.
+        """
+        for s in self.snapshotters:
+            if not s.thread_running:
+                s.start()
+
+    def get_statistics(self):
+        """Return statistics about the snapshotters activity.
+
+        @return: a dict with workers, pending (number of pending
+          timestamps), captured and refused (number of timestamps
+          captured and ignored because of the queue limit) and
+          throughput (recent number of snapshots per second) items
+        @rtype: dict
+        """
+        res=dict(self.statistics)
+        times=self.capture_times
+        if len(times) > 1 and times[-1] > times[0]:
+            throughput=(len(times) - 1) / (times[-1] - times[0])
+        else:
+            throughput=0.0
+        res.update({ 'workers': len(self.snapshotters),
+                     'pending': self.qsize(),
+                     'throughput': throughput })
+        return res
+
 if __name__ == '__main__':
     try:
         uri=sys.argv[1]
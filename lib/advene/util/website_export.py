@@ -25,6 +25,15 @@ import re
 import urllib
 import mimetypes
 import shutil
+import hashlib
+import itertools
+import multiprocessing
+from multiprocessing.pool import ThreadPool
+
+try:
+    import json
+except ImportError:
+    import simplejson as json
 
 import advene.core.config as config
 import advene.util.helper as helper
@@ -37,6 +46,19 @@ overlay_re=re.compile(r'/media/overlay/[^/]+/([\w\d]+)(/.+)?')
 tales_re=re.compile('(\w+)/(.+)')
 player_re=re.compile(r'/media/play(/|\?position=)(\d+)(/(\d+))?')
 overlay_replace_re=re.compile(r'/media/overlay/([^/]+)/([\w\d]+)(/.+)?')
+link_replace_re=re.compile(r'''((?:xlink:href|href|src|about|resource)=['"])(.+?)(['"> ])''')
+
+# Name of the file holding the signatures of the exported files
+MANIFEST='.advene-export.json'
+
+def save_data(path, data):
+    """Write data to the given path.
+    """
+    f=open(path, 'wb')
+    try:
+        f.write(data)
+    finally:
+        f.close()
 
 class WebsiteExporter(object):
     """Export a set of static views to a directory.
@@ -44,14 +66,25 @@ class WebsiteExporter(object):
     The intent of this export is to be able to quickly publish a
     comment in the form of a set of static views.
 
+    The pages of a given depth are rendered by a pool of worker
+    threads. The signature of every exported file is stored in a
+    manifest in the destination directory, so that a new export of the
+    same package only rewrites the files whose contents changed.
+
     @param destination: the destination directory
     @type destination: path
     @param views: the list of views to export
     @param max_depth: maximum recursion depth
     @param progress_callback: if defined, the method will be called with a float in 0..1 and a message indicating progress
+    @param workers: number of rendering threads (0 for one per processor, up to 4)
     """
-    def __init__(self, controller, destination='/tmp/n', views=None, max_depth=3, progress_callback=None, video_url=None):
+    def __init__(self, controller, destination='/tmp/n', views=None, max_depth=3, progress_callback=None, video_url=None, workers=0):
         self.controller=controller
+        self.statistics={
+            'rendered': 0,
+            'written': 0,
+            'unchanged': 0,
+            }
 
         # Directory creation/checks
         self.destination=destination
@@ -84,9 +117,103 @@ class WebsiteExporter(object):
 
         self.url_translation={}
 
+        if not workers:
+            try:
+                workers=min(4, multiprocessing.cpu_count())
+            except NotImplementedError:
+                workers=1
+        self.workers=workers
+        # Thread pool used for rendering and writing
+        self.pool=None
+        # (name, AsyncResult) of the files being written
+        self.pending=[]
+
+        # Signatures of the files from the previous export
+        self.manifest=self.load_manifest()
+        # Signatures of the files generated by this export
+        self.generated={}
+
     def log(self, *p):
         self.controller.log(*p)
 
+    def get_statistics(self):
+        return dict(self.statistics)
+
+    def load_manifest(self):
+        """Load the signatures of the previously exported files.
+        """
+        try:
+            f=open(os.path.join(self.destination, MANIFEST), 'r')
+            try:
+                return json.load(f)
+            finally:
+                f.close()
+        except (IOError, ValueError):
+            return {}
+
+    def save_manifest(self):
+        """Save the signatures of the exported files.
+
+        Only the files generated by the last export are kept.
+        """
+        f=open(os.path.join(self.destination, MANIFEST), 'w')
+        try:
+            json.dump(self.generated, f, indent=0, sort_keys=True)
+        finally:
+            f.close()
+
+    def write_file(self, name, signature, data):
+        """Write data to the name file, unless it is already up-to-date.
+
+        The file is considered up-to-date if it exists and its
+        signature is the one stored in the manifest.
+
+        @param name: the filename, relative to the destination directory
+        @param signature: a digest of the data, or of the inputs used to generate it
+        @param data: the data to write, or a method returning it
+        @return: True if the file was written
+        """
+        path=os.path.join(self.destination, name)
+        if name in self.generated:
+            if self.generated[name] == signature:
+                # Already generated by this export
+                return False
+            # The file was already generated by this export, with
+            # different contents. Make sure that the last version wins.
+            self.wait_writes()
+        elif self.manifest.get(name) == signature and os.path.exists(path):
+            self.generated[name]=signature
+            self.statistics['unchanged'] += 1
+            return False
+        if callable(data):
+            data=data()
+        d=os.path.dirname(path)
+        if not os.path.isdir(d):
+            helper.recursive_mkdir(d)
+        if self.pool is None:
+            save_data(path, data)
+        else:
+            self.pending.append( (name, self.pool.apply_async(save_data, (path, data))) )
+        self.generated[name]=signature
+        self.statistics['written'] += 1
+        return True
+
+    def wait_writes(self):
+        """Wait for the completion of the pending writes.
+        """
+        pending, self.pending = self.pending, []
+        error=None
+        for (name, result) in pending:
+            try:
+                result.get()
+            except EnvironmentError, e:
+                # Do not consider the file as generated
+                self.generated.pop(name, None)
+                if error is None:
+                    error=e
+        if error is not None:
+            raise error
+
     def find_video_player(self, video_url):
         p=None
         # FIXME: module introspection here to get classes
@@ -323,8 +450,12 @@ class WebsiteExporter(object):
             return 'imagecache/overlay_%s.png' % name
         content=overlay_replace_re.sub(overlay_replacement, content)
 
-        # Convert all links
+        # Translate all links
+        translations={}
         for (attname, link) in href_re.findall(content):
+            if link in translations:
+                continue
+            translations[link]=None
             if link.startswith('imagecache/'):
                 # Already processed by the global regexp at the beginning
                 continue
@@ -351,13 +482,19 @@ class WebsiteExporter(object):
                     extra.append('onClick="return false;"')
                 if fragment is not None:
                     tr=tr+'#'+fragment
-
-                if extra:
-                    exp = '''(%s=['"])%s(['"> ])''' % (attname, re.escape(link))
-                    content=re.sub(exp, " ".join(extra) + r''' \1''' + tr + r'''\2''', content)
-                else:
-                    exp = '''(%s=['"])%s(['"> ])''' % (attname, re.escape(link))
-                    content=re.sub(exp, r'''\1''' + tr + r'''\2''', content)
+                translations[link]=(extra, tr)
+
+        # Replace them in a single pass
+        def link_replacement(m):
+            t=translations.get(m.group(2))
+            if t is None:
+                return m.group(0)
+            extra, tr = t
+            if extra:
+                return " ".join(extra) + " " + m.group(1) + tr + m.group(3)
+            else:
+                return m.group(1) + tr + m.group(3)
+        content=link_replace_re.sub(link_replacement, content)
 
         content=self.video_player.transform_document(content)
         return content
@@ -366,19 +503,15 @@ class WebsiteExporter(object):
         """Write the converted content as well as associated data.
         """
         # Write the content.
-        output=self.url_translation[url]
-        f=open(os.path.join(self.destination, output), 'w')
-        f.write(content)
-        f.close()
+        if isinstance(content, unicode):
+            content=content.encode('utf-8')
+        self.write_file(self.url_translation[url], hashlib.md5(content).hexdigest(), content)
 
         # Copy snapshots
         for t in used_snapshots:
             # FIXME: not robust wrt. multiple packages/videos
-            if not os.path.isdir(self.imgdir):
-                helper.recursive_mkdir(self.imgdir)
-            f=open(os.path.join(self.imgdir, '%s.png' % t), 'wb')
-            f.write(str(self.controller.package.imagecache[t]))
-            f.close()
+            data=str(self.controller.package.imagecache[t])
+            self.write_file('imagecache/%s.png' % t, hashlib.md5(data).hexdigest(), data)
 
         # Copy overlays
         for (ident, tales) in used_overlays:
@@ -388,34 +521,99 @@ class WebsiteExporter(object):
                 print "Cannot find annotation %s for overlaying"
                 continue
             name=ident+tales.replace('/', '_')
-            if not os.path.isdir(self.imgdir):
-                helper.recursive_mkdir(self.imgdir)
-            f=open(os.path.join(self.imgdir, 'overlay_%s.png' % name), 'wb')
             if tales:
                 # There is a TALES expression
                 ctx=self.controller.build_context(here=a)
                 data=ctx.evaluateValue('here' + tales)
             else:
                 data=a.content.data
-            f.write(str(self.controller.gui.overlay(self.controller.package.imagecache[a.fragment.begin], data)))
-            f.close()
+            image=self.controller.package.imagecache[a.fragment.begin]
+            # The overlay is only generated if its inputs changed
+            h=hashlib.md5(str(image))
+            h.update(unicode(data).encode('utf-8'))
+            self.write_file('imagecache/overlay_%s.png' % name,
+                            h.hexdigest(),
+                            lambda: str(self.controller.gui.overlay(image, data)))
 
         # Copy resources
         for path in used_resources:
-            dest=os.path.join(self.destination, 'resources', path)
-
-            d=os.path.dirname(dest)
-            if not os.path.isdir(d):
-                helper.recursive_mkdir(d)
-
             r=self.controller.package.resources
             for element in path.split('/'):
                 r=r[element]
-            output=open(dest, 'wb')
-            output.write(r.data)
-            output.close()
+            data=r.data
+            self.write_file('/'.join(('resources', path)), hashlib.md5(data).hexdigest(), data)
+
+    def write_static(self, name, content):
+        """Write a page generated by the exporter itself.
+        """
+        if isinstance(content, unicode):
+            content=content.encode('utf-8')
+        self.write_file(name, hashlib.md5(content).hexdigest(), content)
+
+    def copy_resource(self, path, dest):
+        """Copy a static file or directory to dest.
+
+        The copy is skipped if the names, sizes and modification times
+        of the copied files did not change since the last export.
+
+        @return: True if the resource was copied
+        """
+        if os.path.isdir(path):
+            files=[ os.path.join(dirpath, name)
+                    for (dirpath, dirnames, filenames) in os.walk(path)
+                    for name in filenames ]
+        else:
+            files=[ path ]
+        h=hashlib.md5()
+        for fname in sorted(files):
+            st=os.stat(fname)
+            h.update("%s %d %d\n" % (fname, st.st_size, st.st_mtime))
+        signature=h.hexdigest()
+
+        destpath=os.path.join(self.destination, dest)
+        if self.manifest.get(dest) == signature and os.path.exists(destpath):
+            self.generated[dest]=signature
+            self.statistics['unchanged'] += 1
+            return False
+
+        if os.path.isdir(path):
+            # Copy tree
+            if os.path.exists(destpath):
+                # First remove old version
+                if os.path.isdir(destpath):
+                    shutil.rmtree(destpath, True)
+                else:
+                    os.unlink(destpath)
+            shutil.copytree(path, destpath)
+        else:
+            # Copy file
+            d=os.path.dirname(destpath)
+            if not os.path.isdir(d):
+                helper.recursive_mkdir(d)
+            shutil.copy(path, destpath)
+        self.generated[dest]=signature
+        self.statistics['written'] += 1
+        return True
 
     def website_export(self):
+        if self.workers > 1:
+            self.pool=ThreadPool(self.workers)
+        try:
+            self.export_views()
+            self.wait_writes()
+        finally:
+            if self.pool is not None:
+                self.pool.terminate()
+                self.pool=None
+            # Forget the files whose writing did not complete
+            for (name, result) in self.pending:
+                if not (result.ready() and result.successful()):
+                    self.generated.pop(name, None)
+            self.pending=[]
+            self.save_manifest()
+        self.log(_("Website export: %(rendered)d page(s) rendered, %(written)d file(s) written, %(unchanged)d unchanged") % self.statistics)
+
+    def export_views(self):
         main_step=1.0/self.max_depth
 
         progress=0
@@ -445,17 +643,27 @@ class WebsiteExporter(object):
 
         links_to_be_processed=view_url.values()
 
+        if self.pool is not None:
+            render=self.pool.imap
+        else:
+            render=itertools.imap
         while depth <= self.max_depth:
             max_depth_exceeded = (depth == self.max_depth)
             step=main_step / (len(links_to_be_processed) or 1)
             if not self.progress_callback(progress, _("Depth %d") % depth):
                 return
+            t0=time.time()
+            written=self.statistics['written']
             links=set()
-            for url in links_to_be_processed:
+            # Pages are rendered and written by the worker
+            # threads. Link translation is done here, in the order of
+            # the urls.
+            urls=list(links_to_be_processed)
+            for url, content in itertools.izip(urls, render(self.get_contents, urls)):
                 if not self.progress_callback(progress, _("Depth %(depth)d: processing %(url)s") % locals()):
                     return
                 progress += step
-                content=self.get_contents(url)
+                self.statistics['rendered'] += 1
 
                 (new_links,
                  used_snapshots,
@@ -470,7 +678,14 @@ class WebsiteExporter(object):
                                 used_snapshots,
                                 used_overlays,
                                 used_resources)
-
+            self.wait_writes()
+
+            self.log(_("Website export: depth %(depth)d: %(count)d page(s) in %(duration).2fs, %(written)d file(s) written") % {
+                    'depth': depth,
+                    'count': len(urls),
+                    'duration': time.time() - t0,
+                    'written': self.statistics['written'] - written,
+                    })
             links_to_be_processed=links
             depth += 1
 
@@ -479,22 +694,7 @@ class WebsiteExporter(object):
 
         # Copy static video player resources
         for (path, dest) in self.video_player.needed_resources():
-            dest=os.path.join(self.destination, dest)
-            if os.path.isdir(path):
-                # Copy tree
-                if os.path.exists(dest):
-                    # First remove old version
-                    if os.path.isdir(dest):
-                        shutil.rmtree(dest, True)
-                    else:
-                        shutil.unlink(dest)
-                shutil.copytree(path, dest)
-            else:
-                # Copy file
-                d=os.path.dirname(dest)
-                if not os.path.isdir(d):
-                    helper.recursive_mkdir(d)
-                shutil.copy(path, dest)
+            self.copy_resource(path, dest)
 
         # Generate video helper files if necessary
         self.video_player.finalize()
@@ -503,7 +703,6 @@ class WebsiteExporter(object):
         name="index.html"
         if name in self.url_translation.values():
             name="_index.html"
-        f=open(os.path.join(self.destination, name), 'w')
         defaultview=self.controller.package.getMetaData(config.data.namespace, 'default_utbv')
         v=self.controller.package.views.get_by_id(defaultview)
         if defaultview and v:
@@ -513,7 +712,7 @@ class WebsiteExporter(object):
             default_href=''
             default=''
 
-        f.write("""<html><head>%(title)s</head>
+        self.write_static(name, """<html><head>%(title)s</head>
 <body>
 <h1>%(title)s views</h1>
 %(default)s
@@ -524,13 +723,11 @@ class WebsiteExporter(object):
                            'data': "\n".join( '<li><a href="%s">%s</a>' % (self.url_translation[view_url[v]],
                                                                            v.title)
                                               for v in self.views ) })
-        f.close()
 
         frame="frame.html"
         if frame in self.url_translation.values():
             frame="_frame.html"
-        f=open(os.path.join(self.destination, frame), 'w')
-        f.write("""<html>
+        self.write_static(frame, """<html>
 <head><title>%(title)s</title></head>
 <frameset cols="70%%,30%%">
   <frame name="main" src="%(index)s" />
@@ -541,15 +738,12 @@ class WebsiteExporter(object):
                 'title': self.controller.get_title(self.controller.package),
                 'index': default_href or name,
                 })
-        f.close()
 
-        f=open(os.path.join(self.destination, "unconverted.html"), 'w')
-        f.write("""<html><head>%(title)s - not converted</head>
+        self.write_static("unconverted.html", """<html><head>%(title)s - not converted</head>
 <body>
 <h1>%(title)s - not converted resource</h1>
 <p>Advene was unable to export this resource.</p>
 </body></html>""" % { 'title': self.controller.get_title(self.controller.package) })
-        f.close()
 
         self.progress_callback(1.0, _("Export complete"))
 
@@ -0,0 +1,655 @@
+#! /usr/bin/env python
+#
+# This file is part of Advene.
+#
+# Advene is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# Advene is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Advene; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
+#
+"""Micro-benchmarks for Advene.
+
+Run with a benchmark name and an optional size, for instance:
+
+  benchmark.py fragment-sort 200000
+
+Run without arguments to list the available benchmarks.
+"""
+
+import os
+import random
+import StringIO
+import sys
+import time
+
+# Use the checkout this script belongs to, as bin/advene does for a
+# development tree.
+maindir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(maindir, 'lib'))
+
+import advene.core.config as config
+config.data.fix_paths(maindir)
+
+from advene.model.package import Package
+from advene.model.constants import adveneNS, dcNS, xlinkNS
+
+def synthetic_package_xml(size, types=5, duration=2 * 3600 * 1000, seed=0):
+    """Generate the XML source of a package with size annotations spread over duration.
+    """
+    random.seed(seed)
+    out = [ u"""<package xmlns="%s" xmlns:dc="%s" xmlns:xlink="%s" dc:creator=""><imports/><annotations>""" % (adveneNS, dcNS, xlinkNS) ]
+    for i in xrange(size):
+        begin = random.randint(0, duration)
+        out.append(u"""<annotation id="a%d" type="#type%d"><millisecond-fragment begin="%d" end="%d"/><content encoding="utf-8">Annotation %d</content></annotation>"""
+                   % (i, i % types, begin, begin + random.randint(40, 10000), i))
+    out.append(u"""</annotations><queries/><schemas><schema id="schema"><annotation-types>""")
+    for i in xrange(types):
+        out.append(u"""<annotation-type id="type%d"><content-type mime-type="text/plain"/></annotation-type>""" % i)
+    out.append(u"""</annotation-types><relation-types/></schema></schemas><views/></package>""")
+    return u"".join(out).encode('utf-8')
+
+def synthetic_package(size, **kw):
+    """Generate a package with size annotations.
+
+    See synthetic_package_xml for the parameters.
+    """
+    return Package('synthetic', source=StringIO.StringIO(synthetic_package_xml(size, **kw)))
+
+def measure(label, method, repeat=3):
+    """Display the best execution time of method.
+    """
+    best = None
+    for i in xrange(repeat):
+        t = time.time()
+        method()
+        d = time.time() - t
+        if best is None or d < best:
+            best = d
+    print "%-40s %8.3fs" % (label, best)
+    return best
+
+def bench_fragment_sort(size=100000):
+    """Sort all annotations of a package by begin.
+    """
+    p = synthetic_package(size)
+    annotations = list(p.annotations)
+    def dom_sort():
+        return sorted(annotations,
+                      key=lambda a: long(a.fragment._getModel().getAttributeNS(None, 'begin')))
+    def cached_sort():
+        return sorted(annotations, key=lambda a: a.fragment.begin)
+    old = measure("Sort by DOM attribute", dom_sort)
+    new = measure("Sort by cached begin", cached_sort)
+    print "Speedup: %.1fx" % (old / new)
+
+annotation_view_template = u"""<div class="annotation">
+<h1 tal:content="here/id">Id</h1>
+<p>Type: <em tal:content="here/type/id">type</em></p>
+<p>Begin: <span tal:content="here/fragment/begin">0</span>
+   End: <span tal:content="here/fragment/end">0</span></p>
+<div tal:content="here/content/data">Content</div>
+<ul>
+<li tal:repeat="r here/relations" tal:content="r/id">Relation</li>
+</ul>
+%s
+</div>"""
+
+def bench_view_render(size=10000, renders=1000):
+    """Render an annotation view with and without the compiled template cache.
+    """
+    import advene.model.tal.context
+    p = synthetic_package(size)
+    # Make the template reasonably large
+    padding = u"\n".join(u"""<p tal:condition="here/fragment/begin">Line %d</p>""" % i
+                          for i in xrange(100))
+    v = p.createView(ident='annotation-view', clazz='annotation',
+                     content_mimetype='text/html')
+    v.content.data = annotation_view_template % padding
+    p.views.append(v)
+    annotations = p.annotations[:renders]
+    def uncached():
+        for a in annotations:
+            advene.model.tal.context.invalidate_template_cache()
+            a.view('annotation-view')
+    def cached():
+        for a in annotations:
+            a.view('annotation-view')
+    old = measure("%d renders, no template cache" % renders, uncached, repeat=1)
+    new = measure("%d renders, template cache" % renders, cached, repeat=1)
+    print "Speedup: %.1fx" % (old / new)
+
+def bench_shot_detection(frames=20000):
+    """Detect shots in synthetic histograms, comparing with the loop-based implementation.
+    """
+    from advene.plugins.goodshotdetector import ShotDetector
+    from advene.plugins.test_goodshotdetector import ReferenceShotDetector, synthetic_histograms
+    histos = synthetic_histograms(frames)
+
+    reference = ReferenceShotDetector()
+
+    results = {}
+    def run(sd, key):
+        def method():
+            results[key] = list(sd.process(histos))
+        return method
+    old = measure("%d frames, loops" % frames, run(reference, 'old'), repeat=1)
+    new = measure("%d frames, vectorized" % frames, run(ShotDetector(), 'new'), repeat=1)
+    assert results['old'] == results['new'], "Different results"
+    print "%d shots/dissolves detected" % len(results['new'])
+    print "Speedup: %.1fx" % (old / new)
+
+def reference_dtw_align(sa, da):
+    """Loop-based DTW alignment, as formerly implemented in the timeline.
+
+    sa and da are lists of (begin, end) tuples.
+    """
+    def distance(s, d):
+        return (abs(s[0] - d[0]) + abs(s[1] - d[1])
+                + abs((s[1] - s[0]) - (d[1] - d[0])))
+    bestpath = []
+    bestdist = []
+    mindist = distance(sa[0], da[0])
+    bestdist.append(mindist)
+    bestpath.append([0])
+    for j in range(1,len(sa)):
+        dist = distance(sa[j], da[0])
+        if dist < mindist:
+            mindist = dist
+            bestpath.append([j])
+            bestdist.append(dist)
+        else:
+            bestpath.append(list(bestpath[j-1]))
+            bestdist.append(bestdist[j-1] + dist)
+
+    for i in range(1,len(da)):
+        currentdist = 0
+        prevsubdist = 0
+        currentpath = []
+        prevsubpath = []
+        for j in range(0,len(sa)):
+            dist = distance(sa[j], da[i])
+            if j == 0:
+                currentpath = list(bestpath[0])
+                currentdist = bestdist[0]
+                bestpath[0].append(0)
+                bestdist[0] = bestdist[0] + dist
+            else:
+                insdist = bestdist[j] + dist
+                deldist = bestdist[j-1] + dist
+                subdist = prevsubdist + dist*1.5
+                currentdist =  bestdist[j]
+                currentpath = list(bestpath[j])
+                if insdist < deldist :
+                    if insdist < subdist:
+                        bestpath[j].append(j)
+                        bestdist[j] = insdist
+                    else :
+                        prevsubpath.append(j)
+                        bestpath[j] = prevsubpath
+                        bestdist[j] = subdist
+                elif subdist < deldist :
+                    prevsubpath.append(j)
+                    bestpath[j] = prevsubpath
+                    bestdist[j] = subdist
+                else:
+                    bestpath[j] = list(bestpath[j-1])
+                    bestdist[j] = deldist
+            prevsubdist = currentdist
+            prevsubpath = list(currentpath)
+    return bestpath[len(sa)-1]
+
+def bench_dtw_align(size=1000, window=50):
+    """Align two annotation types with DTW, comparing with the former implementation.
+    """
+    import advene.util.dtw as dtw
+    p = synthetic_package(2 * size, types=2)
+    sa, da = [ [ (a.fragment.begin, a.fragment.end) for a in at.annotations ]
+               for at in p.annotationTypes ]
+    results = {}
+    def run(key, method, *p):
+        def f():
+            results[key] = method(*p)
+        return f
+    old = measure("%d x %d, path lists" % (len(da), len(sa)),
+                  run('old', reference_dtw_align, sa, da), repeat=1)
+    new = measure("%d x %d, backpointers" % (len(da), len(sa)),
+                  run('new', dtw.align, sa, da), repeat=1)
+    assert results['old'] == results['new'], "Different alignments"
+    print "Speedup: %.1fx" % (old / new)
+    measure("%d x %d, band of %d" % (len(da), len(sa), window),
+            run('band', dtw.align, sa, da, window), repeat=1)
+
+def bench_controller_update(size=100000, ticks=20000, step=40):
+    """Simulate playback with the dummy player, measuring Controller.update.
+    """
+    config.data.player['plugin'] = 'dummy'
+    from advene.core.controller import AdveneController
+    c = AdveneController()
+    c.package = synthetic_package(size)
+    p = c.player
+    p.status = p.PlayingStatus
+    clock = [ 0 ]
+    c.position_update = lambda: clock[0]
+    counts = { 'AnnotationBegin': 0, 'AnnotationEnd': 0 }
+    notify = c.notify
+    def count(event_name, *p, **kw):
+        if event_name in counts:
+            counts[event_name] += 1
+        return notify(event_name, *p, **kw)
+    c.notify = count
+    # Build the temporal index and the event lists
+    c.update()
+    worst = [ 0 ]
+    def play():
+        for i in xrange(1, ticks):
+            clock[0] = i * step
+            t = time.time()
+            c.update()
+            worst[0] = max(worst[0], time.time() - t)
+    measure("%d ticks over %d annotations" % (ticks, size), play, repeat=1)
+    print "Slowest tick: %.2fms" % (worst[0] * 1000)
+    print "%(AnnotationBegin)d begins, %(AnnotationEnd)d ends" % counts
+
+def bench_controller_scrub(size=100000, ticks=500, seed=0):
+    """Simulate scrubbing with the dummy player, with and without incremental re-sync.
+    """
+    config.data.player['plugin'] = 'dummy'
+    from advene.core.controller import AdveneController
+    c = AdveneController()
+    c.package = synthetic_package(size)
+    p = c.player
+    p.status = p.PauseStatus
+    clock = [ 0 ]
+    c.position_update = lambda: clock[0]
+    index = c.package.temporalIndex
+    # Frame steps and small seeks around the middle of the package
+    rnd = random.Random(seed)
+    positions = [ 3600 * 1000 ]
+    for i in xrange(ticks):
+        positions.append(max(0, positions[-1] + rnd.choice( (-40, 40, -40, 40, -5000, 3000) )))
+    def scrub(check=False):
+        def method():
+            c.reset_annotation_lists()
+            for pos in positions:
+                clock[0] = pos
+                c.update()
+                if check:
+                    expected = set(a for (a, b, e) in index.iter_ends(pos + 1) if b <= pos)
+                    assert set(c.active_annotations) == expected, "Wrong active annotations at %d" % pos
+        return method
+    threshold = config.data.preferences['seek-resync-threshold']
+    config.data.preferences['seek-resync-threshold'] = 0
+    scrub(check=True)()
+    old = measure("%d seeks, list rebuild" % ticks, scrub(), repeat=1)
+    config.data.preferences['seek-resync-threshold'] = threshold
+    scrub(check=True)()
+    new = measure("%d seeks, incremental re-sync" % ticks, scrub(), repeat=1)
+    print "Speedup: %.1fx" % (old / new)
+
+def bench_package_load(size=100000):
+    """Load a package with minidom and with the lightweight DOM.
+
+    Each load is done in a forked process, so that its peak memory
+    usage can be measured.
+    """
+    import resource
+    import tempfile
+
+    fd, fname = tempfile.mkstemp(suffix='.xml')
+    os.write(fd, synthetic_package_xml(size))
+    os.close(fd)
+
+    def load(lite):
+        r, w = os.pipe()
+        pid = os.fork()
+        if pid == 0:
+            os.close(r)
+            config.data.preferences['package-lightweight-dom'] = lite
+            t = time.time()
+            p = Package('file://' + fname)
+            n = len(p.annotations)
+            d = time.time() - t
+            out = StringIO.StringIO()
+            p.serialize(out)
+            os.write(w, "%f %d %d %s" % (d, n,
+                                         resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+                                         hash(out.getvalue())))
+            os._exit(0)
+        os.close(w)
+        data = ''
+        while True:
+            buf = os.read(r, 4096)
+            if not buf:
+                break
+            data += buf
+        os.close(r)
+        os.waitpid(pid, 0)
+        d, n, rss, h = data.split()
+        return float(d), int(n), int(rss), h
+
+    try:
+        print "Package of %d annotations (%.1f MB)" % (size, os.path.getsize(fname) / 1024.0 / 1024)
+        results = {}
+        for lite, label in ((False, 'minidom'), (True, 'lightweight')):
+            d, n, rss, h = load(lite)
+            assert n == size
+            results[lite] = (d, rss, h)
+            print "%-40s %8.3fs %8.1f MB peak RSS" % (label, d, rss / 1024.0)
+        assert results[False][2] == results[True][2], "Different serializations"
+        print "Speedup: %.1fx, memory: %.1fx less" % (results[False][0] / results[True][0],
+                                                      results[False][1] / float(results[True][1]))
+    finally:
+        os.unlink(fname)
+
+def bench_azp_save(size=10000, resources=200, resource_size=256 * 1024):
+    """Save an AZP package with resources, fully and incrementally.
+
+    Half of the resources are incompressible PNG snapshots, the other
+    half compressible text. Only the annotations are modified between
+    saves, as with autosave.
+    """
+    import shutil
+    import tempfile
+    import zipfile
+    from advene.model.resources import Resources
+
+    d = tempfile.mkdtemp('', 'advbench')
+    fname = os.path.join(d, 'package.azp')
+    try:
+        p = synthetic_package(size)
+        p.save(fname)
+        p = Package(fname)
+        random.seed(0)
+        r = p.resources
+        r['snapshots'] = Resources.DIRECTORY_TYPE
+        for i in xrange(resources / 2):
+            r['snapshots']['%d.png' % i] = os.urandom(resource_size)
+            r['text%d.txt' % i] = ' '.join(str(random.randint(0, 1000))
+                                           for j in xrange(resource_size / 4))[:resource_size]
+        p.save(fname)
+        print "Package of %d annotations, %d resources (%.1f MB)" % (size, resources,
+                                                                   os.path.getsize(fname) / 1024.0 / 1024)
+        z = p._Package__zip
+
+        def full():
+            # Previous implementation: deflate all files into a new archive
+            content = open(z.getContentsFile(), 'w')
+            p.serialize(content)
+            content.close()
+            z.update_statistics(p)
+            out = zipfile.ZipFile(fname, 'w', zipfile.ZIP_DEFLATED)
+            for (dirpath, dirnames, filenames) in os.walk(z._tempdir):
+                for f in filenames:
+                    path = os.path.join(dirpath, f)
+                    out.write(path, os.path.relpath(path, z._tempdir))
+            out.close()
+
+        def modify():
+            a = p.annotations[random.randint(0, size - 1)]
+            a.content.data = "Modified %d" % random.randint(0, 1000)
+
+        def incremental():
+            modify()
+            p.save(fname)
+
+        old = measure("Full save", full)
+        # The full save wrote a new archive: start from a synchronized state
+        p.save(fname)
+        new = measure("Incremental save", incremental)
+        print "Speedup: %.1fx" % (old / new)
+
+        # Check the saved archive against the extracted files
+        out = zipfile.ZipFile(fname, 'r')
+        assert out.testzip() is None
+        for name in out.namelist():
+            assert out.read(name) == open(z.tempfile(*name.split('/')), 'rb').read(), name
+        out.close()
+        p.close()
+    finally:
+        shutil.rmtree(d, ignore_errors=True)
+
+def bench_azp_open(size=1000, resources_mb=1024, resource_size=4 * 1024 * 1024):
+    """Open an AZP package with large resources, with and without lazy extraction.
+    """
+    import shutil
+    import tempfile
+    import zipfile
+    import advene.model.zippackage as zippackage
+
+    d = tempfile.mkdtemp('', 'advbench')
+    fname = os.path.join(d, 'package.azp')
+    try:
+        p = synthetic_package(size)
+        p.save(fname)
+        p.close()
+        z = zipfile.ZipFile(fname, 'a', allowZip64=True)
+        chunk = os.urandom(resource_size)
+        for i in xrange(resources_mb * 1024 * 1024 / resource_size):
+            info = zipfile.ZipInfo('resources/snapshots/%04d.png' % i)
+            info.compress_type = zipfile.ZIP_STORED
+            z.writestr(info, chunk)
+        z.close()
+        print "Package of %d annotations (%.1f MB)" % (size, os.path.getsize(fname) / 1024.0 / 1024)
+
+        def open_package():
+            p = Package(fname)
+            len(p.annotations)
+            assert p.resources['snapshots']['0001.png'].data == chunk
+            p.close()
+
+        lazy = zippackage.LAZY_PREFIX
+        try:
+            # No lazy member: everything is extracted, as before
+            zippackage.LAZY_PREFIX = '\0'
+            old = measure("Open with full extraction", open_package, repeat=1)
+        finally:
+            zippackage.LAZY_PREFIX = lazy
+        new = measure("Open with lazy resources", open_package)
+        print "Speedup: %.1fx" % (old / new)
+    finally:
+        shutil.rmtree(d, ignore_errors=True)
+
+def bench_srt_import(size=100000, reference_size=5000):
+    """Import a SRT file, one cue at a time and in one batch.
+
+    The cue-per-cue conversion with the former index lookup of the
+    bundle append is quadratic, so that it is measured on
+    reference_size cues only.
+    """
+    import shutil
+    import tempfile
+    import advene.util.importer as importer
+    from advene.model.bundle import AbstractXmlBundle
+
+    def timecode(ms):
+        return "%02d:%02d:%02d,%03d" % (ms / 3600000, ms / 60000 % 60, ms / 1000 % 60, ms % 1000)
+
+    def index_end(self, elt_list):
+        # Former implementation: lookup from the start of the list
+        return elt_list.index(self._get_element(self._list[-1])) + 1
+
+    d = tempfile.mkdtemp('', 'advbench')
+    try:
+        files = {}
+        for n in set((size, reference_size)):
+            fname = os.path.join(d, 'cues%d.srt' % n)
+            f = open(fname, 'w')
+            for i in xrange(n):
+                f.write("%d\n%s --> %s\nCue number %d\n\n" % (i + 1, timecode(i * 1000), timecode(i * 1000 + 800), i))
+            f.close()
+            files[n] = fname
+
+        def import_cues(n, batch=True):
+            i = importer.SubtitleImporter()
+            if batch:
+                p = i.process_file(files[n])
+            else:
+                p, at = i.init_package(filename=files[n], annotationtypeid='subtitle')
+                i.convert(i.srt_iterator(open(files[n]), os.path.getsize(files[n])))
+            assert len(p.annotations) == n
+            assert p.annotations[-1].content.data == 'Cue number %d' % (n - 1)
+
+        end_index = AbstractXmlBundle._end_index
+        try:
+            AbstractXmlBundle._end_index = index_end
+            old = measure("Per cue, index lookup (%d cues)" % reference_size,
+                          lambda: import_cues(reference_size, batch=False), repeat=1)
+        finally:
+            AbstractXmlBundle._end_index = end_index
+        cue = measure("Per cue (%d cues)" % reference_size,
+                      lambda: import_cues(reference_size, batch=False), repeat=1)
+        new = measure("Batch (%d cues)" % reference_size,
+                      lambda: import_cues(reference_size), repeat=1)
+        print "Speedup: %.1fx (per cue: %.1fx)" % (old / new, old / cue)
+        measure("Batch (%d cues)" % size, lambda: import_cues(size), repeat=1)
+    finally:
+        shutil.rmtree(d, ignore_errors=True)
+
+def bench_bulk_delete(size=50000, reference_size=5000, types=5):
+    """Delete all the annotations of a type, one at a time and in one batch.
+
+    Deleting the annotations one at a time is quadratic, so that it
+    is measured on a package of reference_size annotations only.
+    """
+    def victims(p):
+        t = p.get_element_by_id('type0')
+        return [ a for a in p.annotations if a.type is t ]
+
+    def per_item(p):
+        for a in victims(p):
+            p.annotations.remove(a)
+
+    def batch(p):
+        p.deleteElements(victims(p))
+
+    def run(method, n):
+        p = synthetic_package(n, types=types)
+        # Build the indexes, which are updated along the deletion
+        p.getTemporalIndex()
+        p.getTextIndex()
+        def delete():
+            method(p)
+            assert len(p.annotations) == n - n / types
+        return delete
+
+    old = measure("Per item (%d annotations)" % reference_size, run(per_item, reference_size), repeat=1)
+    new = measure("Batch (%d annotations)" % reference_size, run(batch, reference_size), repeat=1)
+    print "Speedup: %.1fx" % (old / new)
+    measure("Batch (%d annotations)" % size, run(batch, size), repeat=1)
+
+def bench_snapshot_schedule(size=10000, fps=25):
+    """Schedule the snapshots of all annotation bounds, as the missing snapshots update does.
+
+    The snapshotter cannot be run here, so that the numbers of seeks
+    and of frames decoded forward are compared, along with the
+    scheduling time.
+    """
+    import heapq
+    from advene.util.snapshotscheduler import SnapshotScheduler
+
+    p = synthetic_package(size)
+    requests = []
+    for a in p.annotations:
+        for t in (a.fragment.begin, a.fragment.end):
+            # Timestamps enqueued by the gstreamer player for each position
+            requests.extend((t - 50, t - 20, t / fps * fps, t))
+    random.shuffle(requests)
+
+    def reference():
+        # Former unique priority queue: one accurate seek per timestamp
+        heap = []
+        values = set()
+        for t in requests:
+            if t not in values:
+                values.add(t)
+                heapq.heappush(heap, t)
+        return [ [ heapq.heappop(heap) ] for i in xrange(len(heap)) ]
+
+    def scheduled():
+        s = SnapshotScheduler()
+        s.put(*requests)
+        runs = []
+        while not s.empty():
+            runs.append(s.get())
+        return runs
+
+    measure("Unique priority queue", reference)
+    measure("Scheduler", scheduled)
+    for label, runs in (("Unique priority queue", reference()),
+                        ("Scheduler", scheduled())):
+        frames = sum((r[-1] - r[0]) * fps / 1000 for r in runs)
+        print "%-25s %8d seeks %8d frames decoded forward" % (label, len(runs), frames)
+
+def bench_website_export(size=2000, workers=0):
+    """Export a website, then export it again before and after a modification.
+    """
+    import shutil
+    import tempfile
+    config.data.player['plugin'] = 'dummy'
+    from advene.core.controller import AdveneController
+    from advene.util.website_export import WebsiteExporter
+    c = AdveneController()
+    destination = tempfile.mkdtemp(prefix='advene')
+    source = os.path.join(destination, 'package.xml')
+    f = open(source, 'w')
+    f.write(synthetic_package_xml(size))
+    f.close()
+    # Use load_package, so that the package gets its imagecache
+    c.load_package(source)
+    os.unlink(source)
+    p = c.package
+    index = p.createView(ident='index', clazz='package', content_mimetype='text/html')
+    index.content.data = u"""<html><head><title>Index</title></head><body><ul>
+<li tal:repeat="a package/annotations"><a tal:attributes="href a/absolute_url" tal:content="a/id">a</a>
+<img tal:attributes="src string:${package/absolute_url}/imagecache/${a/fragment/begin}" /></li>
+</ul></body></html>"""
+    p.views.append(index)
+    v = p.createView(ident='annotation-view', clazz='annotation', content_mimetype='text/html')
+    v.content.data = u"""<html><head><title tal:content="here/id">Id</title></head><body>
+<p tal:content="here/content/data">Content</p>
+<a tal:attributes="href string:${package/absolute_url}/view/index">Index</a></body></html>"""
+    p.views.append(v)
+    def export():
+        # The exporter logs its statistics
+        WebsiteExporter(c, destination, [ index ], 3, None, '', workers=workers).website_export()
+    try:
+        measure("First export (%d pages)" % (size + 1), export, repeat=1)
+        measure("Unchanged re-export", export, repeat=1)
+        p.annotations[0].content.data = u"Modified"
+        measure("Re-export after a modification", export, repeat=1)
+    finally:
+        shutil.rmtree(destination, True)
+
+benchmarks = {
+    'fragment-sort': bench_fragment_sort,
+    'view-render': bench_view_render,
+    'shot-detection': bench_shot_detection,
+    'dtw-align': bench_dtw_align,
+    'controller-update': bench_controller_update,
+    'controller-scrub': bench_controller_scrub,
+    'package-load': bench_package_load,
+    'azp-save': bench_azp_save,
+    'azp-open': bench_azp_open,
+    'srt-import': bench_srt_import,
+    'bulk-delete': bench_bulk_delete,
+    'snapshot-schedule': bench_snapshot_schedule,
+    'website-export': bench_website_export,
+    }
+
+if __name__ == '__main__':
+    if len(sys.argv) < 2 or sys.argv[1] not in benchmarks:
+        print "Available benchmarks:"
+        for name, b in sorted(benchmarks.iteritems()):
+            print "  %-20s %s" % (name, b.__doc__.strip().splitlines()[0])
+        sys.exit(1)
+    args = [ long(a) for a in sys.argv[2:] ]
+    benchmarks[sys.argv[1]](*args)